@@ -2,14 +2,30 @@ import asyncio
 import logging
 from db_lig.main import processDbLig
 from db_ext.main import processDbExt
+from spread_bot.http_session import SESSIONS
+from spread_bot.pipeline import shutdown_pool
+from spread_bot.sync_scheduler import FILL_HUB
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("data_backend")
 
+async def log_http_stats():
+    while True:
+        await asyncio.sleep(600)
+        logger.info(f"🌐 HTTP {SESSIONS.fmtSummary()}")
+
 async def main():
+    # bots signal fills here; the venue schedulers register in processDb*
+    await FILL_HUB.start()
     task1 = asyncio.create_task(processDbExt())
     task2 = asyncio.create_task(processDbLig())
-    await asyncio.gather(task1, task2)
+    task3 = asyncio.create_task(log_http_stats())
+    try:
+        await asyncio.gather(task1, task2, task3)
+    finally:
+        await SESSIONS.closeAll()
+        shutdown_pool()
+        FILL_HUB.close()
     
 if __name__ == "__main__":
     asyncio.run(main())
@@ -6,10 +6,11 @@ import traceback
 import os
 import asyncio
 import logging
-import aiohttp
 from dotenv import load_dotenv
 from decimal import Decimal
 from pathlib import Path
+from spread_bot.http_session import SESSIONS
+from spread_bot.raw_store import RawStore, append_csv, safe_symbol
 
 from x10.perpetual.accounts import StarkPerpetualAccount
 from x10.perpetual.configuration import MAINNET_CONFIG
@@ -22,6 +23,38 @@ logger                          = logging.getLogger("db_ext.api")
 logger.setLevel                 (logging.INFO)
 load_dotenv                     ("/root/arbSpread/backend/.env")
 
+RAW_DIR                         = "/root/arbSpread/backend/db_ext/raw"
+TRADES_CSV                      = f"{RAW_DIR}/_trades.csv"          # legacy, migrated into the store
+FUNDINGS_CSV                    = f"{RAW_DIR}/_fundings.csv"
+
+
+def _epoch(v) -> int:
+    s                           = str(v or "").strip()
+    try:
+        return int(float(s)) if s else 0
+    except ValueError:
+        return 0
+
+
+def _trade_key(row):
+    return row.get("id") or f'{row.get("market")}:{row.get("created_time")}:{row.get("order_id")}'
+
+
+def _trade_ts(row) -> int:
+    return _epoch(row.get("created_time"))
+
+
+def _trade_symbol(row):
+    return row.get("market") or row.get("symbol")
+
+
+def _funding_key(row):
+    return row.get("id") or f'{row.get("market")}:{row.get("paidTime") or row.get("timestamp")}'
+
+
+def _funding_ts(row) -> int:
+    return _epoch(row.get("paidTime") or row.get("timestamp") or row.get("created_time"))
+
 class ExtendedAPI:
     def __init__(self):
         self.client             = None
@@ -35,6 +68,7 @@ class ExtendedAPI:
             "slippage"          : float(os.getenv("ALLOWED_SLIPPAGE")) / 100,
         }
         self.allSymbols         = []
+        self.store              = RawStore(f"{RAW_DIR}/_store.db")
 
     async def init(self):
         starkPerpAcc            = StarkPerpetualAccount(
@@ -49,10 +83,11 @@ class ExtendedAPI:
         )
         self.ws_client          = PerpetualStreamClient(api_url=MAINNET_CONFIG.stream_url)
         await self.getAllSymbols()
+        self._migrate_legacy()
         
     async def getAllSymbols(self):
         url                     = f"https://api.starknet.extended.exchange/api/v1/info/markets"
-        async with aiohttp.ClientSession() as session:
+        async with SESSIONS.session("extended") as session:
             async with session.get(url) as resp:
                 data            = await resp.json()
 
@@ -61,31 +96,24 @@ class ExtendedAPI:
 
         self.allSymbols = [market["name"] for market in data["data"] if market.get("active")]
 
+    def _migrate_legacy(self):
+        """One-time import of the old full-rewrite CSVs into the store."""
+        if self.store.migrateCsv("trades", TRADES_CSV, key=_trade_key, ts=_trade_ts, symbol=_trade_symbol):
+            os.replace          (TRADES_CSV, f"{TRADES_CSV}.migrated")
+        # _fundings.csv stays: it is the append-only mirror p_fifo reads
+        self.store.migrateCsv   ("fundings", FUNDINGS_CSV, key=_funding_key, ts=_funding_ts, symbol=_trade_symbol)
+
     async def getTrades(self):
         try:
-            filename    = "/root/arbSpread/backend/db_ext/raw/_trades.csv"
             limit       = 300
             cursor      = None
-            all_trades  = []
-
-            # --- Step 1: Determine latest timestamp ---
-            newest_timestamp = 0
-            existing_fieldnames = None
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-
-            if os.path.exists(filename):
-                with open(filename, newline="", encoding="utf-8") as f:
-                    reader = csv.DictReader(f)
-                    existing_fieldnames = reader.fieldnames
-                    for row in reader:
-                        ts = row.get("created_time")
-                        if ts and str(ts).isdigit():
-                            newest_timestamp = max(newest_timestamp, int(ts))
-                logger.info(f"[ExtendedAPI] Found existing file, newest timestamp: {newest_timestamp}")
-            else:
-                logger.info("[ExtendedAPI] No existing file found → fetching all trades")
-
-            # --- Step 2: Pagination loop ---
+            total_new   = 0
+
+            # --- Step 1: latest timestamp from the store (O(1)) ---
+            newest_timestamp = self.store.hwm("trades")
+            logger.info(f"[ExtendedAPI] Trade store newest timestamp: {newest_timestamp}")
+
+            # --- Step 2: Pagination loop, newest first ---
             while True:
                 resp = await self.client.account.get_trades(
                     market_names=[self.allSymbols],
@@ -101,16 +129,19 @@ class ExtendedAPI:
                 if not trades:
                     break
 
-                # keep only new trades if we already have data
-                if newest_timestamp > 0:
-                    trades = [t for t in trades if getattr(t, "created_time", 0) > newest_timestamp]
-
-                if not trades:
+                # >= keeps same-millisecond trades that landed after the last sync; the store dedups by id
+                page = [t.__dict__ for t in trades if getattr(t, "created_time", 0) >= newest_timestamp]
+                new_rows = self.store.insert("trades", page, key=_trade_key, ts=_trade_ts, symbol=_trade_symbol)
+                if not new_rows:
                     logger.info("[ExtendedAPI] No newer trades found; stopping fetch.")
                     break
 
-                all_trades.extend(trades)
-                logger.info(f"[ExtendedAPI] Retrieved {len(trades)} trades (total {len(all_trades)})")
+                self.store.mirrorCsv("trades", new_rows, RAW_DIR, _trade_symbol)
+                total_new += len(new_rows)
+                logger.info(f"[ExtendedAPI] Retrieved {len(new_rows)} new trades (total {total_new})")
+
+                if len(page) < len(trades):
+                    break
 
                 # --- pagination ---
                 cursor = None
@@ -125,70 +156,24 @@ class ExtendedAPI:
 
                 await asyncio.sleep(0.2)
 
-            # --- Step 3: Save result ---
-            if not all_trades:
-                logger.info("[ExtendedAPI] No new trades to save.")
-                return
-
-            trade_dicts = [t.__dict__ for t in all_trades]
-            fieldnames = (
-                existing_fieldnames
-                or sorted(set().union(*(d.keys() for d in trade_dicts)))
-            )
-
-            file_exists = os.path.exists(filename)
-            mode = "a" if file_exists else "w"
-
-            with open(filename, mode, newline="", encoding="utf-8") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerows(trade_dicts)
-
-            logger.info(f"[ExtendedAPI] ✅ Saved {len(all_trades)} new trades → {filename}")
+            logger.info(f"[ExtendedAPI] ✅ Saved {total_new} new trades → {self.store.path}")
+            return total_new
 
         except Exception as e:
             logger.error(f"[ExtendedAPI] getTrades() failed: {e}")
 
     def split_trades_by_symbol(self):
-        input_file  ="/root/arbSpread/backend/db_ext/raw/_trades.csv"
-        output_dir  ="/root/arbSpread/backend/db_ext/raw"
-
-        # --- Step 1: Read all trades and group by symbol ---
-        grouped_rows = defaultdict(list)
-        fieldnames = None
-
-        os.makedirs(output_dir, exist_ok=True)
-        with open(input_file, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            for row in reader:
-                symbol = row.get("market") or row.get("symbol")
-                if not symbol:
-                    continue
-                grouped_rows[symbol].append(row)
-
-        # --- Step 2: Write each group to its own file ---
-        for symbol, rows in grouped_rows.items():
-            safe_symbol = symbol.replace("/", "-").replace(":", "-")
-            out_path = os.path.join(output_dir, f"{safe_symbol}.csv")
-
-            file_exists = os.path.exists(out_path)
-            with open(out_path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            
-    async def getFundingPayment(self, start_time=None, end_time=None, cursor=None, limit=10000):
-        filename            = "/root/arbSpread/backend/db_ext/raw/_fundings.csv"
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        """
+        Rebuild every raw/{SYMBOL}.csv from the store. getTrades already
+        appends new rows to these files; this is only for repairs.
+        """
+        for symbol in self.store.symbols("trades"):
+            self.store.exportCsv("trades", os.path.join(RAW_DIR, f"{safe_symbol(symbol)}.csv"), symbol)
 
-        all_fundings = []
-        newest_timestamp = 0
+    async def getFundingPayment(self, start_time=None, end_time=None, cursor=None, limit=10000):
+        total_new = 0
 
         # --- Helper: seconds -> Asia/Jakarta readable ---
-        from datetime import datetime, timedelta
-
         def _normalize_epoch_seconds(raw):
             """
             Accepts epoch in seconds/ms/us/ns or string/float.
@@ -225,18 +210,9 @@ class ExtendedAPI:
                 return ""
             return (datetime.utcfromtimestamp(secs) + timedelta(hours=7)).strftime("%Y-%m-%d %H:%M:%S")
 
-        # --- Step 1: Determine latest timestamp from CSV ---
-        if os.path.exists(filename):
-            with open(filename, newline="", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # prefer paidTime if present; else created_time/timestamp
-                    ts = row.get("paidTime") or row.get("timestamp") or row.get("created_time")
-                    if ts and str(ts).isdigit():
-                        newest_timestamp = max(newest_timestamp, int(ts))
-            logger.info(f"[ExtendedAPI] Found existing funding file → newest timestamp: {newest_timestamp}")
-        else:
-            logger.info("[ExtendedAPI] No existing funding file found → full fetch.")
+        # --- Step 1: latest timestamp from the store (O(1)) ---
+        newest_timestamp = self.store.hwm("fundings")
+        logger.info(f"[ExtendedAPI] Funding store newest timestamp: {newest_timestamp}")
 
         # --- Step 2: Pagination loop ---
         while True:
@@ -263,8 +239,18 @@ class ExtendedAPI:
                 logger.info("[ExtendedAPI] No more funding data; stopping pagination.")
                 break
 
-            all_fundings.extend(data)
-            logger.info(f"[ExtendedAPI] Retrieved {len(data)} fundings (total {len(all_fundings)})")
+            for item in data:
+                paid = item.get("paidTime")
+                item["readable_paidTime"] = to_readable_jkt(paid) if paid else ""
+
+            # --- Step 3: keep only unseen records (by id), append to the mirror ---
+            new_rows = self.store.insert(
+                "fundings", data, key=_funding_key, ts=_funding_ts, symbol=_trade_symbol,
+                fieldnames=sorted(set(["readable_paidTime"]).union(*(d.keys() for d in data))),
+            )
+            append_csv(FUNDINGS_CSV, new_rows, self.store.fieldnames("fundings"))
+            total_new += len(new_rows)
+            logger.info(f"[ExtendedAPI] Retrieved {len(data)} fundings, {len(new_rows)} new (total {total_new})")
 
             # --- Pagination handler ---
             cursor = None
@@ -278,45 +264,8 @@ class ExtendedAPI:
 
             await asyncio.sleep(0.1)
 
-        if not all_fundings:
-            logger.info("[ExtendedAPI] No new funding records to append.")
-            return
-
-        # --- Step 3: Merge and deduplicate ---
-        combined_map = {}
-        for f in all_fundings:
-            key = f.get("id") or f.get("paidTime") or f.get("timestamp")
-            if key:
-                combined_map[key] = f
-
-        # Convert back to list
-        combined = list(combined_map.values())
-
-        # Add readable_paidTime (Asia/Jakarta) — based on paidTime (seconds)
-        for item in combined:
-            paid = item.get("paidTime")
-            item["readable_paidTime"] = to_readable_jkt(paid) if paid else ""
-
-        # Sort by paidTime desc, fallback to timestamp
-        def sort_key(x):
-            v = x.get("paidTime") or x.get("timestamp") or 0
-            try:
-                return int(v)
-            except Exception:
-                return 0
-
-        combined.sort(key=sort_key, reverse=True)
-
-        # --- Step 4: Save back ---
-        # ensure our new column is included
-        fieldnames = sorted(set(["readable_paidTime"]).union(*(d.keys() for d in combined)))
-        with open(filename, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(combined)
-
-        logger.info(f"[ExtendedAPI] ✅ Saved {len(combined)} total fundings (sorted desc) → {filename}")
-
+        logger.info(f"[ExtendedAPI] ✅ Saved {total_new} new fundings → {FUNDINGS_CSV}")
+        return total_new
 
 
 
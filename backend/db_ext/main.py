@@ -8,33 +8,57 @@ import threading
 from pathlib import Path
 from db_ext.api import ExtendedAPI
 from db_ext import p_fifo, p_cycle, p_daily
+from spread_bot.pipeline import StageRunner
+from spread_bot.dataset_events import DATASET
+from spread_bot.sync_scheduler import SyncScheduler, FILL_HUB
 
 load_dotenv()
 logger                          = logging.getLogger("db_ext.main")
 logger.setLevel                 (logging.INFO)
+RUNNER                          = StageRunner("ext")
+SCHEDULER                       = SyncScheduler("ext")
 
 async def processDbExt():
     L       = ExtendedAPI()
     await L.init()
 
+    FILL_HUB.register(SCHEDULER)
+    dirty   = True      # fetched rows not through the pipeline yet (first run: whatever is on disk)
+
     while True:
+        due = await SCHEDULER.wait()
         try:
-            await L.getTrades()
-            L.split_trades_by_symbol()
-            await L.getFundingPayment()
+            RUNNER.begin()
+            newTrades   = await RUNNER.timed("trades", L.getTrades()) or 0
+            newFundings = 0
+            if "funding" in due:
+                newFundings = await RUNNER.timed("fundings", L.getFundingPayment()) or 0
+            dirty |= bool(newTrades or newFundings)
 
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, p_fifo.process_all_fifo)
-            await loop.run_in_executor(None, p_fifo.build_allSymbols)
-            await loop.run_in_executor(None, p_daily.build_daily)
+            if dirty:
+                # per-symbol FIFO → cycles in parallel, then the whole-venue merges
+                jobs    = await RUNNER.call("partition", p_fifo.prepare_fifo)
+                results = await RUNNER.fanOut("fifo+cycle", p_cycle.process_symbol, jobs)
+                for r in results:
+                    if r["error"]:
+                        logger.error(f"⚠️ {r['symbol']}: {r['error']}")
+                await RUNNER.call("fifo_merge", p_fifo.build_allSymbols)
+                await RUNNER.call("daily", p_daily.build_daily)
+                await RUNNER.call("cycle_merge", p_cycle.build_allSymbols)
 
-            await loop.run_in_executor(None, p_cycle.process_all_cycles)
-            await loop.run_in_executor(None, p_cycle.build_allSymbols)
+                # tell unified_backend to reload (only if an output changed)
+                DATASET.publish("ext", {
+                    "fifo":  os.path.join(p_fifo.FIFO_DIR, "_allSymbols.csv"),
+                    "cycle": os.path.join(p_cycle.CYCLE_DIR, "_allSymbols.csv"),
+                    "daily": p_daily.OUT_PATH,
+                })
+                dirty = False
 
-            logger.info("✅ Extended sync cycle complete.")
+            SCHEDULER.done(newTrades, newFundings)
+            logger.info(f"✅ Extended sync cycle complete. {RUNNER.fmtTimings()} | {SCHEDULER.fmtNext()}")
         except Exception as e:
+            SCHEDULER.done(failed=True)
             logger.error(f"⚠️ Sync error (Extended): {e}")
-        await asyncio.sleep(60)
 
 # --- Entry Point ---
 if __name__ == "__main__":
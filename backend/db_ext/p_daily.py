@@ -1,10 +1,11 @@
 # p_daily.py
 from __future__ import annotations
 from dotenv import load_dotenv
-import os, csv, glob, logging
-from datetime import datetime, timedelta   # ⬅️ tambahin timedelta
+import io, os, csv, glob, logging
+from datetime import datetime
 from decimal import Decimal, getcontext
-from collections import defaultdict
+from spread_bot.incremental import Amended, read_appended, load_state
+from spread_bot.daily_store import DailyStore, new_delta, add_to, hour_of_local
 
 # ---- Config / Paths
 load_dotenv('/root/arbSpread/backend/.env')
@@ -16,6 +17,9 @@ getcontext().prec = 50
 # Scan both legs by default
 FIFO_DIRS = ['/root/arbSpread/backend/db_ext/fifo']
 OUT_PATH  = '/root/arbSpread/backend/db_ext/fifo/_daily.csv'
+DAILY_DB  = '/root/arbSpread/backend/db_ext/fifo/_daily.db'      # hourly buckets (venue, hour, symbol)
+FIFO_STATE_DIR = '/root/arbSpread/backend/db_ext/fifo/_state'
+VENUE     = 'ext'
 OUT_FIELDS = ["Date", "PNL", "Volume"]  # now: Date in UTC
 
 # ---- Helpers
@@ -33,83 +37,133 @@ def parse_dt_jkt(s: str) -> datetime | None:
     except Exception:
         return None
 
-def _iter_fifo_rows(fifo_dirs: list[str]):
+def _fifo_files(fifo_dirs: list[str]) -> list[str]:
+    """Per-symbol csv files in the given fifo dirs (skipping files starting with '_')."""
+    files = []
+    for d in fifo_dirs:
+        if os.path.isdir(d):
+            files += [
+                p for p in sorted(glob.glob(os.path.join(d, "*.csv")))
+                if not os.path.basename(p).startswith("_")
+            ]
+    return files
+
+def _read_source(store: DailyStore, source: str, path: str, build: str):
     """
-    Yield rows from all csv files in the given fifo dirs (skipping files starting with '_').
+    Rows of path appended since source's watermark -> (rows, mark, rebuilt),
+    None when nothing changed. A changed build token or a rewritten file
+    replays the whole file.
     """
-    for d in fifo_dirs:
-        if not os.path.isdir(d):
+    mark = store.mark(source)
+    try:
+        if mark and mark["build"] != build:
+            raise Amended(f"{path} was rebuilt")
+        rows, cursor = read_appended(path, mark["cursor"] if mark else None)
+        rebuilt = False
+    except Amended as e:
+        logger.info(f"🔁 {source}: replaying daily sums ({e})")
+        rows, cursor = read_appended(path, None)
+        rebuilt = True
+    new_mark = {"build": build, "cursor": cursor}
+    if not rebuilt and new_mark == mark:
+        return None
+    return rows, new_mark, rebuilt
+
+# ---- Incremental aggregation
+def sync_fifo(store: DailyStore, fifo_dirs: list[str], src_utc_offset_hours: int = 7) -> int:
+    """
+    Fold FIFO rows appended since the last run into the hourly buckets:
+      - PNL    : realized_pnl
+      - Volume : |qty| * price
+    readable_time is local (UTC+src_utc_offset_hours). Returns rows added.
+    """
+    rows_seen = 0
+    seen_sources = set()
+    for path in _fifo_files(fifo_dirs):
+        symbol = os.path.splitext(os.path.basename(path))[0]
+        source = f"fifo:{symbol}"
+        seen_sources.add(source)
+        build = (load_state(os.path.join(FIFO_STATE_DIR, f"{symbol}.json")) or {}).get("build", "")
+
+        fresh = _read_source(store, source, path, build)
+        if fresh is None:
             continue
-        files = [
-            p for p in sorted(glob.glob(os.path.join(d, "*.csv")))
-            if not os.path.basename(p).startswith("_")
-        ]
-        for path in files:
-            try:
-                with open(path, newline="", encoding="utf-8") as f:
-                    r = csv.DictReader(f)
-                    for row in r:
-                        yield row
-            except Exception as e:
-                logger.info(f"❌ Skipping {path}: {e}")
+        rows, mark, rebuilt = fresh
+
+        delta = new_delta()
+        for row in rows:
+            dt_local = parse_dt_jkt(row.get("readable_time"))
+            if not dt_local:
+                continue
+            qty      = to_dec(row.get("qty"))
+            price    = to_dec(row.get("price"))
+            realized = to_dec(row.get("realized_pnl"))
+            add_to(delta, hour_of_local(dt_local, src_utc_offset_hours), symbol,
+                   pnl=realized, volume=qty.copy_abs() * price, trades=1)
+            rows_seen += 1
+        store.apply(source, mark, delta, reset=("trades", symbol) if rebuilt else None)
+
+    for source in store.sources():
+        if source.startswith("fifo:") and source not in seen_sources:
+            logger.info(f"🗑️ {source}: FIFO file gone, dropping its daily sums")
+            store.drop(source, ("trades", source[len("fifo:"):]))
+    return rows_seen
 
 def build_daily(
     fifo_dirs: list[str] = FIFO_DIRS,
     out_path: str        = OUT_PATH,
     use_utc: bool        = False,   # ⬅️ default: pakai UTC
     src_utc_offset_hours:int = 7,  # readable_time = UTC+7 (JKT)
+    db_path: str         = DAILY_DB,
 ):
     """
-    Build a daily aggregation:
+    Bring the hourly buckets up to date with the new FIFO rows and write
+    the daily view:
       - Date   : if use_utc=True  -> UTC date
                  if use_utc=False -> JKT date (as-is)
       - PNL    : sum of realized_pnl
       - Volume : sum of |qty| * price
+    Per-symbol days come from daily_by_symbol().
     """
-    daily = defaultdict(lambda: {"pnl": Decimal("0"), "vol": Decimal("0")})
-    rows_seen = 0
+    store = DailyStore(db_path, VENUE)
+    rows_seen = sync_fifo(store, fifo_dirs, src_utc_offset_hours)
 
-    for row in _iter_fifo_rows(fifo_dirs):
-        ts = row.get("readable_time")
-        dt_local = parse_dt_jkt(ts)
-        if not dt_local:
-            continue
-
-        if use_utc:
-            # convert from local (UTC+7) → UTC
-            dt = dt_local - timedelta(hours=src_utc_offset_hours)
-        else:
-            dt = dt_local
-
-        key_date = dt.date().isoformat()
-
-        qty      = to_dec(row.get("qty"))
-        price    = to_dec(row.get("price"))
-        realized = to_dec(row.get("realized_pnl"))
-
-        daily[key_date]["pnl"] += realized
-        daily[key_date]["vol"] += qty.copy_abs() * price
-        rows_seen += 1
-
-    if rows_seen == 0:
+    days = store.daily(offsetHours=0 if use_utc else src_utc_offset_hours)
+    if not days:
         logger.info("⚠️ No FIFO rows found to aggregate.")
         return
 
-    out_rows = [
-        {"Date": d, "PNL": str(v["pnl"]), "Volume": str(v["vol"])}
-        for d, v in daily.items()
-    ]
-    # Sort by Date descending for dashboard convenience
-    out_rows.sort(key=lambda x: x["Date"], reverse=True)
+    out_rows = [{"Date": d["date"], "PNL": d["pnl"], "Volume": d["volume"]} for d in days]
 
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=OUT_FIELDS)
-        w.writeheader()
-        for r in out_rows:
-            w.writerow(r)
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=OUT_FIELDS)
+    w.writeheader()
+    w.writerows(out_rows)
+    text = buf.getvalue()
 
-    logger.info(f"✅ Daily written to {out_path} (from {rows_seen} rows), use_utc={use_utc}")
+    # unchanged days: leave the file (and its mtime) alone so readers don't reload
+    if os.path.exists(out_path):
+        with open(out_path, newline="", encoding="utf-8") as f:
+            if f.read() == text:
+                return
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp = f"{out_path}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, out_path)
+
+    logger.info(f"✅ Daily written to {out_path} (+{rows_seen} rows), use_utc={use_utc}")
+
+def daily_by_symbol(use_utc: bool = False, symbol: str | None = None, db_path: str = DAILY_DB,
+                    src_utc_offset_hours: int = 7) -> list[dict]:
+    """Per-symbol daily PNL / Volume straight from the buckets, newest first."""
+    rows = DailyStore(db_path, VENUE).daily(
+        offsetHours=0 if use_utc else src_utc_offset_hours, bySymbol=True, symbol=symbol,
+    )
+    for r in rows:
+        del r["funding"], r["fundings"]
+    return rows
 
 if __name__ == "__main__":
     build_daily()  # default: UTC days from JKT timestamps
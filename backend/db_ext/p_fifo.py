@@ -1,8 +1,10 @@
 # p_fifo_ext.py
 from dotenv import load_dotenv
-import os, csv, glob, json, logging
+import os, csv, glob, json, uuid, logging
 from datetime import datetime, timedelta
 from decimal import Decimal, getcontext
+from spread_bot.incremental import Amended, new_cursor, read_appended, file_cursor, update_merged, load_state, save_state
+from spread_bot.funding_index import FundingIndex, assign_intervals
 
 # --- Config
 load_dotenv('/root/arbSpread/backend/.env')
@@ -13,6 +15,10 @@ getcontext().prec = 50
 RAW_DIR   = '/root/arbSpread/backend/db_ext/raw'
 FIFO_DIR  = '/root/arbSpread/backend/db_ext/fifo'
 FF_PATH   = '/root/arbSpread/backend/db_ext/raw/_fundings.csv'
+STATE_DIR = '/root/arbSpread/backend/db_ext/fifo/_state'     # per-market FIFO checkpoints
+FUNDING_DIR = '/root/arbSpread/backend/db_ext/fifo/_state/fundings'   # _fundings.csv split per market
+
+STATE_VERSION = 2     # 2: funding cursor follows the per-symbol partition
 
 OUTPUT_FIELDS = [
     "market", "readable_time", "qty", "price", "trade_type",
@@ -88,8 +94,21 @@ def ensure_headers_and_write(path: str, rows: list[dict], headers: list[str]):
 def compute_pnl(close_qty: Decimal, exit_price: Decimal, was_long: bool, avg_entry: Decimal) -> Decimal:
     return close_qty * (exit_price - avg_entry) if was_long else close_qty * (avg_entry - exit_price)
 
+# --- Engine state (resumable FIFO)
+def load_engine_state(state: dict | None, market: str):
+    """(running_qty, avg_entry, exit_qty_acc, avg_exit) saved for market, zeros if none."""
+    st = (state or {}).get(market) or {}
+    return tuple(to_dec(st.get(k)) for k in ("running_qty", "avg_entry", "exit_qty_acc", "avg_exit"))
+
+def save_engine_state(state: dict | None, market: str, running_qty, avg_entry, exit_qty_acc, avg_exit):
+    if state is not None:
+        state[market] = {
+            "running_qty": str(running_qty), "avg_entry": str(avg_entry),
+            "exit_qty_acc": str(exit_qty_acc), "avg_exit": str(avg_exit),
+        }
+
 # --- FIFO for Extended schema
-def fifo_process_extended(rows: list[dict]) -> list[dict]:
+def fifo_process_extended(rows: list[dict], state: dict | None = None) -> list[dict]:
     """
     Expects rows with these columns (as in db_ext raw):
       - market, created_time (ms/s), price, qty, side (BUY/SELL), fee, is_taker
@@ -108,10 +127,7 @@ def fifo_process_extended(rows: list[dict]) -> list[dict]:
         # time ASC for FIFO mechanics
         mrows.sort(key=lambda r: parse_epochish(r.get("created_time")))
 
-        running_qty = Decimal("0")
-        avg_entry   = Decimal("0")
-        exit_qty_acc= Decimal("0")
-        avg_exit    = Decimal("0")
+        running_qty, avg_entry, exit_qty_acc, avg_exit = load_engine_state(state, mkt)
 
         def emit(ts, qty, price, ttype, trade_pnl: Decimal, trading_fees: Decimal):
             realized = trade_pnl - trading_fees  # funding attached later
@@ -202,112 +218,160 @@ def fifo_process_extended(rows: list[dict]) -> list[dict]:
                     avg_entry = price
                     emit(ts, leftover_signed, price, "ADD_L" if leftover_signed > 0 else "ADD_S", Decimal("0"), fee_add)
 
+        save_engine_state(state, mkt, running_qty, avg_entry, exit_qty_acc, avg_exit)
+
     return out
 
-# --- Funding integration (Extended)
-def integrate_funding_into_trades(trades_path: str, fundings_path: str):
+# --- Funding attribution (Extended)
+def funding_items(rows, symbol: str) -> list[tuple[str, Decimal]]:
     """
-    Assign each funding payment to the first CLOSE/REDUCE trade at or after its JKT time.
+    (JKT readable time, fundingFee) of this market's funding rows, oldest first.
     Funding CSV columns (examples):
       accountId,fundingFee,fundingRate,id,markPrice,market,paidTime,readable_paidTime,side,size
-    We use:
-      - market (string match to trades 'market')
-      - fundingFee (signed): positive cost, negative rebate
-      - readable_paidTime (already JKT)
+    readable_paidTime is already JKT; paidTime (epoch) is the fallback.
     """
-    if not (os.path.exists(trades_path) and os.path.exists(fundings_path)):# no-op
-        return
+    items = []
+    for row in rows:
+        sym = (row.get("market") or row.get("symbol") or "").strip()
+        if sym != symbol:
+            continue
+        rtime = row.get("readable_paidTime")
+        if not rtime:
+            ts = parse_epochish(row.get("paidTime"))
+            rtime = readable_jkt_from_epoch(ts) if ts else ""
+        if not parse_jkt(rtime):
+            continue
+        items.append((rtime.strip(), to_dec(row.get("fundingFee"))))
+    items.sort(key=lambda x: x[0])
+    return items
+
+def attach_funding(trades: list[dict], pending: list[tuple[str, Decimal]]) -> list[tuple[str, Decimal]]:
+    """
+    Each funding payment goes to the first CLOSE/REDUCE trade at or after its
+    JKT time. trades are new FIFO rows; pending are fundings not attached yet,
+    oldest first. Returns what is still unattached.
+    Close rows own the interval since the previous close; each payment is
+    placed by bisect over their times.
+    """
+    # same-second ties: CLOSE before REDUCE, bigger first (the order of the old desc files)
+    closes = sorted(
+        (t for t in trades if (t.get("trade_type") or "").startswith(("CLOSE", "REDUCE"))),
+        key=lambda t: (t["readable_time"], TYPE_PRIORITY.get(t.get("trade_type"), 9), -abs_qty(t)),
+    )
+    owners = assign_intervals([t["readable_time"] for t in closes], [p[0] for p in pending])
 
-    # Load trades
-    with open(trades_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        trades = list(reader)
-        fieldnames = reader.fieldnames or []
-
-    for col in ("funding_fees", "funding_fee_details", "trading_fees", "trade_pnl", "realized_pnl"):
-        if col not in fieldnames:
-            fieldnames.append(col)
-
-    # Prepare trades
-    for t in trades:
-        t["_dt"] = parse_jkt(t.get("readable_time"))
-        # normalize numeric strings
-        t["trade_pnl"]    = str(to_dec(t.get("trade_pnl")))
-        t["trading_fees"] = str(to_dec(t.get("trading_fees")))
-        if not t.get("funding_fee_details"):
-            t["funding_fee_details"] = "[]"
+    taken: dict[int, list] = {}
+    left = []
+    for p, i in zip(pending, owners):
+        if i is None:
+            left.append(p)
         else:
-            try:
-                json.loads(t["funding_fee_details"])
-            except Exception:
-                t["funding_fee_details"] = "[]"
-        if not t.get("funding_fees"):
-            t["funding_fees"] = "0"
-        # recompute realized
-        t["realized_pnl"] = str(to_dec(t["trade_pnl"]) - to_dec(t["trading_fees"]) + to_dec(t["funding_fees"]))
-
-    # Load fundings
-    with open(fundings_path, newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        all_fundings = []
-        for row in r:
-            sym = (row.get("market") or row.get("symbol") or "").strip()
-            if not sym: continue
-            # prefer readable_paidTime (already JKT); fallback to paidTime epoch
-            rtime = row.get("readable_paidTime")
-            if rtime:
-                ts_dt = parse_jkt(rtime)
-            else:
-                ts = parse_epochish(row.get("paidTime"))
-                ts_dt = datetime.utcfromtimestamp(ts) + timedelta(hours=7) if ts else None
-            if ts_dt is None: continue
-            ff = to_dec(row.get("fundingFee"))
-            all_fundings.append({"symbol": sym, "ts": ts_dt, "fee": ff})
-
-    symbol = os.path.splitext(os.path.basename(trades_path))[0]
-    fitems = [f for f in all_fundings if f["symbol"] == symbol]
-    if fitems:
-        fitems.sort(key=lambda x: x["ts"])
-        trades.sort(key=lambda t: t["_dt"] or datetime.min)
-
-        pending_sum: Decimal = Decimal("0")
-        pending_list: list[float] = []
-
-        for item in fitems:
-            ts = item["ts"]; amt = item["fee"]
-            matched = False
-            for t in trades:
-                if t["_dt"] and t["_dt"] >= ts and (t.get("trade_type") or "").startswith(("CLOSE","REDUCE")):
-                    # attach here (include any previous unassigned funding)
-                    try:
-                        details = json.loads(t["funding_fee_details"]) if isinstance(t["funding_fee_details"], str) else []
-                    except Exception:
-                        details = []
-                    details.extend(pending_list + [float(amt)])
-                    new_funding = to_dec(t["funding_fees"]) + pending_sum + amt
-                    t["funding_fees"] = str(new_funding)
-                    t["funding_fee_details"] = json.dumps(details)
-                    t["realized_pnl"] = str(to_dec(t["trade_pnl"]) - to_dec(t["trading_fees"]) + new_funding)
-
-                    pending_sum = Decimal("0")
-                    pending_list = []
-                    matched = True
-                    break
-            if not matched:
-                pending_sum += amt
-                pending_list.append(float(amt))
-
-        if pending_sum != 0:
-            logger.info(f"⚠️ {symbol}: {pending_sum} funding left unassigned")
-
-    # write back
-    for t in trades:
-        t.pop("_dt", None)
-    ensure_headers_and_write(trades_path, trades, fieldnames)
+            taken.setdefault(i, []).append(p)
+
+    for i, take in taken.items():
+        t = closes[i]
+        details = json.loads(t["funding_fee_details"]) + [float(amt) for _, amt in take]
+        new_funding = to_dec(t["funding_fees"]) + sum((amt for _, amt in take), Decimal("0"))
+        t["funding_fees"] = str(new_funding)
+        t["funding_fee_details"] = json.dumps(details)
+        t["realized_pnl"] = str(to_dec(t["trade_pnl"]) - to_dec(t["trading_fees"]) + new_funding)
+    return left
+
+def append_rows(path: str, rows: list[dict], headers: list[str]):
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
+        w.writerows(rows)
 
 # --- Main
-def process_all_fifo():
-    logger.info("process_all_fifo (EXT) started")
+def _fresh_state() -> dict:
+    return {
+        "version": STATE_VERSION,
+        "build": uuid.uuid4().hex,          # changes on every full rebuild (p_cycle / merges watch it)
+        "raw": new_cursor(), "funding": new_cursor(), "fifo": None,
+        "engine": {}, "last_ts": 0, "last_trade_id": "",
+        "last_close_time": "", "pending": [],
+    }
+
+def _advance(state: dict, src: str, ff_src: str, symbol: str) -> list[dict]:
+    """
+    Run the FIFO engine over the raw rows and fundings appended since state
+    and return the new FIFO rows (oldest first). Raises Amended when the new
+    input does not extend the checkpoint; the caller rebuilds.
+    """
+    raw_rows, state["raw"] = read_appended(src, state["raw"])
+    ff_rows, state["funding"] = read_appended(ff_src or FF_PATH, state["funding"])
+
+    new_funding = funding_items(ff_rows, symbol)
+    if new_funding and state["last_close_time"] and new_funding[0][0] <= state["last_close_time"]:
+        raise Amended(f"late funding {new_funding[0][0]} <= last close {state['last_close_time']}")
+
+    if raw_rows:
+        first_ts = min(parse_epochish(r.get("created_time")) for r in raw_rows)
+        # same second as the checkpoint too: ties there decide where funding goes
+        if first_ts <= state["last_ts"]:
+            raise Amended(f"trade at {first_ts} not newer than checkpoint {state['last_ts']}")
+        state["last_ts"] = max(parse_epochish(r.get("created_time")) for r in raw_rows)
+        state["last_trade_id"] = str(raw_rows[-1].get("id") or "")
+
+    out_rows = fifo_process_extended(raw_rows, state["engine"])
+
+    pending = sorted([(t, to_dec(a)) for t, a in state["pending"]] + new_funding, key=lambda x: x[0])
+    pending = attach_funding(out_rows, pending)
+    state["pending"] = [[t, str(a)] for t, a in pending]
+    closes = [r["readable_time"] for r in out_rows if r["trade_type"].startswith(("CLOSE", "REDUCE"))]
+    if closes:
+        state["last_close_time"] = max(closes + [state["last_close_time"]])
+    return out_rows
+
+def process_symbol_fifo(src: str, dst: str, ff_src: str | None = None) -> tuple[int, bool]:
+    """
+    Bring fifo/{MARKET}.csv up to date with raw/{MARKET}.csv, resuming from
+    fifo/_state/{MARKET}.json. Rows are appended oldest first; the file is
+    rebuilt from scratch only when the checkpoint cannot be extended.
+    ff_src is the market's funding partition (default: the whole FF_PATH).
+    Returns (new rows, rebuilt).
+    """
+    stem = os.path.splitext(os.path.basename(src))[0]
+    state_path = os.path.join(STATE_DIR, f"{stem}.json")
+
+    state = load_state(state_path)
+    rebuilt = False
+    try:
+        if not state or state.get("version") != STATE_VERSION or not state.get("fifo"):
+            raise Amended("no usable checkpoint")
+        if state.get("funding_src") != ff_src:
+            raise Amended("funding source changed")
+        leftover, _ = read_appended(dst, state["fifo"])
+        if leftover:
+            raise Amended(f"{dst} was modified outside the FIFO pass")
+        out_rows = _advance(state, src, ff_src, stem)
+        append_rows(dst, out_rows, OUTPUT_FIELDS)
+    except Amended as e:
+        if state:
+            logger.info(f"🔁 {stem}: full FIFO rebuild ({e})")
+        rebuilt = True
+        state = _fresh_state()
+        state["funding_src"] = ff_src
+        out_rows = _advance(state, src, ff_src, stem)
+        ensure_headers_and_write(dst, out_rows, OUTPUT_FIELDS)
+
+    if state["pending"]:
+        pending_sum = sum((to_dec(a) for _, a in state["pending"]), Decimal("0"))
+        logger.info(f"⚠️ {stem}: {pending_sum} funding left unassigned")
+
+    state["fifo"] = file_cursor(dst, OUTPUT_FIELDS)
+    save_state(state_path, state)
+    return len(out_rows), rebuilt
+
+def prepare_fifo() -> list[tuple]:
+    """
+    Partition the new fundings once, then list one job per market:
+    (raw src, fifo dst, funding partition) for process_symbol_fifo.
+    """
+    fundings = FundingIndex(FF_PATH, FUNDING_DIR, lambda r: r.get("market") or r.get("symbol"))
+    n_ff = fundings.sync()
+    if n_ff:
+        logger.info(f"📥 {n_ff} new fundings partitioned by market")
 
     os.makedirs(FIFO_DIR, exist_ok=True)
     files = [p for p in sorted(glob.glob(os.path.join(RAW_DIR, "*.csv")))
@@ -315,60 +379,52 @@ def process_all_fifo():
 
     if not files:
         logger.info(f"⚠️ No CSV files found in {RAW_DIR}")
+    jobs = []
+    for src in files:
+        stem = os.path.splitext(os.path.basename(src))[0]
+        jobs.append((src, os.path.join(FIFO_DIR, os.path.basename(src)), fundings.path(stem)))
+    return jobs
+
+def process_all_fifo():
+    logger.info("process_all_fifo (EXT) started")
+    jobs = prepare_fifo()
+    if not jobs:
         return
 
-    for src in files:
-        name = os.path.basename(src)
-        dst  = os.path.join(FIFO_DIR, name)
+    total, rebuilds = 0, 0
+    for job in jobs:
         try:
-            with open(src, newline="", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-
-            out_rows = fifo_process_extended(rows)
-            out_rows.sort(key=row_sort_key)
-            ensure_headers_and_write(dst, out_rows, OUTPUT_FIELDS)
-
-            # integrate funding + final sort
-            integrate_funding_into_trades(dst, FF_PATH)
-            with open(dst, newline="", encoding="utf-8") as f:
-                rr = csv.DictReader(f)
-                rows2 = list(rr)
-                hdrs = rr.fieldnames or OUTPUT_FIELDS
-            rows2.sort(key=row_sort_key)
-            ensure_headers_and_write(dst, rows2, hdrs)
-
+            n, rebuilt = process_symbol_fifo(*job)
+            total += n
+            rebuilds += rebuilt
         except Exception as e:
-            logger.info(f"❌ Failed {src}: {e}")
+            logger.info(f"❌ Failed {job[0]}: {e}")
+    logger.info(f"✅ FIFO (EXT): {total} new rows, {rebuilds} rebuilt of {len(jobs)} markets")
 
 # --- Optional helpers similar to Lighter
 def build_allSymbols(
     fifo_dir=FIFO_DIR,
     out_path=os.path.join(FIFO_DIR, "_allSymbols.csv"),
 ):
-    os.makedirs(fifo_dir, exist_ok=True)
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    files = [p for p in sorted(glob.glob(os.path.join(fifo_dir, "*.csv")))
-             if not os.path.basename(p).startswith("_")]
+    """
+    Keep _allSymbols.csv as the append-only merge of the per-symbol FIFO
+    files: only rows appended since the last merge are added (oldest first,
+    read it from the end for the newest). A rebuilt symbol re-merges all.
+    """
+    files = [f for f in sorted(glob.glob(os.path.join(fifo_dir, "*.csv")))
+             if not os.path.basename(f).startswith("_")]
     if not files:
         logger.info(f"⚠️ No FIFO CSVs found in {fifo_dir}")
         return
 
-    rows = []
+    sources = {}
     for path in files:
-        try:
-            with open(path, newline="", encoding="utf-8") as f:
-                r = csv.DictReader(f)
-                for row in r:
-                    if row.get("market") and row.get("readable_time"):
-                        rows.append(row)
-        except Exception as e:
-            logger.info(f"❌ Skipping {path}: {e}")
-
-    if not rows:
-        logger.info("⚠️ No data rows to merge.")
-        return
+        stem = os.path.splitext(os.path.basename(path))[0]
+        sources[stem] = (path, (load_state(os.path.join(STATE_DIR, f"{stem}.json")) or {}).get("build", ""), None)
 
-    rows.sort(key=lambda r: (-epoch_from_row(r), r.get("market","")))
-    ensure_headers_and_write(out_path, rows, OUTPUT_FIELDS)
-    logger.info(f"📦 Merged → {out_path}")
+    n, rebuilt = update_merged(
+        out_path, os.path.join(STATE_DIR, "_allSymbols.json"), sources, OUTPUT_FIELDS,
+        sortKey=lambda r: (r.get("readable_time") or "", r.get("market") or ""),
+    )
+    if n or rebuilt:
+        logger.info(f"📦 Merged {n} rows{' (rebuilt)' if rebuilt else ''} → {out_path}")
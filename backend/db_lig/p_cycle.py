@@ -1,9 +1,11 @@
 # p_cycle.py
 from __future__ import annotations
 from dotenv import load_dotenv
-import os, csv, glob, json, logging
+import os, csv, glob, json, time, uuid, logging
 from datetime import datetime
 from decimal import Decimal, getcontext
+from spread_bot.incremental import Amended, read_appended, check_cursor, write_frozen, update_merged, load_state, save_state
+from db_lig import p_fifo
 
 # ---- Configs / Paths
 load_dotenv('/root/arbSpread/backend/.env')
@@ -14,6 +16,10 @@ getcontext().prec = 50
 
 FIFO_DIR   = '/root/arbSpread/backend/db_lig/fifo'
 CYCLE_DIR  = '/root/arbSpread/backend/db_lig/cycle'
+STATE_DIR  = '/root/arbSpread/backend/db_lig/cycle/_state'      # per-symbol cycle checkpoints
+FIFO_STATE_DIR = '/root/arbSpread/backend/db_lig/fifo/_state'
+
+STATE_VERSION = 1
 # Note: funding already integrated at FIFO-row level; we aggregate those here.
 
 OUT_FIELDS = [
@@ -54,14 +60,6 @@ def merge_details(a: list[float] | str | None, b: list[float] | str | None) -> l
         return []
     return _norm(a) + _norm(b)
 
-def cycle_sort_key(row: dict):
-    # Sort by exit_time DESC (empty first), then entry_time DESC
-    def _ts(s):
-        dt = parse_dt_jkt(s)
-        # Empty exit_time should come first -> treat empty as very large
-        return int(dt.timestamp()) if dt else (10**15 if not s else 0)
-    return (-_ts(row.get("exit_time") or ""), -_ts(row.get("entry_time") or ""))
-
 def _new_empty_cycle():
     return {
         "market": "",
@@ -96,34 +94,33 @@ def _finalize_cycle_row(current: dict, realized: Decimal, open_cycle: bool=False
     }
 
 # ---- Core
-def build_cycles_for_file(fifo_path: str, out_path: str):
+def _new_builder() -> dict:
+    return {
+        "running_qty": Decimal("0"),
+        "current": _new_empty_cycle(),
+        "entry_notional": Decimal("0"), "entry_qty": Decimal("0"),
+        "exit_notional": Decimal("0"),  "exit_qty": Decimal("0"),
+    }
+
+def apply_fifo_rows(rows: list[dict], b: dict) -> list[dict]:
     """
-    Collapse FIFO rows (per symbol) into cycle rows:
+    Feed FIFO rows (oldest first) into the cycle builder b and return the
+    cycles they closed:
       - A cycle starts at first ADD_* when running position goes from 0 -> nonzero
       - A cycle ends when running position returns to 0 (CLOSE_* or close leg of a flip)
       - Flip is already split in FIFO as CLOSE_* then ADD_*; one row ends the cycle, next row starts new cycle.
       - entry_price = VWAP of ADD legs; exit_price = VWAP of REDUCE/CLOSE legs.
     """
-    with open(fifo_path, newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        rows = list(r)
-
-    # Sort FIFO rows chronologically ascending to reconstruct state robustly
-    def _row_ts(row):
-        dt = parse_dt_jkt(row.get("readable_time"))
-        return int(dt.timestamp()) if dt else 0
-    rows.sort(key=_row_ts)
-
     cycles = []
 
-    running_qty = Decimal("0")
-    current = _new_empty_cycle()
+    running_qty = b["running_qty"]
+    current = b["current"]
 
     # VWAP accumulators
-    entry_notional = Decimal("0")
-    entry_qty = Decimal("0")
-    exit_notional = Decimal("0")
-    exit_qty = Decimal("0")
+    entry_notional = b["entry_notional"]
+    entry_qty = b["entry_qty"]
+    exit_notional = b["exit_notional"]
+    exit_qty = b["exit_qty"]
 
     for row in rows:
         market = row.get("market") or ""
@@ -191,29 +188,101 @@ def build_cycles_for_file(fifo_path: str, out_path: str):
             # Unknown type; ignore but keep state intact
             pass
 
-    # If file ends with a *partial* (not yet flat) cycle, emit a row with empty exit_time
-    if current["entry_time"] and (current["qty_opened"] > 0) and (current["market"] or rows):
-        current["entry_price"] = (entry_notional / entry_qty) if entry_qty != 0 else Decimal("0")
-        current["exit_price"]  = (exit_notional / exit_qty)   if exit_qty  != 0 else ""  # blank if no closes yet
-        realized = current["trade_pnl"] - current["trading_fees"] + current["funding_fees"]
-        cycles.append(_finalize_cycle_row(current, realized, open_cycle=True))
-
-    # Sort: open cycles first (empty exit_time), then by exit_time desc, then entry_time desc
-    cycles.sort(key=cycle_sort_key)
-
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=OUT_FIELDS)
-        w.writeheader()
-        for c in cycles:
-            # ensure keys exist
-            row = {k: c.get(k, "") for k in OUT_FIELDS}
-            w.writerow(row)
+    b.update(running_qty=running_qty, current=current,
+             entry_notional=entry_notional, entry_qty=entry_qty,
+             exit_notional=exit_notional, exit_qty=exit_qty)
+    return cycles
+
+def open_cycle_row(b: dict, pending: list | None = None) -> dict | None:
+    """
+    The partial (not yet flat) cycle of builder b as a row with empty
+    exit_time, if any. pending are the FIFO fundings paid after the last
+    close ([time, amount], FIFO state): they fall in the open interval, so
+    they are shown on the open cycle until a close takes them.
+    """
+    current = dict(b["current"])
+    if not (current["entry_time"] and current["qty_opened"] > 0):
+        return None
+    if pending:
+        current["funding_fees"] = current["funding_fees"] + sum((to_dec(a) for _, a in pending), Decimal("0"))
+        current["funding_fee_details"] = current["funding_fee_details"] + [float(a) for _, a in pending]
+    current["entry_price"] = (b["entry_notional"] / b["entry_qty"]) if b["entry_qty"] != 0 else Decimal("0")
+    current["exit_price"]  = (b["exit_notional"] / b["exit_qty"])   if b["exit_qty"]  != 0 else ""  # blank if no closes yet
+    realized = current["trade_pnl"] - current["trading_fees"] + current["funding_fees"]
+    return _finalize_cycle_row(current, realized, open_cycle=True)
+
+# ---- Incremental per-symbol pass
+BUILDER_DEC_KEYS = ("running_qty", "entry_notional", "entry_qty", "exit_notional", "exit_qty")
+CYCLE_DEC_KEYS   = ("qty_opened", "qty_closed", "entry_price", "trade_pnl", "trading_fees", "funding_fees")
+
+def _dump_builder(b: dict) -> dict:
+    current = {k: (str(v) if isinstance(v, Decimal) else v) for k, v in b["current"].items()}
+    return {"current": current, **{k: str(b[k]) for k in BUILDER_DEC_KEYS}}
+
+def _load_builder(d: dict) -> dict:
+    current = dict(d["current"])
+    for k in CYCLE_DEC_KEYS:
+        current[k] = to_dec(current[k])
+    if current["exit_price"] != "":
+        current["exit_price"] = to_dec(current["exit_price"])
+    return {"current": current, **{k: to_dec(d[k]) for k in BUILDER_DEC_KEYS}}
+
+def _row_ts(row):
+    dt = parse_dt_jkt(row.get("readable_time"))
+    return int(dt.timestamp()) if dt else 0
+
+def process_symbol_cycles(src: str, dst: str) -> tuple[int, bool]:
+    """
+    Bring cycle/{SYMBOL}.csv up to date with the rows appended to
+    fifo/{SYMBOL}.csv since cycle/_state/{SYMBOL}.json. Closed cycles never
+    change, so they are frozen and appended oldest first; the open cycle is
+    the last row and is rewritten in place. A rebuilt FIFO file (new build
+    token) or a touched cycle file rebuilds the symbol from scratch.
+    Returns (cycles closed, rebuilt).
+    """
+    stem = os.path.splitext(os.path.basename(src))[0]
+    state_path = os.path.join(STATE_DIR, f"{stem}.json")
+    fifo_state = load_state(os.path.join(FIFO_STATE_DIR, f"{stem}.json")) or {}
+    fifo_build = fifo_state.get("build", "")
+    pending = fifo_state.get("pending") or []
+
+    state = load_state(state_path)
+    try:
+        if not state or state.get("version") != STATE_VERSION:
+            raise Amended("no usable checkpoint")
+        if state["fifo_build"] != fifo_build:
+            raise Amended("FIFO was rebuilt")
+        rows, fifo_cursor = read_appended(src, state["fifo"])
+        b = _load_builder(state["builder"])
+        closed = apply_fifo_rows(rows, b)
+        open_row = open_cycle_row(b, pending)
+        if not rows and open_row == state["open"]:
+            check_cursor(dst, state["closed"])
+            return 0, False
+        frozen = write_frozen(dst, state["closed"], OUT_FIELDS, closed, [open_row] if open_row else [])
+        build, rebuilt = state["build"], False
+    except Amended as e:
+        if state:
+            logger.info(f"🔁 {stem}: full cycle rebuild ({e})")
+        rows, fifo_cursor = read_appended(src, None)
+        rows.sort(key=_row_ts)
+        b = _new_builder()
+        closed = apply_fifo_rows(rows, b)
+        open_row = open_cycle_row(b, pending)
+        frozen = write_frozen(dst, None, OUT_FIELDS, closed, [open_row] if open_row else [])
+        build, rebuilt = uuid.uuid4().hex, True
+
+    save_state(state_path, {
+        "version": STATE_VERSION, "build": build, "fifo_build": fifo_build,
+        "fifo": fifo_cursor, "builder": _dump_builder(b),
+        "closed": frozen, "open": open_row,
+    })
+    return len(closed), rebuilt
 
 def process_all_cycles():
     """
-    Read all symbol CSVs from FIFO_DIR (skip files starting with '_'),
-    and write cycle CSVs into CYCLE_DIR with the same filenames.
+    Update the cycle CSVs in CYCLE_DIR from the FIFO CSVs in FIFO_DIR (skip
+    files starting with '_'), same filenames, from newly appended rows only.
     """
     os.makedirs(CYCLE_DIR, exist_ok=True)
     files = [p for p in sorted(glob.glob(os.path.join(FIFO_DIR, "*.csv")))
@@ -226,30 +295,45 @@ def process_all_cycles():
         name = os.path.basename(src)
         dst  = os.path.join(CYCLE_DIR, name)
         try:
-            build_cycles_for_file(src, dst)
+            process_symbol_cycles(src, dst)
         except Exception as e:
             logger.info(f"❌ Failed {src}: {e}")
 
-# ---- Merge all cycle files into one table
-def _write_csv(path: str, rows: list[dict], headers: list[str]):
-    headers = list(dict.fromkeys(headers))
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=headers)
-        w.writeheader()
-        for r in rows:
-            w.writerow({k: r.get(k, "") for k in headers})
+# ---- One symbol end to end (pipeline worker)
+def process_symbol(fifo_job: tuple) -> dict:
+    """
+    FIFO then cycles for one symbol; fifo_job comes from p_fifo.prepare_fifo.
+    Runs in a pipeline worker process, so errors are returned, not raised.
+    """
+    t0 = time.perf_counter()
+    fifo_dst = fifo_job[1]
+    result = {
+        "symbol": os.path.splitext(os.path.basename(fifo_dst))[0],
+        "fifo": 0, "fifo_rebuilt": False, "cycles": 0, "cycle_rebuilt": False,
+        "error": "", "seconds": 0.0,
+    }
+    try:
+        result["fifo"], result["fifo_rebuilt"] = p_fifo.process_symbol_fifo(*fifo_job)
+        os.makedirs(CYCLE_DIR, exist_ok=True)
+        result["cycles"], result["cycle_rebuilt"] = process_symbol_cycles(
+            fifo_dst, os.path.join(CYCLE_DIR, os.path.basename(fifo_dst)),
+        )
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - t0
+    return result
 
+# ---- Merge all cycle files into one table
 def build_allSymbols(
     cycle_dir: str = CYCLE_DIR,
     out_path: str = os.path.join(CYCLE_DIR, "_allSymbols.csv"),
 ):
     """
-    Merge all per-symbol cycle CSVs into a single _allSymbols.csv:
-      - Skips files starting with '_'
-      - Sorts: open cycles first (empty exit_time), then by exit_time DESC, then entry_time DESC
+    Keep _allSymbols.csv as the merge of the per-symbol cycle CSVs:
+      - Closed cycles are appended as they freeze (by exit_time, oldest first)
+      - The open cycles of all symbols follow as trailing rows, rewritten each time
+      - Read it from the end for open cycles first, then the newest closed ones
     """
-    os.makedirs(cycle_dir, exist_ok=True)
     files = [
         p for p in sorted(glob.glob(os.path.join(cycle_dir, "*.csv")))
         if not os.path.basename(p).startswith("_")
@@ -258,22 +342,21 @@ def build_allSymbols(
         logger.info(f"⚠️ No cycle CSVs found in {cycle_dir}")
         return
 
-    rows: list[dict] = []
+    sources, opens = {}, []
     for path in files:
-        try:
-            with open(path, newline="", encoding="utf-8") as f:
-                r = csv.DictReader(f)
-                for row in r:
-                    if not row.get("market") or not row.get("entry_time"):
-                        continue
-                    rows.append(row)
-        except Exception as e:
-            logger.info(f"❌ Skipping {path}: {e}")
-
-    if not rows:
-        logger.info("⚠️ No cycle rows to merge.")
-        return
-
-    rows.sort(key=cycle_sort_key)
-    _write_csv(out_path, rows, OUT_FIELDS)
-    logger.info(f"📦 Cycle merged → {out_path}")
+        stem = os.path.splitext(os.path.basename(path))[0]
+        st = load_state(os.path.join(STATE_DIR, f"{stem}.json"))
+        if not st:
+            continue
+        sources[stem] = (path, st["build"], st["closed"]["offset"])
+        if st.get("open"):
+            opens.append(st["open"])
+    opens.sort(key=lambda r: r.get("entry_time") or "")
+
+    n, rebuilt = update_merged(
+        out_path, os.path.join(STATE_DIR, "_allSymbols.json"), sources, OUT_FIELDS,
+        sortKey=lambda r: (r.get("exit_time") or "", r.get("entry_time") or ""),
+        trailer=opens,
+    )
+    if n or rebuilt:
+        logger.info(f"📦 Cycle merged {n} rows{' (rebuilt)' if rebuilt else ''} → {out_path}")
@@ -1,10 +1,12 @@
 # p_daily.py
 from __future__ import annotations
 from dotenv import load_dotenv
-import os, csv, glob, logging
-from datetime import datetime, timedelta   # ⬅️ already there
+import io, os, csv, glob, logging
+from datetime import datetime
 from decimal import Decimal, getcontext
-from collections import defaultdict
+from spread_bot.incremental import Amended, read_appended, load_state
+from spread_bot.daily_store import DailyStore, new_delta, add_to, hour_of_epoch, hour_of_local
+from spread_bot.raw_store import safe_symbol
 
 # ---- Config / Paths
 load_dotenv('/root/arbSpread/backend/.env')
@@ -17,6 +19,9 @@ getcontext().prec = 50
 FIFO_DIRS = ['/root/arbSpread/backend/db_lig/fifo']
 OUT_PATH  = '/root/arbSpread/backend/db_lig/fifo/_daily.csv'
 FF_PATH   = '/root/arbSpread/backend/db_lig/raw/_fundings.csv'   # ⬅️ NEW
+DAILY_DB  = '/root/arbSpread/backend/db_lig/fifo/_daily.db'      # hourly buckets (venue, hour, symbol)
+FIFO_STATE_DIR = '/root/arbSpread/backend/db_lig/fifo/_state'
+VENUE     = 'lig'
 
 # ⬇️ I only ADD "Funding" column; Date/PNL/Volume tetap ada
 OUT_FIELDS = ["Date", "PNL", "Funding", "Volume"]  # Date in UTC by default
@@ -39,25 +44,110 @@ def parse_dt_jkt(s: str) -> datetime | None:
         return None
 
 
-def _iter_fifo_rows(fifo_dirs: list[str]):
+def _fifo_files(fifo_dirs: list[str]) -> list[str]:
+    """Per-symbol csv files in the given fifo dirs (skipping files starting with '_')."""
+    files = []
+    for d in fifo_dirs:
+        if os.path.isdir(d):
+            files += [
+                p for p in sorted(glob.glob(os.path.join(d, "*.csv")))
+                if not os.path.basename(p).startswith("_")
+            ]
+    return files
+
+
+def _read_source(store: DailyStore, source: str, path: str, build: str):
     """
-    Yield rows from all csv files in the given fifo dirs (skipping files starting with '_').
+    Rows of path appended since source's watermark -> (rows, mark, rebuilt),
+    None when nothing changed. A changed build token or a rewritten file
+    replays the whole file.
     """
-    for d in fifo_dirs:
-        if not os.path.isdir(d):
+    mark = store.mark(source)
+    try:
+        if mark and mark["build"] != build:
+            raise Amended(f"{path} was rebuilt")
+        rows, cursor = read_appended(path, mark["cursor"] if mark else None)
+        rebuilt = False
+    except Amended as e:
+        logger.info(f"🔁 {source}: replaying daily sums ({e})")
+        rows, cursor = read_appended(path, None)
+        rebuilt = True
+    new_mark = {"build": build, "cursor": cursor}
+    if not rebuilt and new_mark == mark:
+        return None
+    return rows, new_mark, rebuilt
+
+
+# ---- Incremental aggregation
+def sync_fifo(store: DailyStore, fifo_dirs: list[str], src_utc_offset_hours: int = 7) -> int:
+    """
+    Fold FIFO rows appended since the last run into the hourly buckets:
+      - PNL    : trade_pnl + trading_fees
+      - Volume : |qty| * price
+    readable_time is local (UTC+src_utc_offset_hours). Returns rows added.
+    """
+    rows_seen = 0
+    seen_sources = set()
+    for path in _fifo_files(fifo_dirs):
+        symbol = os.path.splitext(os.path.basename(path))[0]
+        source = f"fifo:{symbol}"
+        seen_sources.add(source)
+        build = (load_state(os.path.join(FIFO_STATE_DIR, f"{symbol}.json")) or {}).get("build", "")
+
+        fresh = _read_source(store, source, path, build)
+        if fresh is None:
+            continue
+        rows, mark, rebuilt = fresh
+
+        delta = new_delta()
+        for row in rows:
+            dt_local = parse_dt_jkt(row.get("readable_time"))
+            if not dt_local:
+                continue
+            qty      = to_dec(row.get("qty"))
+            price    = to_dec(row.get("price"))
+            realized = to_dec(row.get("trade_pnl")) + to_dec(row.get("trading_fees"))
+            add_to(delta, hour_of_local(dt_local, src_utc_offset_hours), symbol,
+                   pnl=realized, volume=qty.copy_abs() * price, trades=1)
+            rows_seen += 1
+        store.apply(source, mark, delta, reset=("trades", symbol) if rebuilt else None)
+
+    for source in store.sources():
+        if source.startswith("fifo:") and source not in seen_sources:
+            logger.info(f"🗑️ {source}: FIFO file gone, dropping its daily sums")
+            store.drop(source, ("trades", source[len("fifo:"):]))
+    return rows_seen
+
+
+def sync_funding(store: DailyStore, ff_path: str = FF_PATH) -> int:
+    """Fold funding rows appended to _fundings.csv (timestamp already UTC) into the buckets."""
+    if not os.path.exists(ff_path):
+        logger.info(f"⚠️ Funding file not found: {ff_path}")
+        return 0
+
+    fresh = _read_source(store, "funding", ff_path, "")
+    if fresh is None:
+        return 0
+    rows, mark, rebuilt = fresh
+
+    delta = new_delta()
+    ff_rows = 0
+    for row in rows:
+        ts_raw = row.get("timestamp")
+        if not ts_raw:
             continue
-        files = [
-            p for p in sorted(glob.glob(os.path.join(d, "*.csv")))
-            if not os.path.basename(p).startswith("_")
-        ]
-        for path in files:
-            try:
-                with open(path, newline="", encoding="utf-8") as f:
-                    r = csv.DictReader(f)
-                    for row in r:
-                        yield row
-            except Exception as e:
-                logger.info(f"❌ Skipping {path}: {e}")
+        try:
+            # epoch seconds in UTC
+            ts_int = int(float(ts_raw))
+        except ValueError:
+            continue
+        # funding amount from 'change'
+        add_to(delta, hour_of_epoch(ts_int), safe_symbol(row.get("symbol") or ""),
+               funding=to_dec(row.get("change")), fundings=1)
+        ff_rows += 1
+    store.apply("funding", mark, delta, reset=("funding", None) if rebuilt else None)
+    logger.info(f"✅ Aggregated funding from {ff_path} ({ff_rows} new rows)")
+    return ff_rows
 
 
 def build_daily(
@@ -65,107 +155,62 @@ def build_daily(
     out_path: str        = OUT_PATH,
     use_utc: bool        = False,   # ⬅️ default: pakai UTC
     src_utc_offset_hours:int = 7,  # readable_time = UTC+7 (JKT)
+    db_path: str         = DAILY_DB,
 ):
     """
-    Build a daily aggregation:
+    Bring the hourly buckets up to date with the new FIFO / funding rows and
+    write the daily view:
       - Date   : if use_utc=True  -> UTC date
                  if use_utc=False -> JKT date (as-is)
       - PNL    : sum of trade_pnl + trading_fees (trades only)
       - Funding: sum of funding 'change' from _fundings.csv
       - Volume : sum of |qty| * price
+    Per-symbol days come from daily_by_symbol().
     """
-    daily = defaultdict(lambda: {"pnl": Decimal("0"), "vol": Decimal("0"), "ff": Decimal("0")})
-    rows_seen = 0
-
-    # ---------- 1) Aggregate trades from FIFO ----------
-    for row in _iter_fifo_rows(fifo_dirs):
-        ts = row.get("readable_time")
-        dt_local = parse_dt_jkt(ts)
-        if not dt_local:
-            continue
-
-        if use_utc:
-            # convert from local (UTC+7) → UTC
-            dt = dt_local - timedelta(hours=src_utc_offset_hours)
-        else:
-            dt = dt_local
-
-        key_date = dt.date().isoformat()
+    store = DailyStore(db_path, VENUE)
 
-        qty      = to_dec(row.get("qty"))
-        price    = to_dec(row.get("price"))
-        realized = to_dec(row.get("trade_pnl")) + to_dec(row.get("trading_fees"))
+    # ---------- 1) New FIFO trades + fundings into the buckets ----------
+    rows_seen = sync_fifo(store, fifo_dirs, src_utc_offset_hours)
+    ff_rows   = sync_funding(store)
 
-        daily[key_date]["pnl"] += realized
-        daily[key_date]["vol"] += qty.copy_abs() * price
-        rows_seen += 1
-
-    if rows_seen == 0:
-        logger.info("⚠️ No FIFO rows found to aggregate (trades).")
-
-    # ---------- 2) Aggregate funding from _fundings.csv (timestamp already UTC) ----------
-    if os.path.exists(FF_PATH):
-        try:
-            with open(FF_PATH, newline="", encoding="utf-8") as f:
-                r = csv.DictReader(f)
-                ff_rows = 0
-                for row in r:
-                    ts_raw = row.get("timestamp")
-                    if not ts_raw:
-                        continue
-                    try:
-                        # epoch seconds in UTC
-                        ts_int = int(float(ts_raw))
-                    except ValueError:
-                        continue
-
-                    dt_utc = datetime.utcfromtimestamp(ts_int)
-
-                    if use_utc:
-                        dt = dt_utc
-                    else:
-                        # convert UTC → local (UTC+7)
-                        dt = dt_utc + timedelta(hours=src_utc_offset_hours)
-
-                    key_date = dt.date().isoformat()
-
-                    # funding amount from 'change'
-                    ff_val = to_dec(row.get("change"))
-                    daily[key_date]["ff"] += ff_val
-                    ff_rows += 1
-
-            logger.info(f"✅ Aggregated funding from {FF_PATH} ({ff_rows} rows)")
-        except Exception as e:
-            logger.info(f"❌ Failed reading funding file {FF_PATH}: {e}")
-    else:
-        logger.info(f"⚠️ Funding file not found: {FF_PATH}")
-
-    if not daily:
+    # ---------- 2) Regroup buckets into days ----------
+    days = store.daily(offsetHours=0 if use_utc else src_utc_offset_hours)
+    if not days:
         logger.info("⚠️ No data (trades or funding) found to aggregate.")
         return
 
-    # ---------- 3) Build output rows ----------
     out_rows = [
-        {
-            "Date":    d,
-            "PNL":     str(v["pnl"]),
-            "Funding": str(v["ff"]),
-            "Volume":  str(v["vol"]),
-        }
-        for d, v in daily.items()
+        {"Date": d["date"], "PNL": d["pnl"], "Funding": d["funding"], "Volume": d["volume"]}
+        for d in days
     ]
 
-    # Sort by Date descending for dashboard convenience
-    out_rows.sort(key=lambda x: x["Date"], reverse=True)
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=OUT_FIELDS)
+    w.writeheader()
+    w.writerows(out_rows)
+    text = buf.getvalue()
+
+    # unchanged days: leave the file (and its mtime) alone so readers don't reload
+    if os.path.exists(out_path):
+        with open(out_path, newline="", encoding="utf-8") as f:
+            if f.read() == text:
+                return
 
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=OUT_FIELDS)
-        w.writeheader()
-        for r in out_rows:
-            w.writerow(r)
+    tmp = f"{out_path}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, out_path)
+
+    logger.info(f"✅ Daily written to {out_path} (+{rows_seen} FIFO rows, +{ff_rows} funding), use_utc={use_utc}")
+
 
-    logger.info(f"✅ Daily written to {out_path} (from {rows_seen} FIFO rows + funding), use_utc={use_utc}")
+def daily_by_symbol(use_utc: bool = False, symbol: str | None = None, db_path: str = DAILY_DB,
+                    src_utc_offset_hours: int = 7) -> list[dict]:
+    """Per-symbol daily PNL / Funding / Volume straight from the buckets, newest first."""
+    return DailyStore(db_path, VENUE).daily(
+        offsetHours=0 if use_utc else src_utc_offset_hours, bySymbol=True, symbol=symbol,
+    )
 
 
 if __name__ == "__main__":
@@ -1,7 +1,9 @@
 from dotenv import load_dotenv
-import os, csv, glob, json, logging
+import os, csv, glob, json, uuid, logging
 from datetime import datetime, timedelta
 from decimal import Decimal, getcontext
+from spread_bot.incremental import Amended, new_cursor, read_appended, file_cursor, update_merged, load_state, save_state
+from spread_bot.funding_index import FundingIndex, assign_intervals
 
 load_dotenv('/root/arbSpread/backend/.env')
 
@@ -14,6 +16,10 @@ getcontext().prec = 50
 RAW_DIR   = '/root/arbSpread/backend/db_lig/raw'
 FIFO_DIR  = '/root/arbSpread/backend/db_lig/fifo'
 FF_PATH   = '/root/arbSpread/backend/db_lig/raw/_fundings.csv'
+STATE_DIR = '/root/arbSpread/backend/db_lig/fifo/_state'     # per-symbol FIFO checkpoints
+FUNDING_DIR = '/root/arbSpread/backend/db_lig/fifo/_state/fundings'   # _fundings.csv split per symbol
+
+STATE_VERSION = 2     # 2: funding cursor follows the per-symbol partition
 
 OUTPUT_FIELDS = [
     "market", "readable_time", "qty", "price", "trade_type",
@@ -114,8 +120,21 @@ def is_apex_schema(headers):
 def compute_pnl(close_qty: Decimal, exit_price: Decimal, was_long: bool, avg_entry: Decimal) -> Decimal:
     return close_qty * (exit_price - avg_entry) if was_long else close_qty * (avg_entry - exit_price)
 
+# ----- Engine state (resumable FIFO)
+def load_engine_state(state: dict | None, market: str):
+    """(running_qty, avg_entry, exit_qty_acc, avg_exit) saved for market, zeros if none."""
+    st = (state or {}).get(market) or {}
+    return tuple(to_dec(st.get(k)) for k in ("running_qty", "avg_entry", "exit_qty_acc", "avg_exit"))
+
+def save_engine_state(state: dict | None, market: str, running_qty, avg_entry, exit_qty_acc, avg_exit):
+    if state is not None:
+        state[market] = {
+            "running_qty": str(running_qty), "avg_entry": str(avg_entry),
+            "exit_qty_acc": str(exit_qty_acc), "avg_exit": str(avg_exit),
+        }
+
 # ----- FIFO engines
-def fifo_process_apex(rows, headers, my_account_id: str, default_market: str) -> list[dict]:
+def fifo_process_apex(rows, headers, my_account_id: str, default_market: str, state: dict | None = None) -> list[dict]:
     hl = {h.lower(): h for h in headers}
     col_time   = hl["timestamp"]
     col_price  = hl["price"]
@@ -131,10 +150,7 @@ def fifo_process_apex(rows, headers, my_account_id: str, default_market: str) ->
     my_rows.sort(key=lambda r: parse_epochish(r[col_time]))
 
     out = []
-    running_qty = Decimal("0")
-    avg_entry = Decimal("0")
-    exit_qty_acc = Decimal("0")
-    avg_exit = Decimal("0")
+    running_qty, avg_entry, exit_qty_acc, avg_exit = load_engine_state(state, default_market)
 
     def emit_row(ts, qty, price, ttype, trade_pnl: Decimal, trading_fees: Decimal):
         # funding is assigned later → 0 now
@@ -229,9 +245,10 @@ def fifo_process_apex(rows, headers, my_account_id: str, default_market: str) ->
                 avg_entry = price
                 out.append(emit_row(ts, leftover_signed, price, "ADD_L" if leftover_signed > 0 else "ADD_S", Decimal("0"), fee_add))
 
+    save_engine_state(state, default_market, running_qty, avg_entry, exit_qty_acc, avg_exit)
     return out
 
-def fifo_process_generic(rows, headers, default_market: str) -> list[dict]:
+def fifo_process_generic(rows, headers, default_market: str, state: dict | None = None) -> list[dict]:
     cmap = detect_generic_columns(headers)
     if cmap is None:
         raise RuntimeError("Cannot detect compatible columns in generic file.")
@@ -244,10 +261,7 @@ def fifo_process_generic(rows, headers, default_market: str) -> list[dict]:
     out = []
     for mkt, mrows in by_mkt.items():
         mrows.sort(key=lambda r: parse_epochish(r[cmap["time"]]))
-        running_qty = Decimal("0")
-        avg_entry   = Decimal("0")
-        exit_qty_acc= Decimal("0")
-        avg_exit    = Decimal("0")
+        running_qty, avg_entry, exit_qty_acc, avg_exit = load_engine_state(state, mkt)
 
         def emit_row(ts, qty, price, ttype, trade_pnl: Decimal, trading_fees: Decimal):
             realized = trade_pnl - trading_fees
@@ -336,208 +350,215 @@ def fifo_process_generic(rows, headers, default_market: str) -> list[dict]:
                     running_qty = leftover_signed
                     avg_entry = price
                     out.append(emit_row(ts, leftover_signed, price, "ADD_L" if leftover_signed > 0 else "ADD_S", Decimal("0"), fee_add))
+
+        save_engine_state(state, mkt, running_qty, avg_entry, exit_qty_acc, avg_exit)
     return out
 
-# ----- Funding integrator
-def integrate_funding_into_trades(trades_path: str, fundings_path: str):
-    if not (os.path.exists(trades_path) and os.path.exists(fundings_path)):
-        return
+# ----- Funding attribution
+def funding_items(rows, symbol: str) -> list[tuple[str, Decimal]]:
+    """(JKT readable time, amount) of this symbol's funding rows, oldest first."""
+    items = []
+    for row in rows:
+        sym = (row.get("symbol") or row.get("market") or "").strip()
+        if sym != symbol or not row.get("change"):
+            continue
+        ts = parse_epochish(row.get("timestamp"))
+        if ts:
+            items.append((readable_jkt_from_epoch(ts), to_dec(row.get("change"))))
+    items.sort(key=lambda x: x[0])
+    return items
+
+def attach_funding(trades: list[dict], pending: list[tuple[str, Decimal]]) -> list[tuple[str, Decimal]]:
+    """
+    Each funding payment goes to the first CLOSE/REDUCE trade at or after its
+    JKT time. trades are new FIFO rows, oldest first; pending are fundings not
+    attached yet, oldest first. Returns what is still unattached.
+    Close rows own the interval since the previous close; each payment is
+    placed by bisect over their times.
+    """
+    # same-second ties: CLOSE before REDUCE, bigger first (the order of the old desc files)
+    closes = sorted(
+        (t for t in trades if (t.get("trade_type") or "").startswith(("CLOSE", "REDUCE"))),
+        key=lambda t: (t["readable_time"], TYPE_PRIORITY.get(t.get("trade_type"), 9), -abs_qty(t)),
+    )
+    owners = assign_intervals([t["readable_time"] for t in closes], [p[0] for p in pending])
 
-    # Load trades
-    with open(trades_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        trades = list(reader)
-        fieldnames = reader.fieldnames or []
-
-    # Guarantee funding columns
-    for col in ("funding_fees", "funding_fee_details", "trading_fees", "trade_pnl", "realized_pnl"):
-        if col not in fieldnames:
-            fieldnames.append(col)
-
-    # Prepare trades
-    for t in trades:
-        t["_dt"] = parse_jkt(t.get("readable_time"))
-        # ensure numeric strings
-        t["trade_pnl"]    = str(to_dec(t.get("trade_pnl")))
-        t["trading_fees"] = str(to_dec(t.get("trading_fees")))
-        # initialize funding fields if missing
-        ff_details = t.get("funding_fee_details")
-        if not ff_details:
-            t["funding_fee_details"] = "[]"
+    taken: dict[int, list] = {}
+    left = []
+    for p, i in zip(pending, owners):
+        if i is None:
+            left.append(p)
         else:
-            try:
-                json.loads(ff_details if isinstance(ff_details, str) else "[]")
-            except Exception:
-                t["funding_fee_details"] = "[]"
-        if not t.get("funding_fees"):
-            t["funding_fees"] = "0"
-
-        # recompute realized (in case not present)
-        trade_pnl = to_dec(t["trade_pnl"])
-        trade_fee = to_dec(t["trading_fees"])
-        fund_fee  = to_dec(t["funding_fees"])
-        t["realized_pnl"] = str(trade_pnl - trade_fee + fund_fee)
-
-    # Load fundings (UTC→JKT)
-    with open(fundings_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        all_fundings = []
-        for row in reader:
-            sym = (row.get("symbol") or row.get("market") or "").strip()
-            if not sym or not row.get("change"):
-                continue
-            ts_raw = row.get("timestamp")
-            ts = parse_epochish(ts_raw)
-            ts_dt = datetime.utcfromtimestamp(ts) + timedelta(hours=7) if ts else None
-            all_fundings.append({"symbol": sym, "ts": ts_dt, "change": to_dec(row.get("change"))})
-
-    symbol = os.path.splitext(os.path.basename(trades_path))[0]
-    fundings = [f for f in all_fundings if f["symbol"] == symbol]
-    if fundings:
-        fundings.sort(key=lambda f: f["ts"] or datetime.min)
-        trades.sort(key=lambda t: t["_dt"] or datetime.min)
-
-        pending_sum: Decimal = Decimal("0")
-        pending_list: list[float] = []
-
-        for fitem in fundings:
-            ts = fitem["ts"]
-            amt = fitem["change"]
-            if ts is None:
-                continue
-
-            matched = False
-            for t in trades:
-                if t["_dt"] and t["_dt"] >= ts and (t.get("trade_type") or "").startswith(("CLOSE", "REDUCE")):
-                    # attach here
-                    try:
-                        details = json.loads(t["funding_fee_details"]) if isinstance(t["funding_fee_details"], str) else []
-                    except Exception:
-                        details = []
-                    details.extend(pending_list + [float(amt)])
-
-                    # update funding fee & realized
-                    new_funding = to_dec(t["funding_fees"]) + pending_sum + amt
-                    t["funding_fees"] = str(new_funding)
-                    t["funding_fee_details"] = json.dumps(details)
-
-                    trade_pnl = to_dec(t["trade_pnl"])
-                    trade_fee = to_dec(t["trading_fees"])
-                    t["realized_pnl"] = str(trade_pnl - trade_fee + new_funding)
-
-                    pending_sum = Decimal("0")
-                    pending_list = []
-                    matched = True
-                    break
-
-            if not matched:
-                pending_sum += amt
-                pending_list.append(float(amt))
-
-        if pending_sum != 0:
-            logger.info(f"⚠️ {symbol}: {pending_sum} funding left unassigned")
-
-    # Final write-back
-    for t in trades:
-        t.pop("_dt", None)
-    ensure_headers_and_write(trades_path, trades, fieldnames)
+            taken.setdefault(i, []).append(p)
+
+    for i, take in taken.items():
+        t = closes[i]
+        details = json.loads(t["funding_fee_details"]) + [float(amt) for _, amt in take]
+        new_funding = to_dec(t["funding_fees"]) + sum((amt for _, amt in take), Decimal("0"))
+        t["funding_fees"] = str(new_funding)
+        t["funding_fee_details"] = json.dumps(details)
+        t["realized_pnl"] = str(to_dec(t["trade_pnl"]) - to_dec(t["trading_fees"]) + new_funding)
+    return left
+
+def append_rows(path: str, rows: list[dict], headers: list[str]):
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
+        w.writerows(rows)
 
 # ----- Main processors
-def process_all_fifo():
-    logger.info('process_all_fifo started')
+def _fresh_state(my_account_id: str) -> dict:
+    return {
+        "version": STATE_VERSION,
+        "build": uuid.uuid4().hex,          # changes on every full rebuild (p_cycle / merges watch it)
+        "account": my_account_id,
+        "raw": new_cursor(), "funding": new_cursor(), "fifo": None,
+        "engine": {}, "last_ts": 0, "last_trade_id": "",
+        "last_close_time": "", "pending": [],
+    }
+
+def _advance(state: dict, src: str, ff_src: str, symbol: str, default_market: str, my_account_id: str) -> list[dict]:
+    """
+    Run the FIFO engine over the raw rows and fundings appended since state
+    and return the new FIFO rows (oldest first). Raises Amended when the
+    new input does not extend the checkpoint (rewritten raw file, trade
+    older than the last processed one, funding due on an already written
+    close): the caller rebuilds.
+    """
+    raw_rows, state["raw"] = read_appended(src, state["raw"])
+    ff_rows, state["funding"] = read_appended(ff_src or FF_PATH, state["funding"])
+    headers = state["raw"]["header"] or []
+
+    new_funding = funding_items(ff_rows, symbol)
+    if new_funding and state["last_close_time"] and new_funding[0][0] <= state["last_close_time"]:
+        raise Amended(f"late funding {new_funding[0][0]} <= last close {state['last_close_time']}")
+
+    if raw_rows:
+        hl = {h.lower(): h for h in headers}
+        col_time = hl.get("timestamp") or (detect_generic_columns(headers) or {}).get("time")
+        first_ts = min(parse_epochish(r.get(col_time)) for r in raw_rows)
+        # same second as the checkpoint too: ties there decide where funding goes
+        if first_ts <= state["last_ts"]:
+            raise Amended(f"trade at {first_ts} not newer than checkpoint {state['last_ts']}")
+        state["last_ts"] = max(parse_epochish(r.get(col_time)) for r in raw_rows)
+        state["last_trade_id"] = str(raw_rows[-1].get("trade_id") or raw_rows[-1].get("id") or "")
+
+    if is_apex_schema(headers):
+        out_rows = fifo_process_apex(raw_rows, headers, my_account_id, default_market, state["engine"])
+    else:
+        out_rows = fifo_process_generic(raw_rows, headers, default_market, state["engine"])
+
+    pending = sorted([(t, to_dec(a)) for t, a in state["pending"]] + new_funding, key=lambda x: x[0])
+    pending = attach_funding(out_rows, pending)
+    state["pending"] = [[t, str(a)] for t, a in pending]
+    closes = [r["readable_time"] for r in out_rows if r["trade_type"].startswith(("CLOSE", "REDUCE"))]
+    if closes:
+        state["last_close_time"] = max(closes + [state["last_close_time"]])
+    return out_rows
+
+def process_symbol_fifo(src: str, dst: str, my_account_id: str, ff_src: str | None = None) -> tuple[int, bool]:
+    """
+    Bring fifo/{SYMBOL}.csv up to date with raw/{SYMBOL}.csv, resuming from
+    fifo/_state/{SYMBOL}.json. Rows are appended oldest first; the file is
+    rebuilt from scratch only when the checkpoint cannot be extended.
+    ff_src is the symbol's funding partition (default: the whole FF_PATH).
+    Returns (new rows, rebuilt).
+    """
+    name = os.path.basename(src)
+    stem = os.path.splitext(name)[0]
+    default_market = stem if "-" in stem else f"{stem}-USD"
+    state_path = os.path.join(STATE_DIR, f"{stem}.json")
+
+    state = load_state(state_path)
+    rebuilt = False
+    try:
+        if not state or state.get("version") != STATE_VERSION or state.get("account") != my_account_id or not state.get("fifo"):
+            raise Amended("no usable checkpoint")
+        if state.get("funding_src") != ff_src:
+            raise Amended("funding source changed")
+        leftover, _ = read_appended(dst, state["fifo"])
+        if leftover:
+            raise Amended(f"{dst} was modified outside the FIFO pass")
+        out_rows = _advance(state, src, ff_src, stem, default_market, my_account_id)
+        append_rows(dst, out_rows, OUTPUT_FIELDS)
+    except Amended as e:
+        if state:
+            logger.info(f"🔁 {stem}: full FIFO rebuild ({e})")
+        rebuilt = True
+        state = _fresh_state(my_account_id)
+        state["funding_src"] = ff_src
+        out_rows = _advance(state, src, ff_src, stem, default_market, my_account_id)
+        ensure_headers_and_write(dst, out_rows, OUTPUT_FIELDS)
+
+    if state["pending"]:
+        pending_sum = sum((to_dec(a) for _, a in state["pending"]), Decimal("0"))
+        logger.info(f"⚠️ {stem}: {pending_sum} funding left unassigned")
+
+    state["fifo"] = file_cursor(dst, OUTPUT_FIELDS)
+    save_state(state_path, state)
+    return len(out_rows), rebuilt
+
+def prepare_fifo() -> list[tuple]:
+    """
+    Partition the new fundings once, then list one job per symbol:
+    (raw src, fifo dst, account, funding partition) for process_symbol_fifo.
+    """
     my_account_id = (os.getenv("LIGHTER_ACCOUNT_INDEX") or "").strip()
+    fundings = FundingIndex(FF_PATH, FUNDING_DIR, lambda r: r.get("symbol") or r.get("market"))
+    n_ff = fundings.sync()
+    if n_ff:
+        logger.info(f"📥 {n_ff} new fundings partitioned by symbol")
 
     os.makedirs(FIFO_DIR, exist_ok=True)
     files = [f for f in sorted(glob.glob(os.path.join(RAW_DIR, "*.csv")))
              if not os.path.basename(f).startswith("_")]
     if not files:
         logger.info(f"⚠️ No CSV files found in {RAW_DIR}")
-        return
-
+    jobs = []
     for src in files:
-        name = os.path.basename(src)
-        stem = os.path.splitext(name)[0]
-        default_market = stem if "-" in stem else f"{stem}-USD"
-        dst = os.path.join(FIFO_DIR, name)
-
-        try:
-            with open(src, newline="", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                headers = reader.fieldnames or []
-                rows = list(reader)
-
-            if is_apex_schema(headers):
-                out_rows = fifo_process_apex(rows, headers, my_account_id, default_market)
-            else:
-                out_rows = fifo_process_generic(rows, headers, default_market)
+        stem = os.path.splitext(os.path.basename(src))[0]
+        jobs.append((src, os.path.join(FIFO_DIR, os.path.basename(src)), my_account_id, fundings.path(stem)))
+    return jobs
 
-            out_rows.sort(key=row_sort_key)
-            ensure_headers_and_write(dst, out_rows, OUTPUT_FIELDS)
-
-            # integrate funding & final sort
-            integrate_funding_into_trades(dst, FF_PATH)
-            with open(dst, newline="", encoding="utf-8") as f:
-                rr = csv.DictReader(f)
-                out2 = list(rr)
-                hdrs = rr.fieldnames or OUTPUT_FIELDS
-            out2.sort(key=row_sort_key)
-            ensure_headers_and_write(dst, out2, hdrs)
+def process_all_fifo():
+    logger.info('process_all_fifo started')
+    jobs = prepare_fifo()
+    if not jobs:
+        return
 
+    total, rebuilds = 0, 0
+    for job in jobs:
+        try:
+            n, rebuilt = process_symbol_fifo(*job)
+            total += n
+            rebuilds += rebuilt
         except Exception as e:
-            logger.info(f"❌ Failed {src}: {e}")
+            logger.info(f"❌ Failed {job[0]}: {e}")
+    logger.info(f"✅ FIFO: {total} new rows, {rebuilds} rebuilt of {len(jobs)} symbols")
 
 # ----- Merge & Daily PnL (optional)
 def build_allSymbols(
     fifo_dir=FIFO_DIR,
     out_path=os.path.join(FIFO_DIR, "_allSymbols.csv"),
 ):
-    os.makedirs(fifo_dir, exist_ok=True)
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-
+    """
+    Keep _allSymbols.csv as the append-only merge of the per-symbol FIFO
+    files: only rows appended since the last merge are added (oldest first,
+    read it from the end for the newest). A rebuilt symbol re-merges all.
+    """
     files = [f for f in sorted(glob.glob(os.path.join(fifo_dir, "*.csv")))
              if not os.path.basename(f).startswith("_")]
     if not files:
         logger.info(f"⚠️ No FIFO CSVs found in {fifo_dir}")
         return
 
-    rows = []
+    sources = {}
     for path in files:
-        try:
-            with open(path, newline="", encoding="utf-8") as f:
-                r = csv.DictReader(f)
-                for row in r:
-                    if row.get("market") and row.get("readable_time"):
-                        rows.append(row)
-        except Exception as e:
-            logger.info(f"❌ Skipping {path}: {e}")
-
-    if not rows:
-        logger.info("⚠️ No data rows found to merge.")
-        return
-
-    rows.sort(key=lambda r: ( -epoch_from_readable(r), r.get("market","") ))
-    ensure_headers_and_write(out_path, rows, OUTPUT_FIELDS)
-    logger.info(f"📦 Merged → {out_path}")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        stem = os.path.splitext(os.path.basename(path))[0]
+        sources[stem] = (path, (load_state(os.path.join(STATE_DIR, f"{stem}.json")) or {}).get("build", ""), None)
 
+    n, rebuilt = update_merged(
+        out_path, os.path.join(STATE_DIR, "_allSymbols.json"), sources, OUTPUT_FIELDS,
+        sortKey=lambda r: (r.get("readable_time") or "", r.get("market") or ""),
+    )
+    if n or rebuilt:
+        logger.info(f"📦 Merged {n} rows{' (rebuilt)' if rebuilt else ''} → {out_path}")
@@ -0,0 +1,99 @@
+import asyncio
+import time
+import logging
+
+logger                          = logging.getLogger("book_signal")
+logger.setLevel                 (logging.INFO)
+
+class BookSignal:
+    """
+    Shared wake-up signal between the orderbook WS handlers and the spread loop.
+
+    Handlers call notify() on every top-of-book change. Notifications that land
+    while the loop is busy are coalesced into one pending wake-up, and the
+    receipt time of the oldest one is kept so the latency we report is the
+    worst case (WS receipt -> decision).
+    """
+    def __init__(self, maxSamples: int = 1000):
+        self._event             = asyncio.Event()
+        self._pendingSince      = None
+        self._pendingCount      = 0
+        self.maxSamples         = maxSamples
+        self.samples            = []
+        self.stats              = {
+            "decisions"         : 0,
+            "notifies"          : 0,
+            "coalesced"         : 0,
+            "last_ms"           : 0.0,
+            "avg_ms"            : 0.0,
+            "p50_ms"            : 0.0,
+            "p99_ms"            : 0.0,
+            "max_ms"            : 0.0,
+        }
+        self._activeSince       = None
+
+    def notify(self, recvTs: float = None):
+        """Called from the WS handlers; never blocks."""
+        if recvTs is None:
+            recvTs              = time.perf_counter()
+        if self._pendingSince is None:
+            self._pendingSince  = recvTs
+        self._pendingCount      += 1
+        self.stats["notifies"]  += 1
+        self._event.set()
+
+    async def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for the next book change. Returns True if woken by a book change,
+        False on timeout. All notifications received so far are consumed at once.
+        """
+        if not self._event.is_set():
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return self.poll()
+
+    def poll(self) -> bool:
+        """Non-blocking variant of wait(), used by the fixed-interval loop."""
+        if not self._event.is_set():
+            return False
+        self._event.clear()
+        if self._pendingCount > 1:
+            self.stats["coalesced"] += self._pendingCount - 1
+        self._activeSince       = self._pendingSince
+        self._pendingSince      = None
+        self._pendingCount      = 0
+        return True
+
+    def markDecision(self):
+        """Record WS receipt -> decision latency for the update being evaluated."""
+        if self._activeSince is None:
+            return
+        latency_ms              = (time.perf_counter() - self._activeSince) * 1000
+        self._activeSince       = None
+
+        self.samples.append     (latency_ms)
+        if len(self.samples) > self.maxSamples:
+            del self.samples[:len(self.samples) - self.maxSamples]
+
+        n                       = self.stats["decisions"] + 1
+        self.stats["decisions"] = n
+        self.stats["last_ms"]   = latency_ms
+        self.stats["avg_ms"]    += (latency_ms - self.stats["avg_ms"]) / n
+        self.stats["max_ms"]    = max(self.stats["max_ms"], latency_ms)
+
+    def summary(self) -> dict:
+        if self.samples:
+            ordered             = sorted(self.samples)
+            self.stats["p50_ms"]= ordered[len(ordered) // 2]
+            self.stats["p99_ms"]= ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return dict(self.stats)
+
+    def fmtSummary(self) -> str:
+        s                       = self.summary()
+        return (
+            f'n={s["decisions"]} last={s["last_ms"]:.3f}ms avg={s["avg_ms"]:.3f}ms '
+            f'p50={s["p50_ms"]:.3f}ms p99={s["p99_ms"]:.3f}ms max={s["max_ms"]:.3f}ms '
+            f'coalesced={s["coalesced"]}'
+        )
@@ -0,0 +1,168 @@
+import os
+import json
+import sqlite3
+import logging
+from decimal import Decimal, Context
+from datetime import datetime, timedelta
+
+# Rolling PNL / funding / volume aggregates of one venue, kept as UTC hourly
+# partial sums per symbol. Every day boundary used by the dashboard (UTC,
+# JKT = UTC+7) is a whole number of hours, so any of them is just a regroup
+# of the same buckets; nothing is recomputed from the FIFO files.
+#
+#   store   = DailyStore("/root/arbSpread/backend/db_lig/fifo/_daily.db", "lig")
+#   mark    = store.mark("fifo:MEGA")                     # watermark of a source
+#   delta   = new_delta(); add_to(delta, hour, "MEGA", pnl=..., volume=..., trades=1)
+#   store.apply("fifo:MEGA", newMark, delta)              # one transaction
+#   store.daily(offsetHours=7, bySymbol=True)
+#
+# Sums are Decimal strings; a source's watermark is committed together with
+# the sums it produced, so a crash never double counts.
+
+logger                          = logging.getLogger("daily_store")
+logger.setLevel                 (logging.INFO)
+
+SUMS                            = ("pnl", "funding", "volume")
+COUNTS                          = ("trades", "fundings")
+RESET_COLUMNS                   = {
+    "trades":  {"pnl": "'0'", "volume": "'0'", "trades": "0"},
+    "funding": {"funding": "'0'", "fundings": "0"},
+}
+
+_CTX                            = Context(prec=50)
+_EPOCH                          = datetime(1970, 1, 1)
+
+
+def hour_of_epoch(sec: int) -> int:
+    return int(sec) // 3600
+
+
+def hour_of_local(dt: datetime, utcOffsetHours: int) -> int:
+    """UTC hour bucket of a naive local datetime (e.g. JKT readable_time, offset 7)."""
+    return int((dt - _EPOCH).total_seconds()) // 3600 - utcOffsetHours
+
+
+def day_of_hour(hour: int, offsetHours: int = 0) -> str:
+    return (_EPOCH + timedelta(hours=hour + offsetHours)).date().isoformat()
+
+
+def new_delta() -> dict:
+    return {}
+
+
+def add_to(delta: dict, hour: int, symbol: str, **values):
+    """Accumulate values (pnl/funding/volume as Decimal, trades/fundings as int) into a bucket."""
+    b                           = delta.get((hour, symbol))
+    if b is None:
+        b                       = delta[(hour, symbol)] = {**{k: Decimal("0") for k in SUMS}, **{k: 0 for k in COUNTS}}
+    for k, v in values.items():
+        b[k]                    = _CTX.add(b[k], v) if k in SUMS else b[k] + v
+
+
+class DailyStore:
+    def __init__(self, path: str, venue: str):
+        self.path               = path
+        self.venue              = venue
+        os.makedirs             (os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute          ("PRAGMA journal_mode=WAL")
+            db.execute          ("CREATE TABLE IF NOT EXISTS marks (venue TEXT, source TEXT, value TEXT NOT NULL, PRIMARY KEY (venue, source))")
+            db.execute          (
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " venue TEXT, hour INTEGER, symbol TEXT,"
+                " pnl TEXT NOT NULL, funding TEXT NOT NULL, volume TEXT NOT NULL,"
+                " trades INTEGER NOT NULL, fundings INTEGER NOT NULL,"
+                " PRIMARY KEY (venue, hour, symbol))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect  (self.path, timeout=30)
+
+    # --- watermarks
+
+    def mark(self, source: str):
+        """Watermark saved with the last apply() of source, None if never applied."""
+        with self._connect() as db:
+            row                 = db.execute("SELECT value FROM marks WHERE venue=? AND source=?", (self.venue, source)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def sources(self) -> list[str]:
+        with self._connect() as db:
+            return [s for (s,) in db.execute("SELECT source FROM marks WHERE venue=?", (self.venue,))]
+
+    # --- updates
+
+    def _reset(self, db, kind: str, symbol: str | None):
+        sets                    = ", ".join(f"{c}={v}" for c, v in RESET_COLUMNS[kind].items())
+        if symbol is None:
+            db.execute          (f"UPDATE buckets SET {sets} WHERE venue=?", (self.venue,))
+        else:
+            db.execute          (f"UPDATE buckets SET {sets} WHERE venue=? AND symbol=?", (self.venue, symbol))
+        db.execute              ("DELETE FROM buckets WHERE venue=? AND trades=0 AND fundings=0", (self.venue,))
+
+    def apply(self, source: str, mark, delta: dict, reset: tuple[str, str | None] | None = None):
+        """
+        Add delta to the buckets and move source's watermark to mark, in one
+        transaction. reset=(kind, symbol) first clears what source had
+        contributed ("trades" or "funding" sums, one symbol or all) so a
+        rebuilt source can be replayed from scratch.
+        """
+        with self._connect() as db:
+            if reset:
+                self._reset     (db, *reset)
+            for (hour, symbol), d in delta.items():
+                row             = db.execute(
+                    "SELECT pnl, funding, volume, trades, fundings FROM buckets WHERE venue=? AND hour=? AND symbol=?",
+                    (self.venue, hour, symbol),
+                ).fetchone()
+                cur             = dict(zip(SUMS + COUNTS, row)) if row else {**{k: "0" for k in SUMS}, **{k: 0 for k in COUNTS}}
+                new             = [str(_CTX.add(Decimal(cur[k]), d[k])) for k in SUMS] + [cur[k] + d[k] for k in COUNTS]
+                db.execute      (
+                    "INSERT OR REPLACE INTO buckets (venue, hour, symbol, pnl, funding, volume, trades, fundings) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.venue, hour, symbol, *new),
+                )
+            db.execute          (
+                "INSERT OR REPLACE INTO marks (venue, source, value) VALUES (?, ?, ?)",
+                (self.venue, source, json.dumps(mark)),
+            )
+
+    def drop(self, source: str, reset: tuple[str, str | None]):
+        """Forget a source that no longer exists, with everything it contributed."""
+        with self._connect() as db:
+            self._reset         (db, *reset)
+            db.execute          ("DELETE FROM marks WHERE venue=? AND source=?", (self.venue, source))
+
+    # --- queries
+
+    def daily(self, offsetHours: int = 0, bySymbol: bool = False, symbol: str | None = None) -> list[dict]:
+        """
+        Daily sums for the day boundary at UTC+offsetHours, newest day first
+        (then by symbol). Each row: date, [symbol,] pnl, funding, volume,
+        trades, fundings.
+        """
+        sql                     = "SELECT hour, symbol, pnl, funding, volume, trades, fundings FROM buckets WHERE venue=?"
+        args                    = [self.venue]
+        if symbol is not None:
+            sql                 += " AND symbol=?"
+            args.append         (symbol)
+
+        days                    = {}
+        with self._connect() as db:
+            for hour, sym, *vals in db.execute(sql, args):
+                key             = (day_of_hour(hour, offsetHours), sym if bySymbol else None)
+                d               = days.get(key)
+                if d is None:
+                    d           = days[key] = {**{k: Decimal("0") for k in SUMS}, **{k: 0 for k in COUNTS}}
+                for k, v in zip(SUMS + COUNTS, vals):
+                    d[k]        = _CTX.add(d[k], Decimal(v)) if k in SUMS else d[k] + v
+
+        out                     = []
+        ordered                 = sorted(days.items(), key=lambda kv: kv[0][1] or "")
+        for (date, sym), d in sorted(ordered, key=lambda kv: kv[0][0], reverse=True):
+            row                 = {"date": date}
+            if bySymbol:
+                row["symbol"]   = sym
+            row.update          ({k: str(d[k]) for k in SUMS})
+            row.update          ({k: d[k] for k in COUNTS})
+            out.append          (row)
+        return out
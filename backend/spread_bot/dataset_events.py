@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+
+from spread_bot.incremental import load_state, save_state
+
+# "Dataset updated" events from the data pipeline (data_backend.py) to the API
+# (unified_backend.py).
+#
+#   pipeline : DATASET.publish("lig", {"fifo": ".../_allSymbols.csv", ...})
+#   backend  : watcher = DatasetWatcher(reload); await watcher.start(["ext", "lig"])
+#              async for event in watcher.subscribe(): ...
+#
+# After each sync cycle the pipeline compares the (mtime, size) of a venue's
+# output files with the last published ones. If anything changed it bumps the
+# venue's generation in a small JSON file and sends a datagram. The watcher
+# reloads its cached tables for that venue (reload(venue), in a thread), then
+# wakes the SSE subscribers. The generation file is the source of truth:
+# datagrams are dropped while the API is down, so the watcher also polls it.
+
+logger                          = logging.getLogger("dataset_events")
+logger.setLevel                 (logging.INFO)
+
+def socket_path():
+    return os.getenv("DATASET_SOCKET", "/tmp/arbspread_dataset.sock")
+
+def state_path():
+    return os.getenv("DATASET_STATE", "/tmp/arbspread_dataset.json")
+
+
+def file_signature(path: str):
+    try:
+        st                      = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class DatasetPublisher:
+    """Bumps a venue's generation when its outputs changed; never blocks."""
+    def __init__(self):
+        self.sock               = None
+        self.stats              = {"published": 0, "unchanged": 0, "dropped": 0}
+
+    def publish(self, venue: str, paths: dict) -> int | None:
+        """
+        paths = {name: output file}. Returns the new generation, or None when
+        no file changed since the last publish.
+        """
+        state                   = load_state(state_path()) or {}
+        prev                    = state.get(venue) or {}
+        files                   = {name: file_signature(p) for name, p in paths.items()}
+        changed                 = sorted(n for n, sig in files.items() if sig != (prev.get("files") or {}).get(n))
+        if not changed:
+            self.stats["unchanged"] += 1
+            return None
+
+        generation              = int(prev.get("generation") or 0) + 1
+        event                   = {"venue": venue, "generation": generation, "ts": round(time.time(), 3), "changed": changed}
+        state[venue]            = {**event, "files": files}
+        save_state              (state_path(), state)
+        self.stats["published"] += 1
+
+        if self.sock is None:
+            self.sock           = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.setblocking(False)
+        try:
+            self.sock.sendto    (json.dumps(event).encode(), socket_path())
+        except OSError:
+            # API not listening: it picks the generation up from the file
+            self.stats["dropped"] += 1
+        return generation
+
+
+class DatasetWatcher:
+    """
+    Applies published generations per venue: reload(venue) builds and swaps
+    the cached tables, then subscribers get the event. An event already
+    applied (same generation and ts) is ignored, so a datagram and the poll
+    seeing the same bump reload once; a reset state file (generation back to
+    1) is still picked up.
+    """
+    def __init__(self, reload, pollInterval: float = 30.0):
+        self.reload             = reload
+        self.pollInterval       = pollInterval
+        self.generations        = {}
+        self.applied            = {}                    # venue -> (generation, ts)
+        self.latest             = {}
+        self._seq               = 0
+        self._changed           = asyncio.Event()
+        self._lock              = asyncio.Lock()
+        self._tasks             = set()
+        self.transport          = None
+
+    async def start(self, venues):
+        path                    = socket_path()
+        if os.path.exists(path):
+            os.unlink           (path)
+        watcher                 = self
+
+        class _Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                watcher._receive(data)
+
+        loop                    = asyncio.get_running_loop()
+        self.transport, _       = await loop.create_datagram_endpoint(
+            _Protocol, local_addr=path, family=socket.AF_UNIX
+        )
+        # initial load at the current generations (0 when nothing was published yet)
+        state                   = load_state(state_path()) or {}
+        for venue in venues:
+            await self.apply    ((state.get(venue) or {"venue": venue, "generation": 0, "changed": []}), force=True)
+        self._spawn             (self._poll())
+        logger.info             (f"✅ Dataset watcher listening on {path} ({self.generations})")
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+        for task in self._tasks:
+            task.cancel         ()
+
+    def _spawn(self, coro):
+        task                    = asyncio.create_task(coro)
+        self._tasks.add         (task)
+        task.add_done_callback  (self._tasks.discard)
+
+    def _receive(self, data: bytes):
+        try:
+            event               = json.loads(data)
+            if not isinstance(event.get("venue"), str) or not isinstance(event.get("generation"), int):
+                raise ValueError("missing venue / generation")
+        except Exception as e:
+            logger.warning      (f"⚠️ Bad dataset datagram: {e}")
+            return
+        self._spawn             (self.apply(event))
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep (self.pollInterval)
+            state               = load_state(state_path()) or {}
+            for venue in list(self.generations):
+                if venue in state:
+                    await self.apply(state[venue])
+
+    async def apply(self, event: dict, force: bool = False):
+        venue                   = event["venue"]
+        generation              = int(event["generation"])
+        applied                 = (generation, event.get("ts"))
+        async with self._lock:
+            if not force and self.applied.get(venue) == applied:
+                return
+            try:
+                await asyncio.to_thread(self.reload, venue)
+            except Exception as e:
+                logger.error    (f"❌ Reload of {venue} generation {generation} failed: {e}")
+                return
+            self.generations[venue] = generation
+            self.applied[venue] = applied
+            self.latest[venue]  = json.dumps({k: event.get(k) for k in ("venue", "generation", "ts", "changed")})
+            self._seq           += 1
+            # wake everyone waiting, then arm a fresh event
+            self._changed.set   ()
+            self._changed       = asyncio.Event()
+
+    async def subscribe(self, heartbeat: float = 15.0):
+        """
+        Async generator of dataset events (JSON, one per applied generation of
+        any venue; bursts are coalesced to the latest per venue). Yields None
+        every `heartbeat` seconds without change (for SSE keep-alive).
+        """
+        seen                    = self._seq
+        sent                    = dict(self.latest)
+        while True:
+            if self._seq == seen:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+            seen                = self._seq
+            for venue, data in list(self.latest.items()):
+                if sent.get(venue) != data:
+                    sent[venue] = data
+                    yield data
+
+
+# one publisher per data pipeline process
+DATASET                         = DatasetPublisher()
@@ -0,0 +1,91 @@
+import os
+import logging
+from bisect import bisect_left
+
+from spread_bot.incremental import Amended, read_appended, load_state, save_state
+from spread_bot.raw_store import append_csv, safe_symbol
+
+# Funding payments of one venue, partitioned by symbol once per sync, and the
+# interval lookup used to attribute them.
+#
+#   index   = FundingIndex(FF_PATH, f"{STATE_DIR}/fundings", symbolOf)
+#   index.sync()                        # reads only the rows appended to FF_PATH
+#   index.path("MEGA")                  # append-only fundings of MEGA, same columns
+#
+# Each p_fifo symbol follows its own partition with a cursor, so a sync reads
+# the venue funding file once instead of once per symbol.
+#
+# Attribution: the CLOSE/REDUCE rows of a symbol, sorted by time, cut the
+# timeline into intervals (previous close, close]; a payment belongs to the
+# close ending the interval that contains it. assign_intervals() finds it by
+# bisect: O((T + F) log T) for T closes and F payments.
+
+logger                          = logging.getLogger("funding_index")
+logger.setLevel                 (logging.INFO)
+
+
+def assign_intervals(bounds: list, times: list) -> list[int | None]:
+    """
+    For each time, the index of the first bound >= time (bounds sorted
+    ascending), or None when it is after the last bound (still open).
+    """
+    out                         = []
+    for t in times:
+        i                       = bisect_left(bounds, t)
+        out.append              (i if i < len(bounds) else None)
+    return out
+
+
+class FundingIndex:
+    def __init__(self, srcPath: str, partDir: str, symbolOf):
+        self.srcPath            = srcPath
+        self.partDir            = partDir
+        self.symbolOf           = symbolOf
+        self.statePath          = os.path.join(partDir, "_index.json")
+
+    def path(self, symbol: str) -> str:
+        return os.path.join(self.partDir, f"{safe_symbol(symbol)}.csv")
+
+    def _rollback(self, sizes: dict):
+        """Undo appends of a sync that died before saving its cursor."""
+        if not os.path.isdir(self.partDir):
+            return
+        for name in os.listdir(self.partDir):
+            if not name.endswith(".csv"):
+                continue
+            path                = os.path.join(self.partDir, name)
+            keep                = sizes.get(name[:-4], 0)
+            if os.path.getsize(path) > keep:
+                with open(path, "r+b") as f:
+                    f.truncate  (keep)
+            if keep == 0:
+                os.remove       (path)
+
+    def sync(self) -> int:
+        """
+        Append the funding rows added to srcPath since the last sync to their
+        symbol partitions. A rewritten source rebuilds every partition (the
+        FIFO cursors on them then see the rewrite and rebuild too).
+        Returns the number of rows partitioned.
+        """
+        state                   = load_state(self.statePath) or {}
+        sizes                   = dict(state.get("sizes") or {})
+        self._rollback          (sizes)
+        try:
+            rows, cursor        = read_appended(self.srcPath, state.get("cursor"))
+        except Amended as e:
+            logger.info         (f"🔁 Repartitioning fundings ({e})")
+            sizes               = {}
+            self._rollback      (sizes)
+            rows, cursor        = read_appended(self.srcPath, None)
+
+        bySymbol                = {}
+        for r in rows:
+            bySymbol.setdefault (safe_symbol(self.symbolOf(r) or ""), []).append(r)
+        for sym, part in bySymbol.items():
+            path                = self.path(sym)
+            append_csv          (path, part, cursor["header"])
+            sizes[sym]          = os.path.getsize(path)
+
+        save_state              (self.statePath, {"cursor": cursor, "sizes": sizes})
+        return len(rows)
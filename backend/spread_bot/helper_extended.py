@@ -2,15 +2,22 @@ import time
 import traceback
 import os
 import asyncio
+import contextvars
 import logging
-import aiohttp
 from dotenv import load_dotenv
 from decimal import Decimal
 from helpers import HELPERS
+from orderbook import OrderBook
+from http_session import SESSIONS
+from sync_scheduler import FILLS
+from order_tracker import OrderTracker, next_client_id
+from presign import Presigned
+from sign_pool import SIGNERS
 
 from x10.perpetual.accounts import StarkPerpetualAccount
 from x10.perpetual.configuration import MAINNET_CONFIG
 from x10.perpetual.orders import OrderSide as ExtendedOrderSide
+from x10.perpetual.order_object import create_order_object
 from x10.perpetual.trading_client import PerpetualTradingClient
 from x10.perpetual.stream_client import PerpetualStreamClient
 from x10.perpetual.simple_client.simple_trading_client import BlockingTradingClient
@@ -21,7 +28,69 @@ logger                          = logging.getLogger("helper_exended")
 logger.setLevel                 (logging.INFO)
 load_dotenv                     ('/root/arbSpread/backend/.env')
 
+class ExtendedAccountStream:
+    """
+    One account stream per process, fanned out to every ExtendedAPI by market
+    name. SNAPSHOT messages list all open positions (a missing market means
+    flat), later messages carry only the positions that changed. Order
+    updates go to the market's OrderTracker (fill confirmation by external_id).
+    """
+    def __init__(self):
+        self.subs                   = {}
+        self._task                  = None
+
+    def register(self, api):
+        self.subs[api.pair["symbol"]] = api
+        if self._task is None or self._task.done():
+            # fresh context: the stream must not inherit the first pair's log context
+            self._task              = asyncio.get_running_loop().create_task(
+                self._run(api.ws_client, api.config["api_key"]), context=contextvars.Context()
+            )
+
+    def unregister(self, api):
+        if self.subs.get(api.pair["symbol"]) is api:
+            del self.subs[api.pair["symbol"]]
+
+    def _dispatch(self, msg):
+        positions                   = getattr(msg.data, "positions", None) if msg.data else None
+        if positions is not None:
+            self._dispatchPositions (msg, positions)
+        # after the positions, so they are current once a leg resolves
+        for order in (getattr(msg.data, "orders", None) if msg.data else None) or ():
+            api                     = self.subs.get(order.market)
+            if api:
+                api.orders.onOrder  (order.external_id, order.status, float(order.filled_qty or 0), float(order.average_price or 0))
+
+    def _dispatchPositions(self, msg, positions):
+        seen                        = set()
+        for pos in positions:
+            api                     = self.subs.get(pos.market)
+            if api:
+                api._handle_position_update(pos)
+                seen.add            (pos.market)
+        if str(msg.type).upper().endswith("SNAPSHOT"):
+            for symbol, api in list(self.subs.items()):
+                if symbol not in seen:
+                    api._handle_position_update(None)
+
+    async def _run(self, ws_client, api_key):
+        while True:
+            try:
+                async with ws_client.subscribe_to_account_updates(api_key) as stream:
+                    while True:
+                        msg                 = await stream.recv()
+                        self._dispatch      (msg)
+            except Exception as e:
+                logger.error        (f"⚠️ Extended account stream disconnected: {e}")
+                await asyncio.sleep (1)
+
+# one account stream per process, shared by every ExtendedAPI in it
+ACCOUNT_STREAM                  = ExtendedAccountStream()
+
 class ExtendedAPI:
+    # set by init(shared=True): one trading/stream client for every pair in the process
+    _sharedClients              = None
+
     def __init__(self, symbol: str):
         self.client             = None
         self.simpleClient       = None
@@ -52,11 +121,24 @@ class ExtendedAPI:
             "qty"               : 0.0,
             "entry_price"       : 0.0,
         }
+        self.book               = None
         self.wsCallback         = None
         self.allSymbols         = []
         self.currFundRate      = None
+        self.obSignal           = None
+        self._wsTask            = None
+        self._reconcileTask     = None
+        self._wsAccountData     = None
+        self.posTs              = 0.0
+        self.posEvent           = asyncio.Event()
+        self.orders             = OrderTracker("ext")
+        self.market             = None
+
+    async def init(self, shared=False):
+        if shared and ExtendedAPI._sharedClients is not None:
+            self.client, self.ws_client, self.simpleClient, self.starkPerpAcc = ExtendedAPI._sharedClients
+            return
 
-    async def init(self):
         starkPerpAcc            = StarkPerpetualAccount(
             vault               = self.config["vault_id"],
             private_key         = self.config["private_key"],
@@ -72,10 +154,20 @@ class ExtendedAPI:
             MAINNET_CONFIG,
             starkPerpAcc
         )
+        self.starkPerpAcc       = starkPerpAcc
+        if shared:
+            ExtendedAPI._sharedClients  = (self.client, self.ws_client, self.simpleClient, starkPerpAcc)
+
+    async def close(self):
+        """Stop this pair's WS tasks (shared clients stay up for other pairs)."""
+        ACCOUNT_STREAM.unregister   (self)
+        for task in (self._wsTask, self._reconcileTask):
+            if task and not task.done():
+                task.cancel()
         
     async def initPair(self):
         url                     = f"https://api.starknet.extended.exchange/api/v1/info/markets?market={self.pair["symbol"]}"
-        async with aiohttp.ClientSession() as session:
+        async with SESSIONS.session("extended") as session:
             async with session.get(url) as resp:
                 data            = await resp.json()
 
@@ -92,18 +184,24 @@ class ExtendedAPI:
             "min_price_change"  : float(trading_cfg["minPriceChange"]),
             "asset_precision"   : int  (market_info["assetPrecision"])
         }
+        price_decimals          = max(0, -Decimal(str(trading_cfg["minPriceChange"])).as_tuple().exponent)
+        self.book               = OrderBook(price_decimals)
             
-    async def startWs(self, wsCallback):
+    async def startWs(self, wsCallback, depth=1):
         self.wsCallback                     = wsCallback
+        # Extended only supports depth=1 (best bid/ask) or the full book
+        # (SNAPSHOT + DELTA messages), so anything deeper than 1 uses the full book
+        depthParam                          = 1 if depth <= 1 else None
 
         async def subscribeOrderbook():
             while True:
                 try:
-                    async with self.ws_client.subscribe_to_orderbooks(self.pair["symbol"], depth=1) as stream:
+                    async with self.ws_client.subscribe_to_orderbooks(self.pair["symbol"], depth=depthParam) as stream:
                         while True:
                             msg             = await stream.recv()
-                            self._handle_orderbook_update(msg.data)
+                            self._handle_orderbook_update(msg.data, msg.type)
                 except Exception as e:
+                    self.book.reset()
                     self.ob = { "bidPrice": 0.0, "askPrice": 0.0, "bidSize": 0.0, "askSize": 0.0 }
                     
         async def subscribeFunding():
@@ -119,7 +217,65 @@ class ExtendedAPI:
         async def run_ws():
             await asyncio.gather(subscribeOrderbook(),subscribeFunding())
 
-        asyncio.create_task(run_ws())
+        self._wsTask = asyncio.create_task(run_ws())
+        ACCOUNT_STREAM.register(self)
+
+    def _handle_position_update(self, pos):
+        try:
+            if pos is None or str(pos.status).upper().endswith("CLOSED"):
+                qty, avg_price      = 0.0, 0.0
+            else:
+                size                = float(pos.size or 0.0)
+                avg_price           = float(pos.open_price or 0.0)
+                side                = str(pos.side).upper() if pos.side else ""
+                qty                 = size if side.endswith("LONG") else -size
+
+            if qty != self.accountData.get("qty"):
+                FILLS.notify        ("ext", self.pair["symbol"])    # data pipeline syncs trades soon
+            self._wsAccountData     = {"qty": qty, "entry_price": avg_price}
+            self.accountData        = dict(self._wsAccountData)
+            self.posTs              = time.time()
+            self.posEvent.set       ()
+        except Exception as e:
+            logger.error(f"⚠️ Error handling Extended position update: {e}")
+
+    async def waitPos(self, prevQty, timeout=5.0):
+        """
+        Wait until the account stream reports a qty different from prevQty.
+        Falls back to one REST loadPos if nothing arrives within timeout.
+        """
+        deadline                = time.time() + timeout
+        while self.accountData["qty"] == prevQty:
+            remaining           = deadline - time.time()
+            if remaining <= 0:
+                await self.loadPos()
+                break
+            self.posEvent.clear ()
+            try:
+                await asyncio.wait_for(self.posEvent.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return self.accountData
+
+    async def reconcilePos(self):
+        """REST check of the stream-maintained position; the stream wins if it moved meanwhile."""
+        wsData, posTs           = dict(self.accountData), self.posTs
+        await self.loadPos      ()
+        if self.posTs != posTs and self._wsAccountData:
+            self.accountData    = dict(self._wsAccountData)
+        elif self.accountData != wsData:
+            logger.warning      (f"⚠️ Position reconciled from REST: ws={wsData} rest={self.accountData}")
+
+    def startPosReconcile(self, interval):
+        async def _run():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.reconcilePos()
+                except Exception as e:
+                    logger.error(f"Extended reconcile error: {e}")
+        if self._reconcileTask is None or self._reconcileTask.done():
+            self._reconcileTask = asyncio.create_task(_run())
 
     def _handle_funding_update(self, msg):
         try:
@@ -128,59 +284,140 @@ class ExtendedAPI:
         except Exception as e:
             logger.error(f"⚠️ Error handling Extended funding update: {e}") 
 
-    def _handle_orderbook_update(self, msg):
+    def _handle_orderbook_update(self, msg, msgType=None):
+        recv_ts = time.perf_counter()
         try:
-            self.ob = {
-                "bidPrice": float(msg.bid[0].price) if msg.bid else 0.0,
-                "askPrice": float(msg.ask[0].price) if msg.ask else 0.0,
-                "bidSize" : float(msg.bid[0].qty)   if msg.bid else 0.0,
-                "askSize" : float(msg.ask[0].qty)   if msg.ask else 0.0,
-            }
+            if str(msgType).upper().endswith("DELTA"):
+                for b in msg.bid or ():
+                    self.book.addToLevel(True,  str(b.price), float(b.qty))
+                for a in msg.ask or ():
+                    self.book.addToLevel(False, str(a.price), float(a.qty))
+            else:
+                self.book.reset()
+                for b in msg.bid or ():
+                    self.book.setLevel  (True,  str(b.price), float(b.qty))
+                for a in msg.ask or ():
+                    self.book.setLevel  (False, str(a.price), float(a.qty))
+
+            new_ob  = self.book.top()
+            changed = new_ob != self.ob
+            self.ob = new_ob
 
             self.wsCallback('e_ob')
+            if changed and self.obSignal:
+                self.obSignal.notify(recv_ts)
 
         except Exception as e:
             logger.error(f"⚠️ Error handling Extended OB update: {e}")
 
-    async def placeMarketOrder(self, side: str, qty: float, isReduceOnly, max_retries=1000, delay=0.5):
+    def _marketOrderParams(self, side: str, qty: float, worstPrice=None):
+        """(side_enum, qty, price) as Decimals at the current book; None for a bad side."""
         ob = self.ob
-        # if not ob or not ob.get("bidPrice") or not ob.get("askPrice"):
-        #     logger.warning("No orderbook data yet, cannot place market order")
-        #     return None
         if not ob or not ob.get("bidPrice") or not ob.get("askPrice"):
             raise RuntimeError("Orderbook not ready")
 
         # ✅ Determine price & format values
+        # worstPrice: deepest level the sizing engine walked to (defaults to top of book)
         if side.upper() == "BUY":
-            raw_price = ob["askPrice"] * (1 + self.config["slippage"])
+            raw_price = max(ob["askPrice"], worstPrice or 0.0) * (1 + self.config["slippage"])
             side_enum = ExtendedOrderSide.BUY
         elif side.upper() == "SELL":
-            raw_price = ob["bidPrice"] * (1 - self.config["slippage"])
+            raw_price = min(ob["bidPrice"], worstPrice or ob["bidPrice"]) * (1 - self.config["slippage"])
             side_enum = ExtendedOrderSide.SELL
         else:
-            logger.error("Invalid side, must be BUY or SELL")
             return None
 
         price           = HELPERS.extGetAllowedNum(raw_price, self.pair["min_price_change"])
         price           = Decimal(str(price))
         fixQty          = HELPERS.extendedFmtDecimal(qty, self.pair["asset_precision"])
         fixQty          = Decimal(str(fixQty))
+        return side_enum, fixQty, price
+
+    def marketOrderKey(self, side: str, qty: float, isReduceOnly, worstPrice=None):
+        """What placeMarketOrder would sign right now (see presign.py)."""
+        if not self.ob.get("bidPrice") or not self.ob.get("askPrice"):
+            return None
+        params          = self._marketOrderParams(side, qty, worstPrice)
+        return params and (*params, bool(isReduceOnly))
+
+    async def _signOrder(self, clientId, side_enum, fixQty, price, reduce_only):
+        """
+        Build and Stark-sign the order on the Extended signing thread (what
+        PerpetualTradingClient.place_order does on the event loop).
+        """
+        if self.market is None:
+            self.market = (await self.client.markets_info.get_markets_dict())[self.pair["symbol"]]
+        return await SIGNERS.run(
+            "ext",
+            create_order_object,
+            account             = self.starkPerpAcc,
+            market              = self.market,
+            amount_of_synthetic = fixQty,
+            price               = price,
+            side                = side_enum,
+            starknet_domain     = MAINNET_CONFIG.starknet_domain,
+            post_only           = False,
+            order_external_id   = str(clientId),
+            reduce_only         = reduce_only,
+        )
+
+    async def _sendOrder(self, order, leg=None):
+        if leg:
+            leg.onWire  ()
+        return await self.client.orders.place_order(order)
+
+    async def presignMarketOrder(self, side: str, qty: float, isReduceOnly, worstPrice=None):
+        """Sign (not send) the order placeMarketOrder would send now; Extended nonces are random, nothing to reserve."""
+        key             = self.marketOrderKey(side, qty, isReduceOnly, worstPrice)
+        if key is None:
+            return None
+        side_enum, fixQty, price, reduce_only = key
+        clientId        = next_client_id()
+        order           = await self._signOrder(clientId, side_enum, fixQty, price, reduce_only)
+        return Presigned("ext", key, clientId, order)
+
+    def presignedValid(self, signed):
+        return True
+
+    async def placeMarketOrder(self, side: str, qty: float, isReduceOnly, max_retries=1000, delay=0.5, worstPrice=None, leg=None, presigned=None):
+        """
+        leg (OrderTracker.expect()): its client id is the order's external_id, so the account stream can confirm the fill.
+        presigned (Presigner.take()): sent as is; signed again below if that fails.
+        """
+        params          = self._marketOrderParams(side, qty, worstPrice)
+        if params is None:
+            logger.error("Invalid side, must be BUY or SELL")
+            if leg:
+                leg.fail("invalid side")
+            return None
+        side_enum, fixQty, price = params
 
         return_msg      = f"• PlacingMarketOrder ⭢ [{side}, {fixQty}, {price}]"  + '\n'
         logger.info     ( f"• PlacingMarketOrder ⭢ [{side}, {fixQty}, {price}]" )
 
+        if presigned is not None:
+            try:
+                start_time              = time.perf_counter()
+                await self._sendOrder   (presigned.payload, leg)
+                if leg:
+                    leg.sent            (fixQty)
+                latency_ms              = (time.perf_counter() - start_time) * 1000
+                return_msg              += f"• {side} Placed (presigned) | ⏱ Latency: {latency_ms:.2f} ms" + '\n'
+                logger.info             (  f"• {side} Placed (presigned) | ⏱ Latency: {latency_ms:.2f} ms")
+                return return_msg
+            except Exception as e:
+                logger.warning          (f"⚠️ Presigned order not sent ({e}), signing again")
+
         # ✅ RETRY LOOP
         for attempt in range(1, max_retries + 1):
             try:
                 start_time              = time.perf_counter()
-                order                   = await self.client.place_order(
-                    amount_of_synthetic = fixQty,
-                    price               = price,
-                    market_name         = self.pair["symbol"],
-                    side                = side_enum,
-                    post_only           = False,
-                    reduce_only         = True if isReduceOnly else False
+                order                   = await self._signOrder(
+                    leg.clientId if leg else next_client_id(), side_enum, fixQty, price, bool(isReduceOnly)
                 )
+                await self._sendOrder   (order, leg)
+                if leg:
+                    leg.sent            (fixQty)
                 end_time                = time.perf_counter()
                 latency_ms              = (end_time - start_time) * 1000
 
@@ -196,6 +433,8 @@ class ExtendedAPI:
                 else:
                     sym                 = self.pair["symbol"]
                     msg                 = f'❌ [Extended : {sym} ] PlaceMarketOrder Failed after all retries'
+                    if leg:
+                        leg.fail        ("after all retries")
                     await send_tele_crit(msg)
                     logger.error        (msg)
                     return return_msg + "• FAILED after all retries"
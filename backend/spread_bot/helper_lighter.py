@@ -2,13 +2,20 @@ import json
 import os
 import asyncio
 import aiohttp
+import contextvars
 import logging
 import lighter
 import time
-from lighter import WsClient
 from decimal import Decimal
 from dotenv import load_dotenv
 from helpers import HELPERS
+from orderbook import OrderBook
+from http_session import SESSIONS
+from sync_scheduler import FILLS
+from order_tracker import OrderTracker, next_client_id
+from presign import Presigned
+from sign_pool import SIGNERS
+from nonce_manager import NONCES, SdkNonceAdapter
 
 from telegram_api import send_telegram_message, send_tele_crit
 
@@ -16,10 +23,221 @@ logger                          = logging.getLogger("helper_lighter")
 logger.setLevel                 (logging.INFO)
 load_dotenv                     ('/root/arbSpread/backend/.env')
 
+class LighterStream:
+    """
+    One websocket for every Lighter channel the process needs.
+
+    Subscribers register (channel, queue) pairs, e.g. order_book:1,
+    market_stats:1, account_all:123. The first subscriber of a channel sends
+    the subscribe on the live socket (no reconnect), the last one to leave
+    unsubscribes. Private channels (account_all_orders) pass `auth`, called
+    for a fresh token on every (re)subscribe. Each message is put on the queues of that channel together
+    with its receipt time; on disconnect every queue gets (None, ts) so the
+    consumer can reset its state before the fresh snapshots arrive.
+    """
+    URL                             = "wss://mainnet.zklighter.elliot.ai/stream"
+
+    def __init__(self):
+        self.subs                   = {}
+        self.auth                   = {}                # channel -> () -> auth token
+        self.last                   = {}
+        self.ws                     = None
+        self._task                  = None
+
+    @staticmethod
+    def _wire(channel):
+        # messages carry "order_book:1", subscriptions are sent as "order_book/1"
+        return channel.replace(":", "/")
+
+    def _subscribeMsg(self, channel):
+        payload                     = {"type": "subscribe", "channel": self._wire(channel)}
+        if channel in self.auth:
+            payload["auth"]         = self.auth[channel]()
+        return payload
+
+    def subscribe(self, channel: str, queue: asyncio.Queue, auth=None):
+        queues                      = self.subs.setdefault(channel, set())
+        isNew                       = not queues
+        queues.add                  (queue)
+        if auth is not None:
+            self.auth[channel]      = auth
+
+        if self.ws is not None and not self.ws.closed:
+            if isNew:
+                self._sendSoon      (self._subscribeMsg(channel))
+            elif channel.startswith("order_book"):
+                # deltas can't be replayed: resubscribe so everyone gets a fresh snapshot
+                self._sendSoon      ({"type": "unsubscribe", "channel": self._wire(channel)})
+                self._sendSoon      (self._subscribeMsg(channel))
+            elif channel in self.last:
+                queue.put_nowait    (self.last[channel])
+
+        if self._task is None or self._task.done():
+            # fresh context: the stream must not inherit the first pair's log context
+            self._task              = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        queues                      = self.subs.get(channel)
+        if not queues:
+            return
+        queues.discard              (queue)
+        if not queues:
+            del self.subs[channel]
+            self.auth.pop           (channel, None)
+            self.last.pop           (channel, None)
+            if self.ws is not None and not self.ws.closed:
+                self._sendSoon      ({"type": "unsubscribe", "channel": self._wire(channel)})
+
+    def _sendSoon(self, payload):
+        asyncio.create_task         (self._send(payload))
+
+    async def _send(self, payload):
+        try:
+            await self.ws.send_str  (json.dumps(payload))
+        except Exception as e:
+            logger.warning          (f"[Lighter WS] send failed {payload}: {e}")
+
+    def _dispatch(self, raw, recv_ts):
+        data                        = json.loads(raw)
+        msgType                     = data.get("type")
+        if msgType == "ping":
+            self._sendSoon          ({"type": "pong"})
+            return
+        if msgType == "connected":
+            for channel in self.subs:
+                try:
+                    self._sendSoon  (self._subscribeMsg(channel))
+                except Exception as e:
+                    logger.error    (f"[Lighter WS] cannot subscribe {channel}: {e}")
+            return
+
+        channel                     = data.get("channel")
+        queues                      = self.subs.get(channel)
+        if not queues:
+            return
+        item                        = (data, recv_ts)
+        if not channel.startswith("order_book"):
+            self.last[channel]      = item
+        for q in queues:
+            q.put_nowait            (item)
+
+    async def _run(self):
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.URL, heartbeat=30) as ws:
+                        self.ws     = ws
+                        logger.info (f"[Lighter WS] connected, channels={list(self.subs)}")
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self._dispatch(msg.data, time.perf_counter())
+                            elif msg.type == aiohttp.WSMsgType.ERROR:
+                                raise RuntimeError(f"WebSocket error: {ws.exception()}")
+                        logger.warning("[Lighter WS] socket closed; reconnecting...")
+            except Exception as e:
+                logger.error        (f"[Lighter WS] disconnected: {e} — retrying in 1s")
+            finally:
+                self.ws             = None
+                self.last.clear     ()
+                for q in {q for queues in self.subs.values() for q in queues}:
+                    q.put_nowait    ((None, time.perf_counter()))
+            await asyncio.sleep     (1)
+
+# one socket per process, shared by every LighterAPI in it
+STREAM                          = LighterStream()
+
+class TxBatcher:
+    """
+    Signed Lighter txs of one signer, sent together with send_tx_batch.
+
+    send() coalesces what is submitted within `window` seconds (default: the
+    same loop iteration), e.g. the legs of two pairs of a shared process that
+    fired on the same book update, or a rebalance's cancel-all + order; a
+    group of one is a plain send_tx. Grouping across pairs is best effort: a
+    tx never waits for others, it only takes along what is already pending.
+    A group goes out in nonce order (txs of several pairs claim from the
+    same sequence but may finish signing in any order). Every tx gets its
+    own outcome: its tx hash, or the exception that failed the request it
+    was in.
+    """
+    MAX_BATCH                   = 50
+
+    def __init__(self, window: float = 0.0):
+        self.window             = window
+        self.pending            = {}                    # id(client) -> (client, [(txType, txInfo, nonce, future)])
+        self.stats              = {"requests": 0, "txs": 0, "batches": 0}
+
+    async def send(self, client, txType: int, txInfo: str, nonce: int | None = None) -> str:
+        loop                    = asyncio.get_running_loop()
+        future                  = loop.create_future()
+        key                     = id(client)
+        group                   = self.pending.get(key)
+        if group is None:
+            group               = self.pending[key] = (client, [])
+            loop.call_later     (self.window, self._flushSoon, key, group)
+        group[1].append         ((txType, txInfo, nonce, future))
+        if len(group[1]) >= self.MAX_BATCH:
+            self._flushSoon     (key, group)
+        return await future
+
+    def _flushSoon(self, key, group):
+        if self.pending.get(key) is not group:
+            return                                      # flushed already (full)
+        del self.pending[key]
+        asyncio.ensure_future   (self._flush(*group))
+
+    async def _flush(self, client, entries):
+        if all(nonce is not None for _, _, nonce, _ in entries):
+            entries             = sorted(entries, key=lambda e: e[2])
+        results                 = await self.sendMany(client, [(t, i) for t, i, _, _ in entries])
+        for (_, _, _, future), result in zip(entries, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def sendMany(self, client, txs) -> list:
+        """txs = [(txType, txInfo)] -> [tx hash or Exception], in order."""
+        results                 = []
+        for start in range(0, len(txs), self.MAX_BATCH):
+            results.extend      (await self._request(client, txs[start:start + self.MAX_BATCH]))
+        return results
+
+    async def _request(self, client, txs) -> list:
+        self.stats["requests"]  += 1
+        self.stats["txs"]       += len(txs)
+        try:
+            if len(txs) == 1:
+                resp            = await client.send_tx(tx_type=txs[0][0], tx_info=txs[0][1])
+                hashes          = [resp.tx_hash]
+            else:
+                self.stats["batches"] += 1
+                resp            = await client.tx_api.send_tx_batch(
+                    tx_types    = json.dumps([t for t, _ in txs]),
+                    tx_infos    = json.dumps([i for _, i in txs]),
+                )
+                hashes          = list(resp.tx_hash)
+            if resp.code != 200:
+                raise RuntimeError(f"send_tx{'_batch' if len(txs) > 1 else ''} {resp.code}: {resp.message}")
+        except Exception as e:
+            return [e] * len(txs)
+        return [hashes[n] if n < len(hashes) else None for n in range(len(txs))]
+
+    def fmtSummary(self) -> str:
+        s                       = self.stats
+        return f"{s['txs']} txs in {s['requests']} requests ({s['batches']} batched)"
+
+# one batcher per process: pairs sharing a signer share its requests
+TX_BATCH                        = TxBatcher()
+
 class LighterAPI:
+    # set by init(shared=True): one signer for every pair in the process
+    _sharedClient               = None
+
     def __init__(self, symbol: str):
         self.client             = None
-        self.ws_client          = None
         self.config             = {
             "base_url"          : "https://mainnet.zklighter.elliot.ai",
             "private_key"       : os.getenv("LIGHTER_API_PRIVATE_KEY"),
@@ -46,24 +264,64 @@ class LighterAPI:
             "entry_price"       : 0.0,
             "all_inv_value"     : 0.0,
         }
+        self.book               = None
         self.wsCallback         = None
         self.invValue           = None
         self.currFundRate       = None
-        self._wsFundingTask     = None
-
-    async def init(self):
-        self.client             = lighter.SignerClient(
-            url                 = self.config["base_url"],
-            private_key         = self.config["private_key"],
-            account_index       = self.config["account_index"],
-            api_key_index       = self.config["api_key_index"],
-        )
+        self._wsTask            = None
+        self._reconcileTask     = None
+        self._wsAccountData     = None
+        self.posTs              = 0.0
+        self.posEvent           = asyncio.Event()
+        self.queue              = asyncio.Queue()
+        self.channels           = []
+        self.obSignal           = None
+        self.orders             = OrderTracker("lig")
+        self.nonces             = None
+
+    async def init(self, shared=False):
+        if shared and LighterAPI._sharedClient is not None:
+            self.client         = LighterAPI._sharedClient
+        else:
+            self.client         = lighter.SignerClient(
+                url             = self.config["base_url"],
+                private_key     = self.config["private_key"],
+                account_index   = self.config["account_index"],
+                api_key_index   = self.config["api_key_index"],
+            )
+            if shared:
+                LighterAPI._sharedClient    = self.client
+
+        # one nonce sequence per API key for every pair and process (see nonce_manager.py)
+        self.nonces             = NONCES.get(self.config["account_index"], self.config["api_key_index"], self._fetchNonce)
+        if not isinstance(self.client.nonce_manager, SdkNonceAdapter):
+            await self.nonces.init  ()
+            self.client.nonce_manager   = SdkNonceAdapter(self.nonces)
+
+    async def _fetchNonce(self):
+        url                     = f"{self.config['base_url']}/api/v1/nextNonce"
+        params                  = {"account_index": self.config["account_index"], "api_key_index": self.config["api_key_index"]}
+        async with SESSIONS.session("lighter") as session:
+            async with session.get(url, params=params) as resp:
+                if resp.status != 200:
+                    raise Exception(f"Failed to fetch next nonce: {resp.status}")
+                data            = await resp.json()
+        return int(data["nonce"])
+
+    async def close(self):
+        """Leave the shared stream and stop this pair's consumer (signer/socket stay up)."""
+        for channel in self.channels:
+            STREAM.unsubscribe  (channel, self.queue)
+        self.channels           = []
+        for task in (self._wsTask, self._reconcileTask):
+            if task and not task.done():
+                task.cancel()
 
 
     async def initPair(self):
         symbol                  = self.pair["symbol"]
         url                     = f"{self.config["base_url"]}/api/v1/orderBookDetails"
-        async with aiohttp.ClientSession() as session:
+        async with SESSIONS.session("lighter") as session:
             async with session.get(url) as resp:
                 if resp.status != 200:
                     raise Exception(f"Failed to fetch market metadata: {resp.status}")
@@ -82,106 +340,99 @@ class LighterAPI:
             "min_size"                  : float(match["min_base_amount"]),
             "min_value"                 : float(match["min_quote_amount"]),   
         }
+        self.book                       = OrderBook(self.pair["price_decimals"])
                 
 
-    async def startWsFunding(self):
-        market_id           = self.pair["market_id"]
-        if self._wsFundingTask and not self._wsFundingTask.done():
-            logger.info("wsFunding already running; skipping new start.")
-            return
+    def _subscribe(self, channel, auth=None):
+        if channel not in self.channels:
+            self.channels.append    (channel)
+            STREAM.subscribe        (channel, self.queue, auth)
+        if self._wsTask is None or self._wsTask.done():
+            self._wsTask            = asyncio.create_task(self._consumeStream())
 
+    async def startWsFunding(self):
         logger.info("[Funding WS] startWsFunding() called")
-
-        async def _run():
-            url             = "wss://mainnet.zklighter.elliot.ai/stream"
-            sub_msg         = {"type": "subscribe","channel": f"market_stats/{market_id}"}
-
-            while True:
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.ws_connect(url, heartbeat=30) as ws:
-                            await ws.send_str(json.dumps(sub_msg))
-                            logger.info(f"[Funding WS] Subscribed to market_stats for market_id={market_id}")
-                            async for msg in ws:
-                                if msg.type == aiohttp.WSMsgType.TEXT:
-                                    try:
-                                        data            = json.loads(msg.data)
-                                        message_type    = data.get("type")
-                                        if message_type == "ping":
-                                            await ws.send_str(json.dumps({"type": "pong"}))
-                                            continue
-                                        if message_type in ["update/market_stats", "market_stats"]:
-                                            mstats      = data.get("market_stats") or {}
-                                            fr          = mstats.get("current_funding_rate") or mstats.get("funding_rate")
-                                            if fr is not None:
-                                                try:
-                                                    self.currFundRate = float(fr)
-                                                except (TypeError, ValueError):
-                                                    pass
-                                    except Exception as e:
-                                        logger.error(f"[Funding WS] parse error: {e}")
-                                elif msg.type == aiohttp.WSMsgType.ERROR:
-                                    raise RuntimeError(f"WebSocket error: {ws.exception()}")
-                            logger.warning("[Funding WS] socket closed; reconnecting...")
-
-                except Exception as e:
-                    self.currFundRate = None
-                    logger.error(f"[Lighter Funding WS] disconnected: {e} — retrying in 1s")
-                    await asyncio.sleep(1)
-
-        self._wsFundingTask = asyncio.create_task(_run())
-
-
+        self._subscribe                         (f"market_stats:{self.pair['market_id']}")
+
+    def _resetOb(self):
+        if self.book:
+            self.book.reset()
+        self.ob = {
+            "bidPrice": 0.0,
+            "askPrice": 0.0,
+            "bidSize" : 0.0,
+            "askSize" : 0.0,
+        }
 
     async def startWs(self, wsCallback):
         self.wsCallback                         = wsCallback
-        async def run_ws():
-            while True:
+        self._subscribe                         (f"order_book:{self.pair['market_id']}")
+        self._subscribe                         (f"account_all:{self.config['account_index']}")
+        # order status: IOC legs that end partial / unfilled / cancelled resolve without waiting out the timeout
+        self._subscribe                         (f"account_all_orders:{self.config['account_index']}", auth=self._authToken)
+
+    def _authToken(self):
+        token, err                              = self.client.create_auth_token_with_expiry()
+        if err is not None:
+            raise RuntimeError                  (f"auth token: {err}")
+        return token
+
+    async def _consumeStream(self):
+        """Drain this pair's queue from the shared LighterStream."""
+        while True:
+            data, recv_ts                       = await self.queue.get()
+            if data is None:
+                # socket dropped: snapshots follow on reconnect
+                self._resetOb                   ()
+                self.currFundRate               = None
+                continue
+
+            msgType                             = data.get("type", "")
+            channelId                           = data.get("channel", ":").split(":")[1]
+            if msgType.endswith("order_book"):
+                self._handle_orderbook_update   (channelId, data.get("order_book"), msgType.startswith("subscribed"), recv_ts)
+            elif msgType.endswith("account_all"):
+                self._handle_account_update     (channelId, data)
+            elif msgType.endswith("account_all_orders"):
+                self._handle_account_orders     (data.get("orders") or {})
+            elif msgType.endswith("market_stats"):
+                self._handle_market_stats       (data)
+
+    def _handle_market_stats(self, data):
+        try:
+            mstats          = data.get("market_stats") or {}
+            fr              = mstats.get("current_funding_rate") or mstats.get("funding_rate")
+            if fr is not None:
                 try:
-                    self.ws_client              = WsClient(
-                        order_book_ids          = [self.pair["market_id"]],
-                        on_order_book_update    = self._handle_orderbook_update,
-                        account_ids             = [self.config["account_index"]],
-                        on_account_update       = self._handle_account_update
-                    )
-                    # logger.info('✅ WS Lighter Connected')
-                    await self.ws_client.run_async()
+                    self.currFundRate = float(fr)
+                except (TypeError, ValueError):
+                    pass
+        except Exception as e:
+            logger.error(f"[Funding WS] parse error: {e}")
 
-                except Exception as e:
-                    # logger.error(f"⚠️ WS Lighter Disconnected")
-                    self.ob = {
-                        "bidPrice": 0.0,
-                        "askPrice": 0.0,
-                        "bidSize" : 0.0,
-                        "askSize" : 0.0,
-                    }
-        asyncio.create_task(run_ws())
-        
-    def _handle_orderbook_update(self, market_id, order_book):
+    def _handle_orderbook_update(self, market_id, order_book, isSnapshot=False, recv_ts=None):
+        recv_ts                 = recv_ts or time.perf_counter()
         try:
             if isinstance(order_book, dict) and order_book.get("type") == "ping":
                 return
 
-            # Sort by price
-            order_book["bids"].sort(key=lambda x: float(x["price"]), reverse=True)
-            order_book["asks"].sort(key=lambda x: float(x["price"]))
-
-            # --- find first valid bid ---
-            bid = next((b for b in order_book["bids"] if float(b["size"]) > 0), None)
-            ask = next((a for a in order_book["asks"] if float(a["size"]) > 0), None)
+            # Apply the snapshot/delta to the local book in place
+            if isSnapshot:
+                self.book.applySnapshot (order_book.get("bids"), order_book.get("asks"))
+            else:
+                self.book.applyDelta    (order_book.get("bids"), order_book.get("asks"))
 
-            if not bid or not ask:
+            if not self.book.isReady():
                 logger.warning(f"No valid bid/ask found for {market_id}")
                 return
 
-            self.ob = {
-                "bidPrice": float(bid["price"]),
-                "askPrice": float(ask["price"]),
-                "bidSize": float(bid["size"]),
-                "askSize": float(ask["size"]),
-            }
+            new_ob      = self.book.top()
+            changed     = new_ob != self.ob
+            self.ob     = new_ob
 
             self.wsCallback('l_ob')
+            if changed and self.obSignal:
+                self.obSignal.notify(recv_ts)
 
         except Exception as e:
             logger.error(f"Lighter handler error: {e}")
@@ -203,61 +454,319 @@ class LighterAPI:
                     logger.warning(f"Error parsing position for {pos.get('symbol', '?')}: {e}")
 
             self.invValue           = all_inv_value
+
+            # keep accountData live from the stream; REST loadPos is only a reconciliation
+            current_pos             = positions.get(str(self.pair["market_id"]))
+            if current_pos is not None:
+                qty                 = float(current_pos.get("position", "0") or 0) * int(current_pos.get("sign", 1))
+                entry_price         = float(current_pos.get("avg_entry_price", "0") or 0)
+                self._setWsPos      (qty, entry_price)
+            elif str(account.get("type", "")).startswith("subscribed"):
+                # snapshot without this market: flat
+                self._setWsPos      (0.0, 0.0)
+
+            # fills of our pending orders (after the position, so it is current once a leg resolves)
+            self._handle_account_trades(account.get("trades") or {})
+
             self.wsCallback("l_acc")
 
         except Exception as e:
             logger.error(f"Lighter handler error: {e}")
 
-            
-    async def placeMarketOrder(self, side: str, order_qty: float, isReduceOnly, max_retries=1000, delay=0.5):
-        market_index            = self.pair["market_id"]
-        size_decimals           = self.pair["size_decimals"]
-        price_decimals          = self.pair["price_decimals"]
+    def _handle_account_trades(self, trades):
+        account_index           = self.config["account_index"]
+        for trade in trades.get(str(self.pair["market_id"])) or ():
+            if trade.get("ask_account_id") == account_index:
+                clientId        = trade.get("ask_client_id")
+            elif trade.get("bid_account_id") == account_index:
+                clientId        = trade.get("bid_client_id")
+            else:
+                continue
+            self.orders.onFill  (clientId, trade.get("trade_id"), float(trade.get("size") or 0), float(trade.get("price") or 0))
+
+    def _handle_account_orders(self, orders):
+        """Status and cumulative fill of our orders in this market (account_all_orders)."""
+        try:
+            for order in orders.get(str(self.pair["market_id"])) or ():
+                filled          = float(order.get("filled_base_amount") or 0)
+                quote           = float(order.get("filled_quote_amount") or 0)
+                self.orders.onOrder(order.get("client_order_index"), order.get("status", ""), filled, quote / filled if filled else 0.0)
+        except Exception as e:
+            logger.error(f"Lighter orders handler error: {e}")
+
+    def _setWsPos(self, qty, entry_price):
+        if qty != self.accountData.get("qty"):
+            FILLS.notify        ("lig", self.pair["symbol"])    # data pipeline syncs trades soon
+        self._wsAccountData     = {"qty": qty, "entry_price": entry_price}
+        self.accountData        = dict(self._wsAccountData)
+        self.posTs              = time.time()
+        self.posEvent.set       ()
+
+    async def waitPos(self, prevQty, timeout=5.0):
+        """
+        Wait until the account stream reports a qty different from prevQty.
+        Falls back to one REST loadPos if nothing arrives within timeout.
+        """
+        deadline                = time.time() + timeout
+        while self.accountData["qty"] == prevQty:
+            remaining           = deadline - time.time()
+            if remaining <= 0:
+                await self.loadPos(max_retries=3, resetOnFail=False)
+                break
+            self.posEvent.clear ()
+            try:
+                await asyncio.wait_for(self.posEvent.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return self.accountData
+
+    async def reconcilePos(self):
+        """REST check of the stream-maintained position; the stream wins if it moved meanwhile."""
+        wsData, posTs           = dict(self.accountData), self.posTs
+        await self.loadPos      (max_retries=3, resetOnFail=False)
+        if self.posTs != posTs and self._wsAccountData:
+            self.accountData    = dict(self._wsAccountData)
+        elif self.accountData != wsData:
+            logger.warning      (f"⚠️ Position reconciled from REST: ws={wsData} rest={self.accountData}")
+
+    def startPosReconcile(self, interval):
+        async def _run():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.reconcilePos()
+                except Exception as e:
+                    logger.error(f"Lighter reconcile error: {e}")
+        if self._reconcileTask is None or self._reconcileTask.done():
+            self._reconcileTask = asyncio.create_task(_run())
+
+    def _marketOrderParams(self, side: str, order_qty: float, worstPrice=None):
+        """(is_ask, base_amount, price) in Lighter integer units at the current book; None for a bad side."""
         ob                      = self.ob
-        # if not ob or not ob.get("bidPrice") or not ob.get("askPrice"):
-        #     logger.warning     ("No orderbook data yet, cannot place market order")
-        #     return None
         if not ob or not ob.get("bidPrice") or not ob.get("askPrice"):
             raise RuntimeError("Orderbook not ready")
 
+        # worstPrice: deepest level the sizing engine walked to (defaults to top of book)
         if side.upper() == "BUY":
-            best_ask            = float(ob["askPrice"])
+            best_ask            = max(float(ob["askPrice"]), worstPrice or 0.0)
             price               = best_ask * (1 + self.config["slippage"])
             is_ask              = False
         elif side.upper() == "SELL":
-            best_bid            = float(ob["bidPrice"])
+            best_bid            = min(float(ob["bidPrice"]), worstPrice or float(ob["bidPrice"]))
             price               = best_bid * (1 - self.config["slippage"])
             is_ask              = True
         else:
+            return None
+
+        fix_size                = HELPERS.lighterFmtDecimal(order_qty, self.pair["size_decimals"])
+        fix_price               = HELPERS.lighterFmtDecimal(price    , self.pair["price_decimals"])
+        return is_ask, fix_size, fix_price
+
+    def marketOrderKey(self, side: str, order_qty: float, isReduceOnly, worstPrice=None):
+        """What placeMarketOrder would sign right now (see presign.py)."""
+        if not self.ob.get("bidPrice") or not self.ob.get("askPrice"):
+            return None
+        params                  = self._marketOrderParams(side, order_qty, worstPrice)
+        return params and (*params, bool(isReduceOnly))
+
+    async def _signOrder(self, clientId, is_ask, fix_size, fix_price, reduce_only, nonce):
+        """
+        SignCreateOrder of a market leg on the Lighter signing thread; the event
+        loop keeps running meanwhile. Market + IOC with fix_price as the worst
+        price: what doesn't cross right away is cancelled (canceled-* status on
+        account_all_orders) instead of resting on the book.
+        """
+        tx_info, err            = await SIGNERS.run(
+            "lig",
+            self.client.sign_create_order,
+            self.pair["market_id"],
+            clientId,
+            fix_size,
+            fix_price,
+            int(is_ask),
+            lighter.SignerClient.ORDER_TYPE_MARKET,
+            lighter.SignerClient.ORDER_TIME_IN_FORCE_IMMEDIATE_OR_CANCEL,
+            int(reduce_only),
+            lighter.SignerClient.NIL_TRIGGER_PRICE,
+            lighter.SignerClient.DEFAULT_IOC_EXPIRY,
+            nonce,
+        )
+        if err is not None:
+            raise RuntimeError  (err)
+        return tx_info
+
+    async def _sendTx(self, tx_info, nonce, leg=None):
+        """
+        send_tx of a signed order whose nonce is claimed. No waiting on other
+        txs: several can be in flight. A rejected nonce resyncs the sequence
+        from the exchange, any other failure hands the nonce back.
+        """
+        if leg:
+            leg.onWire          ()
+        try:
+            return await TX_BATCH.send(self.client, lighter.SignerClient.TX_TYPE_CREATE_ORDER, tx_info, nonce)
+        except Exception as e:
+            await self._txFailed([nonce], e)
+            raise
+
+    async def _txFailed(self, nonces, error):
+        """Nonces of txs the exchange did not take: resync on a nonce error, else hand them back (last first)."""
+        if "nonce" in str(error).lower():
+            await self.nonces.resync()
+            return
+        for nonce in sorted(nonces, reverse=True):
+            self.nonces.release (nonce)
+
+    async def _createOrder(self, clientId, is_ask, fix_size, fix_price, reduce_only, leg=None):
+        """Claim the next nonce, sign off the loop, send (what SignerClient.create_order does on the loop)."""
+        nonce                   = self.nonces.next()
+        try:
+            tx_info             = await self._signOrder(clientId, is_ask, fix_size, fix_price, reduce_only, nonce)
+        except Exception:
+            self.nonces.release (nonce)
+            raise
+        return await self._sendTx(tx_info, nonce, leg)
+
+    async def presignMarketOrder(self, side: str, order_qty: float, isReduceOnly, worstPrice=None):
+        """
+        Sign (not send) the order placeMarketOrder would send now, with the
+        next nonce peeked from the shared sequence: it is only claimed when
+        the order goes out, so an unsent presign leaves no nonce gap.
+        """
+        key                     = self.marketOrderKey(side, order_qty, isReduceOnly, worstPrice)
+        if key is None:
+            return None
+        is_ask, fix_size, fix_price, reduce_only = key
+        nonce                   = self.nonces.peek()
+        clientId                = next_client_id()
+        tx_info                 = await self._signOrder(clientId, is_ask, fix_size, fix_price, reduce_only, nonce)
+        return Presigned("lig", key, clientId, tx_info, nonce=nonce)
+
+    def presignedValid(self, signed):
+        """Still sendable: no other tx on this API key (any pair, any process) took its nonce meanwhile."""
+        return self.nonces.peek() == signed.meta["nonce"]
+
+    async def _sendPresigned(self, signed, leg=None):
+        """Claim the presigned nonce and send the bytes; raises if the order must be signed again."""
+        if not self.nonces.claim(signed.meta["nonce"]):
+            raise RuntimeError  (f"presigned nonce {signed.meta['nonce']} is stale (next {self.nonces.peek()})")
+        return await self._sendTx(signed.payload, signed.meta["nonce"], leg)
+
+    # ------------------------------------------------------------------
+    # Batches: sign now, send together (sendBatch)
+    # ------------------------------------------------------------------
+    async def signCancelAll(self) -> dict:
+        """Cancel-all of the account (like cancelOrders), signed with the next nonce."""
+        nonce                   = self.nonces.next()
+        try:
+            tx_info, err        = await SIGNERS.run("lig", self.client.sign_cancel_all_orders, 0, 0, nonce)
+            if err is not None:
+                raise RuntimeError(err)
+        except Exception:
+            self.nonces.release (nonce)
+            raise
+        return {"label": "cancel_all", "type": lighter.SignerClient.TX_TYPE_CANCEL_ALL_ORDERS, "info": tx_info, "nonce": nonce}
+
+    async def signMarketOrder(self, side: str, order_qty: float, isReduceOnly, worstPrice=None, clientId=None) -> dict:
+        """The order placeMarketOrder would send now, signed with the next nonce."""
+        params                  = self._marketOrderParams(side, order_qty, worstPrice)
+        if params is None:
+            raise ValueError    ("Invalid side, must be BUY or SELL")
+        is_ask, fix_size, fix_price = params
+        nonce                   = self.nonces.next()
+        try:
+            tx_info             = await self._signOrder(clientId or next_client_id(), is_ask, fix_size, fix_price, isReduceOnly, nonce)
+        except Exception:
+            self.nonces.release (nonce)
+            raise
+        label                   = f"{self.pair['symbol']} {side} {fix_size / 10 ** self.pair['size_decimals']}"
+        return {"label": label, "type": lighter.SignerClient.TX_TYPE_CREATE_ORDER, "info": tx_info, "nonce": nonce}
+
+    async def sendBatch(self, txs: list) -> list:
+        """
+        Send signed txs (signCancelAll / signMarketOrder, claimed in this
+        order) as one request, in order. They join TX_BATCH's pending group,
+        so txs other pairs of the process submit on the same loop iteration
+        ride along (best effort: nothing waits for them). Returns one result
+        per tx: {"label", "nonce", "ok", "hash", "error"}.
+        """
+        start_time              = time.perf_counter()
+        outcomes                = await asyncio.gather(
+            *(TX_BATCH.send(self.client, tx["type"], tx["info"], tx["nonce"]) for tx in txs), return_exceptions=True,
+        )
+        latency_ms              = (time.perf_counter() - start_time) * 1000
+        results                 = []
+        for tx, outcome in zip(txs, outcomes):
+            ok                  = not isinstance(outcome, BaseException)
+            results.append      ({
+                "label"         : tx["label"],
+                "nonce"         : tx["nonce"],
+                "ok"            : ok,
+                "hash"          : outcome if ok else None,
+                "error"         : None if ok else str(outcome),
+            })
+            logger.info         (f"• Batch tx {tx['label']} (nonce {tx['nonce']}): {'✅ ' + str(outcome) if ok else '❌ ' + str(outcome)}")
+        failed                  = [r for r in results if not r["ok"]]
+        if failed:
+            await self._txFailed([r["nonce"] for r in failed], failed[0]["error"])
+        logger.info             (f"• Batch of {len(txs)} sent | ⏱ Latency: {latency_ms:.2f} ms")
+        return results
+
+    async def cancelAllAndPlaceMarketOrder(self, side: str, order_qty: float, isReduceOnly, worstPrice=None) -> list:
+        """cancelOrders + placeMarketOrder in a single request (balance_positions); raises if any tx failed."""
+        txs                     = [await self.signCancelAll()]
+        try:
+            txs.append          (await self.signMarketOrder(side, order_qty, isReduceOnly, worstPrice))
+        except Exception:
+            self.nonces.release (txs[0]["nonce"])
+            raise
+        results                 = await self.sendBatch(txs)
+        failed                  = [f"{r['label']}: {r['error']}" for r in results if not r["ok"]]
+        if failed:
+            raise RuntimeError  ("; ".join(failed))
+        return results
+
+    async def placeMarketOrder(self, side: str, order_qty: float, isReduceOnly, max_retries=1000, delay=0.5, worstPrice=None, leg=None, presigned=None):
+        """
+        leg (OrderTracker.expect()): its client id goes on the order, so the account stream can confirm the fill.
+        presigned (Presigner.take()): sent as is; signed again below if that fails.
+        """
+        size_decimals           = self.pair["size_decimals"]
+        params                  = self._marketOrderParams(side, order_qty, worstPrice)
+        if params is None:
             logger.error("Invalid side, must be BUY or SELL")
+            if leg:
+                leg.fail        ("invalid side")
             return None
-        
-        fix_size                = HELPERS.lighterFmtDecimal(order_qty, size_decimals)
-        fix_price               = HELPERS.lighterFmtDecimal(price    , price_decimals)
+        is_ask, fix_size, fix_price = params
 
         return_msg              = f"• PlacingMarketOrder ⭢ [{is_ask}, {fix_size}, {fix_price}]" + '\n'   
         logger.info             ( f"• PlacingMarketOrder ⭢ [{is_ask}, {fix_size}, {fix_price}]")
 
+        if presigned is not None:
+            try:
+                start_time              = time.perf_counter()
+                tx_hash                 = await self._sendPresigned(presigned, leg)
+                logger.info             (tx_hash)
+                if leg:
+                    leg.sent            (fix_size / 10 ** size_decimals)
+                latency_ms              = (time.perf_counter() - start_time) * 1000
+                return_msg              += f"• {side} Placed (presigned) | ⏱ Latency: {latency_ms:.2f} ms" + '\n'
+                logger.info             (  f"• {side} Placed (presigned) | ⏱ Latency: {latency_ms:.2f} ms")
+                return return_msg
+            except Exception as e:
+                logger.warning          (f"⚠️ Presigned order not sent ({e}), signing again")
+
         # ✅ RETRY LOOP
         for attempt in range(1, max_retries + 1):
             try:
                 start_time = time.perf_counter()
-                tx, tx_hash, err = await self.client.create_order(
-                    market_index        = market_index,
-                    client_order_index  = int(asyncio.get_event_loop().time() * 1000),
-                    base_amount         = fix_size,
-                    price               = fix_price,
-                    is_ask              = is_ask,
-                    order_type          = lighter.SignerClient.ORDER_TYPE_LIMIT,
-                    time_in_force       = lighter.SignerClient.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME,
-                    reduce_only         = 1 if isReduceOnly else 0,
-                    trigger_price       = 0,
+                tx_hash                 = await self._createOrder(
+                    leg.clientId if leg else next_client_id(), is_ask, fix_size, fix_price, isReduceOnly, leg
                 )
-                
-                if err:
-                    raise Exception(err)
-                else:
-                    logger.info(tx_hash)
+                logger.info             (tx_hash)
+                if leg:
+                    leg.sent            (fix_size / 10 ** size_decimals)
 
                 end_time                = time.perf_counter()
                 latency_ms              = (end_time - start_time) * 1000
@@ -273,19 +782,21 @@ class LighterAPI:
                 else:
                     sym                 = self.pair["symbol"]
                     msg                 = f'❌ [Lighter : {sym} ] PlaceMarketOrder Failed after all retries'
+                    if leg:
+                        leg.fail        ("after all retries")
                     await send_tele_crit(msg)
                     logger.error        (msg)
                     return return_msg + "• FAILED after all retries"
 
 
-    async def loadPos(self, max_retries=1000, retry_delay=1):
+    async def loadPos(self, max_retries=1000, retry_delay=1, resetOnFail=True):
         symbol = self.pair["symbol"]
         account_index = self.config["account_index"]
         url = f"{self.config['base_url']}/api/v1/account?by=index&value={account_index}"
 
         for attempt in range(1, max_retries + 1):
             try:
-                async with aiohttp.ClientSession() as session:
+                async with SESSIONS.session("lighter") as session:
                     async with session.get(url, headers={"accept": "application/json"}) as resp:
                         if resp.status != 200:
                             logger.warning(f"⚠️ Attempt {attempt}/{max_retries} failed (HTTP {resp.status})")
@@ -329,7 +840,8 @@ class LighterAPI:
                     continue
                 else:
                     logger.error(f"❌ Failed to fetch position for {symbol} after {max_retries} attempts")
-                    self.accountData = {"qty": 0, "entry_price": 0}
+                    if resetOnFail:
+                        self.accountData = {"qty": 0, "entry_price": 0}
                     return self.accountData
 
     # async def loadPos(self):
@@ -397,7 +909,7 @@ class LighterAPI:
                 start_time = time.perf_counter()
                 tx, tx_hash, err = await self.client.create_order(
                     market_index        = market_index,
-                    client_order_index  = int(asyncio.get_event_loop().time() * 1000),
+                    client_order_index  = next_client_id(),
                     base_amount         = fix_size,
                     price               = fix_price,
                     is_ask              = is_ask,
@@ -430,17 +942,12 @@ class LighterAPI:
     
 
     async def cancelOrders(self):
-        market_index            = self.pair["market_id"]
+        # account-wide cancel-all, through the batcher (grouped with same-tick txs of other pairs)
         try:
             start_time          = time.perf_counter()
-            tx, tx_hash, err    = await self.client.cancel_all_orders(
-                time_in_force   = 0,
-                time            = 0,
-            )
-            if err:
-                raise Exception(err)
-            else:
-                logger.info(tx_hash)
+            results             = await self.sendBatch([await self.signCancelAll()])
+            if not results[0]["ok"]:
+                raise Exception(results[0]["error"])
 
             end_time                = time.perf_counter()
             latency_ms              = (end_time - start_time) * 1000
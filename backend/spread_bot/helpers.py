@@ -88,7 +88,8 @@ class HELPERS:
             f"📘 Orderbook Data (Buy:Ask, Sell:Bid)\n"
             f"📌 BidPrice:{newTradeData['bidPrice']}, BidSize:{newTradeData['bidSize']}\n"
             f"📌 AskPrice:{newTradeData['askPrice']}, AskSize:{newTradeData['askSize']}\n"
-            f"📌 Spread Δ : {fmt_spread_inv(newTradeData['spread'])}\n\n"
+            f"📌 Spread Δ : {fmt_spread_inv(newTradeData['spread'])}\n"
+            f"📌 VWAP Spread Δ : {fmt_spread_inv(newTradeData.get('vwapSpread'))} (levels L/E: {newTradeData.get('obLevels', '-')})\n\n"
             
             f"📦 Inventory Before:\n"
             f"📊 Direction = {inventory['dir']}\n"
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import aiohttp
+from contextlib import asynccontextmanager
+
+logger                          = logging.getLogger("http_session")
+logger.setLevel                 (logging.INFO)
+
+class SessionRegistry:
+    """
+    Process-wide aiohttp sessions, one per purpose ("lighter", "extended",
+    "telegram", ...), each with its own keep-alive connection pool.
+
+    Use it like a throwaway session, it is just not closed on exit:
+
+        async with SESSIONS.session("lighter") as session:
+            async with session.get(url) as resp:
+                ...
+
+    A trace config counts requests, new connections and reused connections
+    per session so the reuse rate can be logged (fmtSummary()).
+    Sessions are bound to the loop that created them; a new loop gets new ones.
+    """
+    def __init__(self, limit=100, limitPerHost=20, dnsTtl=300, keepalive=30):
+        self.limit              = limit
+        self.limitPerHost       = limitPerHost
+        self.dnsTtl             = dnsTtl
+        self.keepalive          = keepalive
+        self._sessions          = {}
+        self.stats              = {}
+
+    def _traceConfig(self, name):
+        stats                   = self.stats.setdefault(name, {"requests": 0, "new_conns": 0, "reused": 0})
+
+        async def on_request_start(session, ctx, params):
+            stats["requests"]   += 1
+        async def on_connection_create_end(session, ctx, params):
+            stats["new_conns"]  += 1
+        async def on_connection_reuseconn(session, ctx, params):
+            stats["reused"]     += 1
+
+        tc                      = aiohttp.TraceConfig()
+        tc.on_request_start.append          (on_request_start)
+        tc.on_connection_create_end.append  (on_connection_create_end)
+        tc.on_connection_reuseconn.append   (on_connection_reuseconn)
+        return tc
+
+    def get(self, name="default") -> aiohttp.ClientSession:
+        loop                    = asyncio.get_running_loop()
+        entry                   = self._sessions.get(name)
+        if entry and not entry[0].closed and entry[1] is loop:
+            return entry[0]
+
+        connector               = aiohttp.TCPConnector(
+            limit               = self.limit,
+            limit_per_host      = self.limitPerHost,
+            ttl_dns_cache       = self.dnsTtl,
+            keepalive_timeout   = self.keepalive,
+        )
+        session                 = aiohttp.ClientSession(
+            connector           = connector,
+            timeout             = aiohttp.ClientTimeout(total=60, sock_connect=10),
+            trace_configs       = [self._traceConfig(name)],
+        )
+        self._sessions[name]    = (session, loop)
+        return session
+
+    @asynccontextmanager
+    async def session(self, name="default"):
+        yield self.get(name)
+
+    async def closeAll(self):
+        for name, (session, loop) in list(self._sessions.items()):
+            if not session.closed and loop is asyncio.get_running_loop():
+                await session.close()
+        self._sessions.clear    ()
+
+    def summary(self) -> dict:
+        out                     = {}
+        for name, s in self.stats.items():
+            conns               = s["new_conns"] + s["reused"]
+            out[name]           = dict(s, reuse_rate=(s["reused"] / conns) if conns else 0.0)
+        return out
+
+    def fmtSummary(self) -> str:
+        return " ".join(
+            f'{name}: req={s["requests"]} new={s["new_conns"]} reused={s["reused"]} ({s["reuse_rate"]*100:.0f}%)'
+            for name, s in self.summary().items()
+        ) or "no requests yet"
+
+# one registry per process
+SESSIONS                        = SessionRegistry()
@@ -0,0 +1,167 @@
+import io
+import os
+import csv
+import json
+
+# Helpers for the incremental p_fifo / p_cycle passes: read only what was
+# appended to a CSV since the last run, append after a frozen prefix, keep
+# merged views up to date, and checkpoint per-symbol state.
+#
+# A cursor is {"offset": bytes consumed, "tail": hex of the bytes just before
+# offset, "header": [...]}. If the file shrank or the bytes before offset
+# changed, the file was rewritten (history amended) and the caller must
+# rebuild from scratch.
+
+TAIL_BYTES                      = 64
+
+
+class Amended(Exception):
+    """The input no longer extends what the checkpoint has seen: rebuild."""
+
+
+def new_cursor():
+    return {"offset": 0, "tail": "", "header": None}
+
+
+def check_cursor(path: str, cursor: dict):
+    """Raise Amended unless path still starts with what cursor has seen."""
+    offset                      = cursor["offset"]
+    if not os.path.exists(path):
+        if offset:
+            raise Amended       (f"{path} disappeared")
+        return
+    with open(path, "rb") as f:
+        f.seek                  (0, os.SEEK_END)
+        size                    = f.tell()
+        if size < offset:
+            raise Amended       (f"{path} shrank ({size} < {offset})")
+        start                   = max(0, offset - TAIL_BYTES)
+        f.seek                  (start)
+        if f.read(offset - start).hex() != cursor["tail"]:
+            raise Amended       (f"{path} was rewritten")
+
+
+def read_appended(path: str, cursor: dict, end: int | None = None):
+    """
+    Rows appended to path since cursor (up to byte end, default EOF), as
+    dicts. Returns (rows, newCursor). Only complete lines are consumed; a
+    partially written last line is left for the next call. Raises Amended
+    when the file was rewritten.
+    """
+    cursor                      = dict(cursor or new_cursor())
+    check_cursor                (path, cursor)
+    if not os.path.exists(path):
+        return [], cursor
+
+    offset                      = cursor["offset"]
+    if end is not None and end < offset:
+        raise Amended           (f"{path} frozen part shrank ({end} < {offset})")
+    with open(path, "rb") as f:
+        f.seek                  (offset)
+        data                    = f.read() if end is None else f.read(end - offset)
+
+    stop                        = data.rfind(b"\n") + 1
+    if stop == 0:
+        return [], cursor
+    text                        = data[:stop].decode("utf-8")
+
+    if cursor["header"] is None:
+        first, _, text          = text.partition("\n")
+        cursor["header"]        = next(csv.reader([first]), [])
+    rows                        = list(csv.DictReader(io.StringIO(text), fieldnames=cursor["header"]))
+    return rows, file_cursor(path, cursor["header"], offset + stop)
+
+
+def file_cursor(path: str, header: list[str], offset: int | None = None):
+    """Cursor pointing at offset (default: the current end) of path."""
+    if offset is None:
+        offset                  = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start                   = max(0, offset - TAIL_BYTES)
+        f.seek                  (start)
+        tail                    = f.read(offset - start).hex()
+    return {"offset": offset, "tail": tail, "header": list(header)}
+
+
+def write_frozen(path: str, cursor: dict | None, header: list[str], rows: list[dict], trailer=()):
+    """
+    Append rows after the frozen part of path (up to cursor) and replace
+    whatever followed it with trailer: rows that are still changing (an open
+    cycle) live at the end and are rewritten on every call. cursor=None
+    starts the file over. Returns the cursor of the new frozen end.
+    """
+    os.makedirs                 (os.path.dirname(path), exist_ok=True)
+    if cursor is None:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.DictWriter      (f, fieldnames=header).writeheader()
+    else:
+        check_cursor            (path, cursor)
+        with open(path, "r+b") as f:
+            f.truncate          (cursor["offset"])
+
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        csv.DictWriter          (f, fieldnames=header, extrasaction="ignore").writerows(rows)
+    frozen                      = file_cursor(path, header)
+    if trailer:
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            csv.DictWriter      (f, fieldnames=header, extrasaction="ignore").writerows(trailer)
+    return frozen
+
+
+def update_merged(outPath: str, statePath: str, sources: dict, header: list[str], sortKey, trailer=()):
+    """
+    Keep outPath as the merge of several append-only sources:
+    sources = {name: (path, build, end)} where build changes whenever the
+    source is rewritten and end is its frozen size (None = whole file).
+    Only rows appended since the last call are read and appended (sorted by
+    sortKey); a rebuilt or vanished source triggers a full re-merge.
+    Returns (rows appended, rebuilt).
+    """
+    state                       = load_state(statePath) or {}
+    known                       = state.get("sources") or {}
+    cursors                     = {}
+    try:
+        if not state.get("out") or set(known) - set(sources):
+            raise Amended       ("no usable merge state")
+        fresh                   = []
+        for name, (path, build, end) in sources.items():
+            prev                = known.get(name)
+            if prev and prev["build"] != build:
+                raise Amended   (f"{name} was rebuilt")
+            rows, cur           = read_appended(path, prev["cursor"] if prev else None, end)
+            fresh.extend        (rows)
+            cursors[name]       = {"build": build, "cursor": cur}
+        if not fresh and list(trailer) == state.get("trailer"):
+            check_cursor        (outPath, state["out"])
+            return 0, False
+        fresh.sort              (key=sortKey)
+        out                     = write_frozen(outPath, state["out"], header, fresh, trailer)
+        rebuilt                 = False
+    except Amended:
+        fresh                   = []
+        for name, (path, build, end) in sources.items():
+            rows, cur           = read_appended(path, None, end)
+            fresh.extend        (rows)
+            cursors[name]       = {"build": build, "cursor": cur}
+        fresh.sort              (key=sortKey)
+        out                     = write_frozen(outPath, None, header, fresh, trailer)
+        rebuilt                 = True
+
+    save_state                  (statePath, {"sources": cursors, "out": out, "trailer": list(trailer)})
+    return len(fresh), rebuilt
+
+
+def load_state(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load    (f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_state(path: str, state: dict):
+    os.makedirs                 (os.path.dirname(path), exist_ok=True)
+    tmp                         = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump               (state, f)
+    os.replace                  (tmp, path)
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+
+# Bots publish their live state (spreads, book, inventory, funding, ...) as
+# JSON datagrams on a local Unix socket; unified_backend binds the socket
+# (LiveHub) and fans the latest state out to SSE clients. Nothing touches disk.
+#
+#   bot      : LIVE.publish("MEGA_MEGA-USD", {...})
+#   backend  : hub = LiveHub(); await hub.start(); async for data in hub.subscribe(key): ...
+
+logger                          = logging.getLogger("live_channel")
+logger.setLevel                 (logging.INFO)
+
+def socket_path():
+    return os.getenv("LIVE_SOCKET", "/tmp/arbspread_live.sock")
+
+
+class LivePublisher:
+    """
+    Fire-and-forget sender: never blocks, and drops the update when the hub
+    is not running or its buffer is full (the next update supersedes it).
+    Unchanged states are not resent.
+    """
+    def __init__(self):
+        self.sock               = None
+        self.last               = {}
+        self.stats              = {"sent": 0, "unchanged": 0, "dropped": 0}
+
+    def publish(self, key: str, state):
+        body                    = json.dumps(state, separators=(",", ":"), default=str)
+        if self.last.get(key) == body:
+            self.stats["unchanged"] += 1
+            return
+        self.last[key]          = body
+
+        if self.sock is None:
+            self.sock           = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.setblocking(False)
+        msg                     = f'{{"key":{json.dumps(key)},"ts":{time.time():.3f},"state":{body}}}'
+        try:
+            self.sock.sendto    (msg.encode(), socket_path())
+            self.stats["sent"]  += 1
+        except OSError:
+            # hub not listening (ENOENT / ECONNREFUSED) or buffer full (EAGAIN)
+            self.stats["dropped"] += 1
+            self.last.pop       (key, None)
+
+
+class LiveHub:
+    """
+    Receives bot datagrams, keeps the latest message per key and wakes the
+    subscribers of that key. Each subscriber gets at most one message per
+    minInterval (intermediate states are skipped, the newest is always sent).
+    """
+    def __init__(self):
+        self.latest             = {}
+        self._seq               = {}
+        self._changed           = {}
+        self.transport          = None
+
+    async def start(self):
+        path                    = socket_path()
+        if os.path.exists(path):
+            os.unlink           (path)
+        hub                     = self
+
+        class _Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                hub._receive    (data)
+
+        loop                    = asyncio.get_running_loop()
+        self.transport, _       = await loop.create_datagram_endpoint(
+            _Protocol, local_addr=path, family=socket.AF_UNIX
+        )
+        logger.info             (f"✅ Live hub listening on {path}")
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+    def _event(self, key):
+        ev                      = self._changed.get(key)
+        if ev is None:
+            ev                  = self._changed[key] = asyncio.Event()
+        return ev
+
+    def _receive(self, data: bytes):
+        try:
+            msg                 = json.loads(data)
+            key                 = msg["key"]
+        except Exception as e:
+            logger.warning      (f"⚠️ Bad live datagram: {e}")
+            return
+        self.latest[key]        = data.decode()
+        self._seq[key]          = self._seq.get(key, 0) + 1
+        # wake everyone waiting on this key, then arm a fresh event
+        self._event(key).set    ()
+        self._changed[key]      = asyncio.Event()
+
+    async def subscribe(self, key: str, minInterval: float = 0.25, heartbeat: float = 15.0):
+        """
+        Async generator of the latest JSON message for key, sent on change.
+        Yields None every `heartbeat` seconds without change (for SSE keep-alive).
+        """
+        seen                    = 0
+        lastSent                = 0.0
+        while True:
+            if self._seq.get(key, 0) == seen:
+                try:
+                    await asyncio.wait_for(self._event(key).wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+
+            wait                = lastSent + minInterval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            seen                = self._seq.get(key, 0)
+            lastSent            = time.monotonic()
+            yield self.latest.get(key)
+
+
+# one publisher per bot process
+LIVE                            = LivePublisher()
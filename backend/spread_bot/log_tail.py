@@ -0,0 +1,82 @@
+import os
+import re
+import csv
+
+# a new log record starts with the asctime of LOG_FORMAT ("2025-01-31 12:00:00,123 ...");
+# anything else (tracebacks, multi-line messages) continues the record above it
+RECORD_START                    = re.compile(rb"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+
+def _reverse_lines(path, blockSize=8192):
+    """Yield the lines of path last to first, reading backwards by blocks."""
+    with open(path, "rb") as f:
+        f.seek                  (0, os.SEEK_END)
+        pos                     = f.tell()
+        rest                    = b""
+        atEnd                   = True
+        while pos > 0:
+            step                = min(blockSize, pos)
+            pos                 -= step
+            f.seek              (pos)
+            parts               = (f.read(step) + rest).split(b"\n")
+            rest                = parts[0]          # may be a partial line: wait for the next block
+            for line in reversed(parts[1:]):
+                if atEnd and not line:
+                    atEnd       = False             # trailing newline of the file
+                    continue
+                atEnd           = False
+                yield line
+        if rest:
+            yield rest
+
+
+def tail_lines(path, n=100, blockSize=8192, followRotated=True):
+    """
+    Last n lines of an append-only log, newest record first.
+
+    Only the tail blocks are read, so the cost depends on n, not on the file
+    size. Multi-line records (tracebacks) keep their internal order. When the
+    current file is shorter than n lines, the rotated path.1 is read next.
+    """
+    out                         = []
+    paths                       = [path, f"{path}.1"] if followRotated else [path]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        pending                 = []
+        for line in _reverse_lines(p, blockSize):
+            if RECORD_START.match(line):
+                out.append      (line)
+                out.extend      (reversed(pending))
+                pending         = []
+                if len(out) >= n:
+                    break
+            else:
+                pending.append  (line)
+        else:
+            out.extend          (reversed(pending))
+        if len(out) >= n:
+            break
+    return [line.decode("utf-8", errors="replace") for line in out[:n]]
+
+
+def tail_csv(path, n=200, blockSize=8192):
+    """
+    Last n data rows of an append-only CSV as dicts, newest (last written)
+    first. Reads only the tail blocks plus the header line.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        header                  = next(csv.reader(f), None)
+    if not header:
+        return []
+    out                         = []
+    for line in _reverse_lines(path, blockSize):
+        if len(out) >= n:
+            break
+        row                     = next(csv.reader([line.decode("utf-8", errors="replace").rstrip("\r")]), None)
+        if not row or row == header:
+            continue
+        out.append              (dict(zip(header, row)))
+    return out
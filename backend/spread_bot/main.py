@@ -1,62 +1,58 @@
 import sys, time
 import asyncio
 import logging
+import logging.handlers
 import os
 from dotenv import load_dotenv
 from helpers import HELPERS
-from helper_lighter import LighterAPI
+from helper_lighter import LighterAPI, TX_BATCH
 from helper_extended import ExtendedAPI
-from telegram_api import send_telegram_message, send_tele_crit
+from book_signal import BookSignal
+from sizing import calc_vwap_qty
+from http_session import SESSIONS
+from telegram_api import send_telegram_message, send_tele_crit, TELEGRAM
+from live_channel import LIVE
+from order_tracker import wait_legs, wire_delta_ms
+from presign import Presigner
+from sign_pool import SIGNERS
 import json
 import subprocess
-import threading
 
-_live_lock = threading.Lock()
-
-def update_live(symbolL, symbolE, text):
-    """Keep only the latest live line for this symbol, formatted with newlines."""
-    os.makedirs("spread_bot/logs", exist_ok=True)
-    live_path = f"spread_bot/logs/{symbolL}_{symbolE}_live.txt"
-
-    # Replace "|" with a newline for clearer formatting
-    formatted = text.strip().replace("|", "\n")
-
-    with _live_lock:
-        with open(live_path, "w", encoding="utf-8") as f:
-            f.write(formatted + "\n")
+def update_live(symbolL, symbolE, state):
+    """Publish the latest live state of this pair to the backend (no disk I/O)."""
+    LIVE.publish(f"{symbolL}_{symbolE}", state)
 
 def clear_live(symbolL, symbolE):
-    """Clear the live log file for this symbol pair."""
-    
-    os.makedirs("spread_bot/logs", exist_ok=True)
-    live_path = f"spread_bot/logs/{symbolL}_{symbolE}_live.txt"
-
-    with _live_lock:
-        # Overwrite the file with an empty string
-        with open(live_path, "w", encoding="utf-8") as f:
-            f.write("--")  # or just `pass` if you want truly empty file
-
-class ReverseFileHandler(logging.FileHandler):
-    """Custom handler that writes newest logs at the top of the file."""
-    def emit(self, record):
-        msg = self.format(record)
-        try:
-            # Read old content (if exists)
-            if os.path.exists(self.baseFilename):
-                with open(self.baseFilename, "r", encoding="utf-8") as f:
-                    old = f.read()
-            else:
-                old = ""
-            # Write new message first, then the old logs
-            with open(self.baseFilename, "w", encoding="utf-8") as f:
-                f.write(msg + "\n" + old)
-        except Exception:
-            self.handleError(record)
-
-def setup_logger(symbolL, symbolE):
+    """Reset the live view of this pair while the bot starts."""
+    LIVE.publish(f"{symbolL}_{symbolE}", {"status": "starting"})
+
+LOG_FORMAT          = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+LOG_MAX_BYTES       = 10 * 1024 * 1024
+LOG_BACKUP_COUNT    = 3
+
+def _retire_reversed_log(log_path):
+    """Logs used to be written newest-first; move such a file aside instead of appending to it."""
+    if not os.path.exists(log_path) or os.path.getsize(log_path) == 0:
+        return
+    with open(log_path, "rb") as f:
+        first = f.readline()[:19]
+        f.seek(max(0, os.path.getsize(log_path) - 4096))
+        last = f.read().rstrip(b"\n").rsplit(b"\n", 1)[-1][:19]
+    if first[:4].isdigit() and last[:4].isdigit() and first > last:
+        os.replace(log_path, f"{log_path}.legacy")
+
+def make_log_handler(symbolL, symbolE):
+    """Append-only rotating log; the panel reads it newest-first via log_tail.tail_lines."""
     os.makedirs("spread_bot/logs", exist_ok=True)
     log_path = f"spread_bot/logs/{symbolL}_{symbolE}.log"
+    _retire_reversed_log(log_path)
+    handler = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
 
+def setup_logger(symbolL, symbolE):
     # Remove existing handlers
     for h in logging.root.handlers[:]:
         logging.root.removeHandler(h)
@@ -64,18 +60,26 @@ def setup_logger(symbolL, symbolE):
     # Configure logger
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        format=LOG_FORMAT,
         handlers=[
-            ReverseFileHandler(log_path),
+            make_log_handler(symbolL, symbolE),
             logging.StreamHandler(sys.stdout)
         ]
     )
 
-    
+
+class PairRestart(Exception):
+    """Raised instead of re-exec'ing when the pair is hosted by supervisor.py."""
+
+SUPERVISED                  = False
+
 async def restart_bot(symbolL, symbolE, reason):
     logging.info(f"🔁 Restarting bot for {symbolL}_{symbolE}...", )
     await send_telegram_message(f"⚠️ Restarting bot for symbol {symbolL}_{symbolE}... Reason: {reason}")
     await asyncio.sleep(1)
+    if SUPERVISED:
+        raise PairRestart(reason)
+    await TELEGRAM.flush(timeout=5)
     os.execv(sys.executable, ['python3'] + sys.argv)
 
 # Load config.json
@@ -95,48 +99,149 @@ def calc_spreads(L, E):
     spreadEL                    = (lbid - eask) / eask * 100 if lbid and eask else None
     return spreadLE, spreadEL
 
+def calc_depth_qty(buyApi, sellApi, minSpread, maxQty, percOfOb, depth):
+    """
+    Walk `depth` levels of buyApi asks / sellApi bids, see sizing.calc_vwap_qty.
+    qty is 0 when not even the top slice beats minSpread (the spread sits right
+    at the threshold): the caller trades nothing on this tick.
+    """
+    sized                       = calc_vwap_qty(
+        buyApi.book.levels(False, depth),
+        sellApi.book.levels(True, depth),
+        minSpread, maxQty, percOfOb,
+    )
+    return sized
+
 def calc_inv(L, E):
     l_qty, l_entry              = L.accountData["qty"], L.accountData["entry_price"]
     e_qty, e_entry              = E.accountData["qty"], E.accountData["entry_price"]
     return l_qty, e_qty, l_entry, e_entry
 
-async def execute_trade(L, E, sideL, sideE, qty, tradeData, TRADES_INTERVAL):
+async def prepare_presigned(presigner, L, E, l_qty, e_qty, spreadLE, spreadEL, spreadInv, minSpread_toEntry, margin, cfg):
+    """
+    Direction LE buys L / sells E, EL the reverse. Against an open inventory a
+    direction is the (reduce-only) exit, otherwise the entry; it is sized as
+    the trade branches of run_pair would size it at the current book, and
+    signed while its spread is within `margin` of the trigger.
+    """
+    percOfOb                    = cfg["PERC_OF_OB"] / 100
+    depth                       = int(cfg.get("OB_DEPTH", 1))
+    for direction, spread, buyApi, sellApi, exitFrom in (
+        ("LE", spreadLE, L, E, l_qty < 0 and e_qty > 0),
+        ("EL", spreadEL, E, L, l_qty > 0 and e_qty < 0),
+    ):
+        entryOk                 = (l_qty >= 0 and e_qty <= 0) if direction == "LE" else (l_qty <= 0 and e_qty >= 0)
+        if exitFrom:
+            trigger, maxValue   = cfg["SPREAD_TP"] - spreadInv, cfg["MAX_TRADE_VALUE_EXIT"]
+        elif entryOk:
+            trigger, maxValue   = minSpread_toEntry, cfg["MAX_TRADE_VALUE_ENTRY"]
+        else:
+            presigner.drop      (direction)
+            continue
+        if spread < trigger - margin:
+            presigner.drop      (direction)
+            continue
+
+        askPrice                = buyApi.ob["askPrice"]
+        sized                   = calc_depth_qty(buyApi, sellApi, trigger, maxValue/askPrice, percOfOb, depth)
+        if sized["qty"] <= 0:
+            presigner.drop      (direction)
+            continue
+        qty                     = HELPERS.extGetAllowedNum(sized["qty"], E.pair["min_size_change"])
+        if exitFrom and (abs(l_qty) - qty) * askPrice < cfg["MIN_TRADE_VALUE"]:
+            qty                 = abs(l_qty)
+        if not qty or qty * askPrice <= cfg["MIN_TRADE_VALUE"]:
+            presigner.drop      (direction)
+            continue
+
+        worstBuy, worstSell     = sized["worstBuy"], sized["worstSell"]
+        if direction == "LE":
+            await presigner.prepare("LE", "BUY", "SELL", qty, exitFrom, worstBuy, worstSell)
+        else:
+            await presigner.prepare("EL", "SELL", "BUY", qty, exitFrom, worstSell, worstBuy)
+
+async def settle_leg(api, leg, qtyBef, grace=1.0):
+    """
+    Position after a leg. A confirmed fill waits (briefly) for the position on
+    the same stream, an unconfirmed leg goes straight to REST, nothing filled
+    means nothing to wait for.
+    """
+    if leg.done.is_set() and not leg.filled:
+        return
+    await api.waitPos           (qtyBef, timeout=grace if leg.done.is_set() else 0)
+
+async def execute_trade(L, E, sideL, sideE, qty, tradeData, fillTimeout, presigner=None):
+    """
+    Both legs at once; returns as soon as the account streams confirm them (or
+    after fillTimeout). Legs the presigner holds signed for exactly this trade
+    go out as they are.
+    """
     label                       = tradeData["direction"]
     logging.info                (f"✅ {label}: qty={qty}")
     L_AllSymInvValueBef         = L.invValue
-    logL, logE = await asyncio.gather(
-        L.placeMarketOrder(sideL, qty, label.startswith("Exit")),
-        E.placeMarketOrder(sideE, qty, label.startswith("Exit"))
-    )
-    await asyncio.sleep         (TRADES_INTERVAL)
+    l_qty_bef, e_qty_bef        = L.accountData["qty"], E.accountData["qty"]
     msg                         = await HELPERS.initInfo(L, E, tradeData, L_AllSymInvValueBef)
-    await asyncio.gather        (L.loadPos(), E.loadPos())
-    await asyncio.sleep         (1)
+    isExit                      = label.startswith("Exit")
+    worstL, worstE              = tradeData.get("worstPriceL"), tradeData.get("worstPriceE")
+    pL = pE                     = None
+    if presigner:
+        presigner.cancel        ()
+        direction               = "LE" if sideL == "BUY" else "EL"
+        pL                      = presigner.take(L, direction, sideL, qty, isExit, worstL)
+        pE                      = presigner.take(E, direction, sideE, qty, isExit, worstE)
+    legL                        = L.orders.expect(pL.clientId if pL else None)
+    legE                        = E.orders.expect(pE.clientId if pE else None)
+    try:
+        logL, logE = await asyncio.gather(
+            L.placeMarketOrder(sideL, qty, isExit, worstPrice=worstL, leg=legL, presigned=pL),
+            E.placeMarketOrder(sideE, qty, isExit, worstPrice=worstE, leg=legE, presigned=pE)
+        )
+        if not await wait_legs([legL, legE], fillTimeout):
+            logging.warning     (f"⚠️ {label}: fills not confirmed within {fillTimeout}s (L {legL.status}, E {legE.status}), checking REST")
+        await asyncio.gather    (settle_leg(L, legL, l_qty_bef), settle_leg(E, legE, e_qty_bef))
+    finally:
+        L.orders.forget         (legL)
+        E.orders.forget         (legE)
+        if presigner:
+            # inventory changed (and the Lighter nonce moved on)
+            presigner.invalidate()
+    logL, logE                  = f"{logL}{legL.summary()}\n", f"{logE}{legE.summary()}\n"
+    delta                       = wire_delta_ms([legL, legE])
+    if delta is not None:
+        # both requests signed off the loop: they should leave within a fraction of a ms
+        logE                    += f"• Legs on the wire Δ {delta:.2f} ms\n"
+        logging.info            (f"⏱ {label}: legs on the wire Δ {delta:.2f} ms")
     L_AllSymInvValueAft         = L.invValue
     await HELPERS.sendInfo      (msg, L, E, L_AllSymInvValueAft, logL, logE)
-    logging.info                (f"{label} Done ✅")
+    logging.info                (f"{label} Done ✅ (L {legL.summary()} / E {legE.summary()})")
 
 
 # ---------------------
-_need_balancing             = False
-_ts_since_need_balancing    = 0.0
-_ts_since_last_action       = 0.0
-_need_report_unbalanced     = False
-_reducing_msg               = ''
+# balancing state, one entry per Lighter symbol (several pairs can share a process)
+_balance_state              = {}
+
+def _new_balance_state():
+    return {
+        "need_balancing"            : False,
+        "ts_since_need_balancing"   : 0.0,
+        "ts_since_last_action"      : 0.0,
+        "need_report_unbalanced"    : False,
+        "reducing_msg"              : '',
+    }
 
 async def balance_positions(L, E):
     """
     Returns True if balanced, False otherwise.
     """
-    global _need_balancing, _ts_since_need_balancing, _ts_since_last_action, _need_report_unbalanced, _reducing_msg
+    st                  = _balance_state.setdefault(L.pair["symbol"], _new_balance_state())
     now                 = time.time()
     l_qty, e_qty, _, _  = calc_inv(L, E)
     net                 = l_qty + e_qty
 
     # already balanced
     if abs(net) < 1e-8:
-        if _need_balancing:
-            _need_balancing = False
+        if st["need_balancing"]:
+            st["need_balancing"] = False
             await send_tele_crit(
                 f'✅ {L.pair["symbol"]} balanced again\n'
                 f'L: {L.accountData["qty"]}  E: {E.accountData["qty"]}\n'
@@ -145,14 +250,14 @@ async def balance_positions(L, E):
         return True
 
     # first detection : this will be executed if only not balanced
-    if not _need_balancing:
-        _need_balancing             = True
-        _ts_since_need_balancing    = now
+    if not st["need_balancing"]:
+        st["need_balancing"]             = True
+        st["ts_since_need_balancing"]    = now
         logging.info                (f'⚠️ {L.pair["symbol"]} is UNBALANCED')
         return False 
 
     # cooldown: 60s since flagged, 60s since last action
-    if (now - _ts_since_need_balancing >= 60.0) and (now - _ts_since_last_action >= 60.0):
+    if (now - st["ts_since_need_balancing"] >= 60.0) and (now - st["ts_since_last_action"] >= 60.0):
         qty_need                    = abs(net)
         target                      = "L" if abs(l_qty) >= abs(e_qty) else "E"
 
@@ -168,12 +273,13 @@ async def balance_positions(L, E):
 
             side = "SELL" if l_qty > 0 else "BUY"
             try:
-                await asyncio.gather        (L.cancelOrders(), E.cancelOrders())
-                await L.placeMarketOrder    (side, float(qty_need), True)
+                # cancel-all + reduce-only order in one Lighter request
+                await asyncio.gather        (L.cancelAllAndPlaceMarketOrder(side, float(qty_need), True), E.cancelOrders())
                 logging.info                (f'🟠 Rebalance L: {side} {qty_need:.8f}')
-                _ts_since_last_action       = now
-                _need_report_unbalanced     = True
-                _reducing_msg               = f'✅ Reduced {qty_need:.8f} on Lighter'
+                await L.waitPos             (l_qty)
+                st["ts_since_last_action"]       = now
+                st["need_report_unbalanced"]     = True
+                st["reducing_msg"]               = f'✅ Reduced {qty_need:.8f} on Lighter'
             except Exception as e:
                 logging.error(f'bal L error: {e}')
                 await send_tele_crit(f'❌ bal L error: {e}')
@@ -193,34 +299,31 @@ async def balance_positions(L, E):
                 await asyncio.gather        (L.cancelOrders(), E.cancelOrders())
                 await E.placeMarketOrder(side, float(qty_need), True)
                 logging.info                (f'🔵 Rebalance E: {side} {qty_need:.8f}' )
-                _ts_since_last_action       = now
-                _need_report_unbalanced     = True
-                _reducing_msg               = f'✅ Reduced {qty_need:.8f} on Extended'
+                await E.waitPos             (e_qty)
+                st["ts_since_last_action"]       = now
+                st["need_report_unbalanced"]     = True
+                st["reducing_msg"]               = f'✅ Reduced {qty_need:.8f} on Extended'
             except Exception as e:
                 logging.error(f'bal E error: {e}')
                 await send_tele_crit(f'❌ bal E error: {e}')
 
-        # recheck after the nudge
-        await asyncio.sleep(1)
-        await asyncio.gather(L.loadPos(), E.loadPos())
-
     # while flagged, keep reporting unbalanced to the caller
-    await asyncio.gather            (L.loadPos(), E.loadPos())
+    # (accountData is kept live by the account streams)
     l2, e2, _, _                    = calc_inv(L, E)
     if abs(l2 + e2) < 1e-8:
-        _need_balancing             = False
+        st["need_balancing"]             = False
         logging.info                (f'✅ {L.pair["symbol"]} balanced again')
-        if not _need_report_unbalanced:
+        if not st["need_report_unbalanced"]:
             await send_tele_crit    (f'⚠️ {L.pair["symbol"]} Order Fills Delayed')
         else:
             await send_tele_crit    (
                 f'✅ Canceled All Open Orders\n'
-                f'{_reducing_msg}\n'
+                f'{st["reducing_msg"]}\n'
                 f'✅ {L.pair["symbol"]} is balanced again\n'
                 f'it was not balanced since 60s ago\n'
                 f'Current Inv [L: {L.accountData["qty"]}, E: {E.accountData["qty"]}]\n'
             )
-            _need_report_unbalanced = False
+            st["need_report_unbalanced"] = False
         return True
     return False
 
@@ -234,29 +337,13 @@ async def balance_positions(L, E):
 
 
     
-def fmt_rate(a, b):
-    if a is None or b is None:
-        return "N/A"
-    return f"{b - a:.6f}%"
-
-def fmt_funding(rate):
-    if rate is None:
-        return "N/A"
-    try:
-        return f"{float(rate):.6f}%"
-    except (ValueError, TypeError):
-        return "N/A"
-
-
-def printInfos(L, E, minSpread_toEntry):
-    lbid, lszb, lask, lsza  = L.ob["bidPrice"], L.ob["bidSize"], L.ob["askPrice"], L.ob["askSize"]
-    ebid, eszb, eask, esza  = E.ob["bidPrice"], E.ob["bidSize"], E.ob["askPrice"], E.ob["askSize"]
+def printInfos(L, E, minSpread_toEntry, cfg):
+    lbid, lask              = L.ob["bidPrice"], L.ob["askPrice"]
+    ebid, eask              = E.ob["bidPrice"], E.ob["askPrice"]
         
     l_qty, l_entry_price    = L .accountData["qty"], L .accountData["entry_price"]
     e_qty, e_entry_price    = E.accountData["qty"], E.accountData["entry_price"]
 
-    invQty                  = abs(l_qty) if l_qty else 0
-
     spreadInv               = 0 
     if   l_qty>0 and e_qty<0:
         spreadInv           = (e_entry_price-l_entry_price)/l_entry_price*100 if l_entry_price not in [None, 0] else None
@@ -265,17 +352,10 @@ def printInfos(L, E, minSpread_toEntry):
 
     dir                     = 'LE' if l_qty > 0 and e_qty < 0 else ('EL' if l_qty < 0 and e_qty > 0 else '')
 
-    TRADES_INTERVAL         = cfg["TRADES_INTERVAL"]
     MIN_SPREAD              = cfg["MIN_SPREAD"]
     SPREAD_MULTIPLIER       = cfg["SPREAD_MULTIPLIER"]
-    SPREAD_TP               = cfg["SPREAD_TP"]
-    MIN_TRADE_VALUE         = cfg["MIN_TRADE_VALUE"]
-    MAX_TRADE_VALUE_ENTRY   = cfg["MAX_TRADE_VALUE_ENTRY"]
-    MAX_TRADE_VALUE_EXIT    = cfg["MAX_TRADE_VALUE_EXIT"]
     MAX_INVENTORY_VALUE     = cfg["MAX_INVENTORY_VALUE"]
-    SPREAD_MULTIPLIER       = cfg["SPREAD_MULTIPLIER"]
     INV_LEVEL_TO_MULT       = cfg["INV_LEVEL_TO_MULT"]
-    PERC_OF_OB              = cfg["PERC_OF_OB"] / 100
 
     spreadLE_TT             = (ebid - lask) / lask * 100 if ebid and lask else None
     spreadLE_TM             = (eask - lask) / lask * 100 if ebid and lask else None
@@ -285,66 +365,58 @@ def printInfos(L, E, minSpread_toEntry):
     spreadEL_TM             = (lask - eask) / eask * 100 if lbid and eask else None  
     spreadEL_MT             = (lbid - ebid) / lbid * 100 if lbid and eask else None
 
-    # --- inventory levels table ---
-    levels_text = ""
+    # --- inventory levels table (value $, min spread %) ---
+    levels                  = None
     if MAX_INVENTORY_VALUE > 0 and INV_LEVEL_TO_MULT > 0:
         INV_STEP_VALUE      = MAX_INVENTORY_VALUE / INV_LEVEL_TO_MULT
-        levels_text         += "\n---\nSpread Averaging\nValue($) MinSpread(%)"
-        for i in range(INV_LEVEL_TO_MULT):
-            vol             = (i) * INV_STEP_VALUE
-            spread          = MIN_SPREAD * (SPREAD_MULTIPLIER ** i)
-            levels_text     += f"\n{vol:>7.0f} {spread:.2f}"
-    else:
-        levels_text         = "\n---\nBot isn't Looking for Entry"
-
-    line = (
-        f"---"
-        f'|L:{L.pair["symbol"]} E:{E.pair["symbol"]}'
-        f"|---"
-        f"|Orderbook Data"
-        f"|SpreadLE : [TT:{spreadLE_TT:.2f}%] [TM:{spreadLE_TM:.2f}%] [MT:{spreadLE_MT:.2f}%]"
-        f"|SpreadEL : [TT:{spreadEL_TT:.2f}%] [TM:{spreadEL_TM:.2f}%] [MT:{spreadEL_MT:.2f}%]"
-        f"|L        : {L.ob}"
-        f"|E        : {E.ob}"
-        f"|---"
-        f"|Funding Rate"
-        f"|Lighter  : {fmt_funding(L.currFundRate)}"
-        f"|Extended : {fmt_funding(E.currFundRate)}"
-        f"|Net LE   : {fmt_rate(L.currFundRate, E.currFundRate)}"
-        f"|Net EL   : {fmt_rate(E.currFundRate, L.currFundRate)}"
-        f"|---"
-        f"|Inventory"
-        f"|Δ        : {spreadInv:.2f}%"
-        f"|Dir      : {dir}"
-        f"|qtyL     : {l_qty} @ {l_entry_price} / ${(l_qty*l_entry_price):.2f}"
-        f"|qtyE     : {e_qty} @ {e_entry_price} / ${(e_qty*e_entry_price):.2f}"
-        f"{levels_text}"
-        f"|---"
-        f"|Configs"
-        f"|TRADES_INTERVAL       : {TRADES_INTERVAL}s"
-        f"|MIN_SPREAD            : {MIN_SPREAD}%"
-        f"|SPREAD_MULTIPLIER     : {SPREAD_MULTIPLIER}"
-        f"|SPREAD_TP             : {SPREAD_TP}%"
-        f"|MIN_TRADE_VALUE       : ${MIN_TRADE_VALUE}"
-        f"|MAX_TRADE_VALUE_ENTRY : ${MAX_TRADE_VALUE_ENTRY}"
-        f"|MAX_TRADE_VALUE_EXIT  : ${MAX_TRADE_VALUE_EXIT}"
-        f"|MAX_INVENTORY_VALUE   : ${MAX_INVENTORY_VALUE}"
-        f"|INV_LEVEL_TO_MULT     : {INV_LEVEL_TO_MULT}"
-        f"|PERC_OF_OB            : {PERC_OF_OB*100}%"
-        f"|---"
-        f"|DEX Configs"
-        f'|Lighter               : min_size [{L.pair["min_size"]}], min_value [{L.pair["min_value"]}]'
-        f'|Extended              : min_size [{E.pair["min_size"]}]'
-        
-        )
-
-    update_live(L.pair["symbol"], E.pair["symbol"], line)
+        levels              = [[i * INV_STEP_VALUE, MIN_SPREAD * (SPREAD_MULTIPLIER ** i)] for i in range(INV_LEVEL_TO_MULT)]
+
+    state = {
+        "pair"              : {"L": L.pair["symbol"], "E": E.pair["symbol"]},
+        "spreads"           : {
+            "LE"            : {"TT": spreadLE_TT, "TM": spreadLE_TM, "MT": spreadLE_MT},
+            "EL"            : {"TT": spreadEL_TT, "TM": spreadEL_TM, "MT": spreadEL_MT},
+        },
+        "minSpreadToEntry"  : minSpread_toEntry,
+        "book"              : {"L": L.ob, "E": E.ob},
+        "funding"           : {"L": L.currFundRate, "E": E.currFundRate},
+        "inventory"         : {
+            "spread"        : spreadInv,
+            "dir"           : dir,
+            "L"             : {"qty": l_qty, "entry": l_entry_price},
+            "E"             : {"qty": e_qty, "entry": e_entry_price},
+        },
+        "levels"            : levels,
+        "config"            : {k: cfg.get(k) for k in (
+            "TRADES_INTERVAL", "MIN_SPREAD", "SPREAD_MULTIPLIER", "SPREAD_TP", "MIN_TRADE_VALUE",
+            "MAX_TRADE_VALUE_ENTRY", "MAX_TRADE_VALUE_EXIT", "MAX_INVENTORY_VALUE", "INV_LEVEL_TO_MULT", "PERC_OF_OB",
+        )},
+        "dex"               : {
+            "L"             : {"min_size": L.pair["min_size"], "min_value": L.pair["min_value"]},
+            "E"             : {"min_size": E.pair["min_size"]},
+        },
+        "latency"           : L.obSignal.summary() if L.obSignal else None,
+    }
+
+    update_live(L.pair["symbol"], E.pair["symbol"], state)
 
 # --- Main Trading Loop ---
-async def main(symbolL, symbolE, cfg):
+async def main(symbolL, symbolE, cfg, shared=False):
+    """
+    Run one pair until it stops. shared=True (supervisor.py) reuses the
+    process-wide Lighter signer and Extended clients.
+    """
     clear_live(symbolL, symbolE)
+    logging.info                (f"🚀 Starting Bot for {symbolL}_{symbolE} ...")
+
+    L, E                        = LighterAPI(symbolL), ExtendedAPI(symbolE)
+    try:
+        await run_pair(L, E, symbolL, symbolE, cfg, shared)
+    finally:
+        await asyncio.gather(L.close(), E.close())
 
-    TRADES_INTERVAL             = cfg["TRADES_INTERVAL"]
+async def run_pair(L, E, symbolL, symbolE, cfg, shared):
+    TRADES_INTERVAL             = cfg["TRADES_INTERVAL"]        # longest wait for fill confirmation
     MIN_SPREAD                  = cfg["MIN_SPREAD"]
     SPREAD_MULTIPLIER           = cfg["SPREAD_MULTIPLIER"]
     SPREAD_TP                   = cfg["SPREAD_TP"]
@@ -354,11 +426,12 @@ async def main(symbolL, symbolE, cfg):
     MAX_INVENTORY_VALUE         = cfg["MAX_INVENTORY_VALUE"]
     INV_LEVEL_TO_MULT           = cfg["INV_LEVEL_TO_MULT"]
     PERC_OF_OB                  = cfg["PERC_OF_OB"] / 100
+    EVENT_DRIVEN                = cfg.get("EVENT_DRIVEN", True)
+    OB_DEPTH                    = int(cfg.get("OB_DEPTH", 1))
+    POS_RECONCILE_SEC           = cfg.get("POS_RECONCILE_SEC", 30)
+    PRESIGN_MARGIN              = cfg.get("PRESIGN_MARGIN", 0.1)        # % from a trigger to keep its orders signed (0 = off)
 
-    logging.info                (f"🚀 Starting Bot for {symbolL}_{symbolE} ...")
-
-    L, E                        = LighterAPI(symbolL), ExtendedAPI(symbolE)
-    await asyncio.gather(L.init(), E.init())
+    await asyncio.gather(L.init(shared), E.init(shared))
     await asyncio.gather(L.initPair(), E.initPair())
     logging.info                ("✅ Both Exchange Initial is Done.")
     
@@ -373,17 +446,37 @@ async def main(symbolL, symbolE, cfg):
             ready.set()
             
     ws_flags                    = {"l_ob": False, "l_acc": False, "e_ob": False}
+
+    # Both handlers signal the same BookSignal; in EVENT_DRIVEN mode the loop
+    # wakes on it instead of polling every 100ms
+    obSignal                    = BookSignal()
+    L.obSignal                  = obSignal
+    E.obSignal                  = obSignal
+
+    async def waitNextTick():
+        if EVENT_DRIVEN:
+            await obSignal.wait(timeout=1.0)
+        else:
+            await asyncio.sleep(0.1)
+            obSignal.poll()
+
+    last_print_ts               = 0.0
+    last_latency_log_ts         = time.time()
+
     asyncio.create_task         (L.startWs(wsCallback=ws_callback))
     asyncio.create_task         (L.startWsFunding())
-    asyncio.create_task         (E.startWs(wsCallback=ws_callback))
+    asyncio.create_task         (E.startWs(wsCallback=ws_callback, depth=OB_DEPTH))
     await ready.wait            ()
-    logging.info                ("✅ All WebSockets connected.")
+    L.startPosReconcile         (POS_RECONCILE_SEC)
+    E.startPosReconcile         (POS_RECONCILE_SEC)
+    presigner                   = Presigner(L, E) if PRESIGN_MARGIN > 0 else None
+    logging.info                (f"✅ All WebSockets connected. (mode: {'event-driven' if EVENT_DRIVEN else 'polling 100ms'})")
 
     # CheckSpreadLoop
     while True:
         spreadLE, spreadEL              = calc_spreads(L, E)
         if spreadLE is None or spreadEL is None:
-            await asyncio.sleep(0.1)
+            await waitNextTick()
             continue
 
         l_qty, e_qty, l_entry, e_entry  = calc_inv(L, E)
@@ -411,7 +504,19 @@ async def main(symbolL, symbolE, cfg):
 
 
         # minSpread_toEntry     = max(MIN_SPREAD, spreadInv*SPREAD_MULTIPLIER)
-        printInfos(L, E, minSpread_toEntry)
+        now                     = time.time()
+        if now - last_print_ts >= 0.1:
+            printInfos(L, E, minSpread_toEntry, cfg)
+            last_print_ts       = now
+        if now - last_latency_log_ts >= 60:
+            logging.info        (f"⏱ WS→Decision {obSignal.fmtSummary()}")
+            logging.info        (f"🌐 HTTP {SESSIONS.fmtSummary()}")
+            logging.info        (f"✍️ Signing {SIGNERS.fmtSummary()}")
+            logging.info        (f"🔢 Nonces {L.nonces.fmtSummary()}")
+            logging.info        (f"📦 Lighter txs {TX_BATCH.fmtSummary()}")
+            if presigner:
+                logging.info    (f"✍️ {presigner.fmtSummary()}")
+            last_latency_log_ts = now
 
 
         # Balance check
@@ -440,13 +545,18 @@ async def main(symbolL, symbolE, cfg):
         # --- EXIT ---
         exitCond_fromLE         = l_qty > 0 and e_qty < 0 and spreadInv+spreadEL > SPREAD_TP
         exitCond_fromEL         = l_qty < 0 and e_qty > 0 and spreadInv+spreadLE > SPREAD_TP
+        obSignal.markDecision   ()
 
 
 
         # --- TRADE EXECUTION ---
         if exitCond_fromLE:
-            qty                 = min(E.ob["askSize"]*PERC_OF_OB, L.ob["bidSize"]*PERC_OF_OB, MAX_TRADE_VALUE_EXIT/E.ob["askPrice"])
-            qty                 = HELPERS.extGetAllowedNum(qty, E.pair["min_size_change"])
+            sized               = calc_depth_qty(E, L, SPREAD_TP - spreadInv, MAX_TRADE_VALUE_EXIT/E.ob["askPrice"], PERC_OF_OB, OB_DEPTH)
+            if sized["qty"] <= 0:
+                logging.info    ('[exitCond_fromLE] no book slice beats the threshold, skipping this tick')
+                await waitNextTick()
+                continue
+            qty                 = HELPERS.extGetAllowedNum(sized["qty"], E.pair["min_size_change"])
             qtyInv              = abs(l_qty)
             remaining_value     = (qtyInv - qty) * E.ob["askPrice"]
 
@@ -480,9 +590,12 @@ async def main(symbolL, symbolE, cfg):
                     "askSize"   : E.ob["askSize"],
                     "bidPrice"  : L.ob["bidPrice"],
                     "bidSize"   : L.ob["bidSize"],
+                    "vwapSpread": sized["vwapSpread"],
+                    "obLevels"  : sized["levels"],
+                    "worstPriceL": sized["worstSell"],
+                    "worstPriceE": sized["worstBuy"],
                 }
-                await execute_trade(L, E, "SELL", "BUY", qty, newTradeData, TRADES_INTERVAL)
-                await asyncio.sleep(TRADES_INTERVAL)
+                await execute_trade(L, E, "SELL", "BUY", qty, newTradeData, TRADES_INTERVAL, presigner)
                 continue
 
             if not qty or qty <= 0:
@@ -492,8 +605,12 @@ async def main(symbolL, symbolE, cfg):
 
 
         if exitCond_fromEL:
-            qty                 = min(L.ob["askSize"]*PERC_OF_OB, E.ob["bidSize"]*PERC_OF_OB, MAX_TRADE_VALUE_EXIT/L.ob["askPrice"])
-            qty                 = HELPERS.extGetAllowedNum(qty, E.pair["min_size_change"])
+            sized               = calc_depth_qty(L, E, SPREAD_TP - spreadInv, MAX_TRADE_VALUE_EXIT/L.ob["askPrice"], PERC_OF_OB, OB_DEPTH)
+            if sized["qty"] <= 0:
+                logging.info    ('[exitCond_fromEL] no book slice beats the threshold, skipping this tick')
+                await waitNextTick()
+                continue
+            qty                 = HELPERS.extGetAllowedNum(sized["qty"], E.pair["min_size_change"])
             qtyInv              = abs(l_qty)
             remaining_value     = (qtyInv - qty) * L.ob["askPrice"]
 
@@ -527,8 +644,12 @@ async def main(symbolL, symbolE, cfg):
                     "askSize"   : L.ob["askSize"],
                     "bidPrice"  : E.ob["bidPrice"],
                     "bidSize"   : E.ob["bidSize"],
+                    "vwapSpread": sized["vwapSpread"],
+                    "obLevels"  : sized["levels"],
+                    "worstPriceL": sized["worstBuy"],
+                    "worstPriceE": sized["worstSell"],
                 }
-                await execute_trade(L, E, "BUY", "SELL", qty, newTradeData, TRADES_INTERVAL)
+                await execute_trade(L, E, "BUY", "SELL", qty, newTradeData, TRADES_INTERVAL, presigner)
                 continue
 
             if not qty or qty <= 0:
@@ -538,8 +659,12 @@ async def main(symbolL, symbolE, cfg):
 
 
         if entryCond_LE:
-            qty                 = min(L.ob["askSize"]*PERC_OF_OB, E.ob["bidSize"]*PERC_OF_OB, MAX_TRADE_VALUE_ENTRY/L.ob["askPrice"])
-            qty                 = HELPERS.extGetAllowedNum(qty, E.pair["min_size_change"])
+            sized               = calc_depth_qty(L, E, minSpread_toEntry, MAX_TRADE_VALUE_ENTRY/L.ob["askPrice"], PERC_OF_OB, OB_DEPTH)
+            if sized["qty"] <= 0:
+                logging.info    ('[entryCond_LE] no book slice beats the threshold, skipping this tick')
+                await waitNextTick()
+                continue
+            qty                 = HELPERS.extGetAllowedNum(sized["qty"], E.pair["min_size_change"])
             
             if qty and qty * L.ob["askPrice"] > MIN_TRADE_VALUE:
 
@@ -569,8 +694,12 @@ async def main(symbolL, symbolE, cfg):
                     "askSize"   : L.ob["askSize"],
                     "bidPrice"  : E.ob["bidPrice"],
                     "bidSize"   : E.ob["bidSize"],
+                    "vwapSpread": sized["vwapSpread"],
+                    "obLevels"  : sized["levels"],
+                    "worstPriceL": sized["worstBuy"],
+                    "worstPriceE": sized["worstSell"],
                 }
-                await execute_trade(L, E, "BUY", "SELL", qty, newTradeData, TRADES_INTERVAL)
+                await execute_trade(L, E, "BUY", "SELL", qty, newTradeData, TRADES_INTERVAL, presigner)
                 continue
 
             if not qty or qty <= 0:
@@ -579,8 +708,12 @@ async def main(symbolL, symbolE, cfg):
                 return
 
         if entryCond_EL:
-            qty                 = min(E.ob["askSize"]*PERC_OF_OB, L.ob["bidSize"]*PERC_OF_OB, MAX_TRADE_VALUE_ENTRY/E.ob["askPrice"])
-            qty                 = HELPERS.extGetAllowedNum(qty, E.pair["min_size_change"])
+            sized               = calc_depth_qty(E, L, minSpread_toEntry, MAX_TRADE_VALUE_ENTRY/E.ob["askPrice"], PERC_OF_OB, OB_DEPTH)
+            if sized["qty"] <= 0:
+                logging.info    ('[entryCond_EL] no book slice beats the threshold, skipping this tick')
+                await waitNextTick()
+                continue
+            qty                 = HELPERS.extGetAllowedNum(sized["qty"], E.pair["min_size_change"])
 
             if qty and qty * E.ob["askPrice"] > MIN_TRADE_VALUE:
                 if qty < E.pair["min_size"] or qty*L.ob["bidPrice"] < L.pair["min_value"] or qty < L.pair["min_size"]:
@@ -609,8 +742,12 @@ async def main(symbolL, symbolE, cfg):
                     "askSize"   : E.ob["askSize"],
                     "bidPrice"  : L.ob["bidPrice"],
                     "bidSize"   : L.ob["bidSize"],
+                    "vwapSpread": sized["vwapSpread"],
+                    "obLevels"  : sized["levels"],
+                    "worstPriceL": sized["worstSell"],
+                    "worstPriceE": sized["worstBuy"],
                 }
-                await execute_trade(L, E, "SELL", "BUY", qty, newTradeData, TRADES_INTERVAL)
+                await execute_trade(L, E, "SELL", "BUY", qty, newTradeData, TRADES_INTERVAL, presigner)
                 continue
 
             if not qty or qty <= 0:
@@ -618,9 +755,12 @@ async def main(symbolL, symbolE, cfg):
                 await restart_bot(symbolL, symbolE, 'Invalid trade quantity calculated in entryCond_EL')
                 return
 
+        # nothing fired: keep the legs of a direction close to its trigger signed (in the
+        # background: the next book update is evaluated while it signs)
+        if presigner:
+            presigner.schedule  (prepare_presigned, presigner, L, E, l_qty, e_qty, spreadLE, spreadEL, spreadInv, minSpread_toEntry, PRESIGN_MARGIN, cfg)
 
-
-        await asyncio.sleep(0.1)
+        await waitNextTick()
 
 
 # --- Entry Point ---
@@ -636,6 +776,13 @@ if __name__ == "__main__":
             logging.info(f"❌ Symbol {symbolL} not found in config.json")
             sys.exit(1)
 
-        asyncio.run(main(symbolL, symbolE, cfg))
+        async def run_standalone():
+            try:
+                await main(symbolL, symbolE, cfg)
+            finally:
+                await TELEGRAM.flush(timeout=5)
+                await SESSIONS.closeAll()
+
+        asyncio.run(run_standalone())
 
 # ---
\ No newline at end of file
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import fcntl
+import asyncio
+import logging
+
+# Lighter nonces and client order ids, shared by every process trading on the
+# same account / API key.
+#
+#   nonces  = NONCES.get(account_index, api_key_index, fetchNonce)   # fetchNonce: async () -> next nonce on the exchange
+#   await nonces.init()
+#   n       = nonces.next()               # claim: no round trip, several txs can be in flight
+#   ...send_tx...
+#   nonces.release(n)                     # tx not accepted
+#   await nonces.resync()                 # exchange said "invalid nonce"
+#
+# The last claimed nonce lives in a small JSON file under an exclusive flock,
+# so two bot processes (or two pairs of one process) never sign with the same
+# nonce. A nonce given back by release() is only reused if nothing was claimed
+# after it; otherwise the sequence has a hole and the next rejection resyncs
+# from the exchange. CLIENT_IDS hands out client order ids the same way.
+# Stdlib only.
+
+logger                          = logging.getLogger("nonce_manager")
+logger.setLevel                 (logging.INFO)
+
+def state_dir():
+    return os.getenv("NONCE_DIR", "/tmp")
+
+
+class _LockedState:
+    """A JSON dict in a file, read-modify-written under an exclusive flock."""
+    def __init__(self, path: str):
+        self.path               = path
+        self.fd                 = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _load(self) -> dict:
+        raw                     = os.pread(self.fd, 1 << 16, 0)
+        try:
+            # raw_decode: a write cut short before its truncate leaves the old tail behind the new JSON
+            return json.JSONDecoder().raw_decode(raw.decode())[0] if raw else {}
+        except ValueError:
+            return {}
+
+    def read(self) -> dict:
+        """Current state under a shared lock, nothing written."""
+        fcntl.flock             (self.fd, fcntl.LOCK_SH)
+        try:
+            return self._load   ()
+        finally:
+            fcntl.flock         (self.fd, fcntl.LOCK_UN)
+
+    def update(self, fn):
+        """fn(state) -> result; fn may modify state in place, it is written back."""
+        fcntl.flock             (self.fd, fcntl.LOCK_EX)
+        try:
+            state               = self._load()
+            result              = fn(state)
+            data                = json.dumps(state).encode()
+            # write over the old content, then cut what is left of it: the
+            # file is never empty, even if we die in between
+            os.pwrite           (self.fd, data, 0)
+            os.ftruncate        (self.fd, len(data))
+            return result
+        finally:
+            fcntl.flock         (self.fd, fcntl.LOCK_UN)
+
+
+class NonceManager:
+    def __init__(self, accountIndex: int, apiKey: int, fetchNonce, freshFor: float = 60.0):
+        self.accountIndex       = accountIndex
+        self.apiKey             = apiKey
+        self.fetchNonce         = fetchNonce
+        self.freshFor           = freshFor
+        self.state              = _LockedState(os.path.join(state_dir(), f"arbspread_nonce_{accountIndex}_{apiKey}.json"))
+        self._resync            = None
+        self.stats              = {"claimed": 0, "released": 0, "holes": 0, "resyncs": 0}
+
+    async def init(self):
+        """
+        Start from the exchange's next nonce, unless another process claimed
+        further within freshFor seconds (its txs may still be in flight).
+        """
+        onChain                 = await self.fetchNonce()
+        def _init(state):
+            if time.time() - state.get("ts", 0) > self.freshFor or state.get("last", -1) < onChain - 1:
+                state["last"]   = onChain - 1
+            state["ts"]         = time.time()
+            return state["last"]
+        last                    = self.state.update(_init)
+        logger.info             (f"✅ Lighter nonces for key {self.apiKey}: next {last + 1} (exchange {onChain})")
+
+    def next(self) -> int:
+        def _claim(state):
+            state["last"]       = state.get("last", -1) + 1
+            state["ts"]         = time.time()
+            return state["last"]
+        self.stats["claimed"]   += 1
+        return self.state.update(_claim)
+
+    def claim(self, nonce: int) -> bool:
+        """Claim exactly `nonce` if it is the next one (presigned txs)."""
+        def _claim(state):
+            if state.get("last", -1) + 1 != nonce:
+                return False
+            state["last"]       = nonce
+            state["ts"]         = time.time()
+            return True
+        ok                      = self.state.update(_claim)
+        if ok:
+            self.stats["claimed"] += 1
+        return ok
+
+    def peek(self) -> int:
+        return self.state.read().get("last", -1) + 1
+
+    def release(self, nonce: int):
+        """The tx with this nonce was not accepted: hand the nonce back if nothing came after it."""
+        def _release(state):
+            if state.get("last") == nonce:
+                state["last"]   = nonce - 1
+                return True
+            return False
+        if self.state.update(_release):
+            self.stats["released"] += 1
+        else:
+            # later nonces are out already: they fail on the hole and resync
+            self.stats["holes"] += 1
+
+    async def resync(self):
+        """Reset to the exchange's next nonce; concurrent callers share one fetch."""
+        if self._resync is None or self._resync.done():
+            self._resync        = asyncio.ensure_future(self._doResync())
+        await asyncio.shield    (self._resync)
+
+    async def _doResync(self):
+        onChain                 = await self.fetchNonce()
+        def _set(state):
+            state["last"]       = onChain - 1
+            state["ts"]         = time.time()
+        self.state.update       (_set)
+        self.stats["resyncs"]   += 1
+        logger.warning          (f"⚠️ Lighter nonce resynced for key {self.apiKey}: next {onChain}")
+
+    def fmtSummary(self) -> str:
+        s                       = self.stats
+        return f"claimed {s['claimed']} | released {s['released']} holes {s['holes']} resyncs {s['resyncs']}"
+
+
+class SdkNonceAdapter:
+    """
+    Stands in for SignerClient.nonce_manager, so txs the SDK signs itself
+    (create_order, cancel_all_orders, ...) draw from the shared sequence too.
+    """
+    def __init__(self, manager: NonceManager):
+        self.manager            = manager
+        self._last              = None
+
+    def next_nonce(self):
+        self._last              = self.manager.next()
+        return self.manager.apiKey, self._last
+
+    def acknowledge_failure(self, api_key_index):
+        if self._last is not None:
+            self.manager.release(self._last)
+            self._last          = None
+
+    def hard_refresh_nonce(self, api_key_index):
+        asyncio.ensure_future   (self.manager.resync())
+
+
+class NonceRegistry:
+    """One NonceManager per (account, API key) in the process."""
+    def __init__(self):
+        self.managers           = {}
+
+    def get(self, accountIndex: int, apiKey: int, fetchNonce) -> NonceManager:
+        key                     = (accountIndex, apiKey)
+        if key not in self.managers:
+            self.managers[key]  = NonceManager(accountIndex, apiKey, fetchNonce)
+        return self.managers[key]
+
+
+class ClientIds:
+    """Client order ids, strictly increasing across processes (ms timestamp * 100 + a counter)."""
+    def __init__(self):
+        self.state              = None
+
+    def next(self) -> int:
+        if self.state is None:
+            self.state          = _LockedState(os.path.join(state_dir(), "arbspread_client_ids.json"))
+        def _next(state):
+            state["last"]       = max(int(time.time() * 1000) * 100, state.get("last", 0) + 1)
+            return state["last"]
+        return self.state.update(_next)
+
+
+NONCES                          = NonceRegistry()
+CLIENT_IDS                      = ClientIds()
@@ -0,0 +1,161 @@
+import time
+import asyncio
+import logging
+
+from nonce_manager import CLIENT_IDS
+
+# Fill state of the two legs of a trade, resolved from the account streams.
+#
+#   legL, legE  = L.orders.expect(), E.orders.expect()    # client ids for the orders
+#   await asyncio.gather(L.placeMarketOrder(..., leg=legL), E.placeMarketOrder(..., leg=legE))
+#   confirmed   = await wait_legs([legL, legE], timeout=1.0)
+#
+# helper_lighter feeds the trades of its account_all channel (matched on the
+# ask / bid client id) and the orders of account_all_orders (client order
+# index, status, cumulative fill), helper_extended the order updates of its
+# account stream (matched on external_id). Fills and order updates may arrive
+# in either order: the leg takes whichever reports more filled qty.
+# A leg is resolved once its filled qty reaches the order qty, or the order
+# reached a terminal state (cancelled in any flavour / expired / rejected,
+# possibly after a partial fill), or placing it failed. Whatever is still open at the timeout
+# is the caller's to check (REST position). Stdlib only.
+
+logger                          = logging.getLogger("order_tracker")
+logger.setLevel                 (logging.INFO)
+
+TERMINAL                        = ("CANCELED", "CANCELLED", "EXPIRED", "REJECTED")
+
+def next_client_id() -> int:
+    """Unique client order id across the bot processes (fits Lighter's 48-bit client_order_index)."""
+    return CLIENT_IDS.next()
+
+
+class Leg:
+    def __init__(self, venue: str, clientId: int):
+        self.venue              = venue
+        self.clientId           = clientId
+        self.qty                = None                  # set when the order is sent
+        self.filled             = 0.0
+        self.notional           = 0.0
+        self.fills              = [0.0, 0.0]            # qty, notional summed from trades
+        self.ordered            = [0.0, 0.0]            # qty, notional from the last order update
+        self.status             = "pending"             # pending / open / filled / partial / rejected / failed
+        self.fillIds            = set()
+        self.wireAt             = None                  # perf_counter right before the request went out
+        self.sentAt             = None
+        self.latencyMs          = None
+        self.done               = asyncio.Event()
+
+    @property
+    def avgPrice(self):
+        return self.notional / self.filled if self.filled else None
+
+    def onWire(self):
+        """Signed, the request is being written now (a retry moves it)."""
+        self.wireAt             = time.perf_counter()
+
+    def sent(self, qty: float):
+        self.qty                = float(qty)
+        self.sentAt             = time.perf_counter()
+        self.status             = "open"
+        self._check             ()
+
+    def fail(self, reason: str = ""):
+        if not self.done.is_set():
+            self._resolve       ("failed")
+            logger.warning      (f"⚠️ {self.venue} order {self.clientId} failed {reason}")
+
+    def _merge(self):
+        self.filled, self.notional = max(self.fills, self.ordered, key=lambda f: f[0])
+
+    def _full(self) -> bool:
+        return self.qty is not None and self.filled >= self.qty * (1 - 1e-9)
+
+    def _check(self):
+        if not self.done.is_set() and self._full():
+            self._resolve       ("filled")
+
+    def _resolve(self, status: str):
+        self.status             = status
+        since                   = self.wireAt if self.wireAt is not None else self.sentAt
+        if since is not None:
+            self.latencyMs      = (time.perf_counter() - since) * 1000
+        self.done.set           ()
+
+    def summary(self) -> str:
+        price                   = f" @ {self.avgPrice:.6g}" if self.avgPrice else ""
+        latency                 = f" | ⏱ {self.latencyMs:.2f} ms" if self.latencyMs is not None else ""
+        return f"• {self.status.capitalize()} {self.filled:g}/{self.qty if self.qty is not None else '?'}{price}{latency}"
+
+
+class OrderTracker:
+    """Legs of one venue by client order id, fed by the account stream handlers."""
+    def __init__(self, venue: str):
+        self.venue              = venue
+        self.legs               = {}
+        self.stats              = {"legs": 0, "filled": 0, "partial": 0, "rejected": 0, "failed": 0, "timeout": 0}
+
+    def expect(self, clientId: int | None = None) -> Leg:
+        """New leg; clientId: the one a presigned order already carries."""
+        leg                     = Leg(self.venue, clientId or next_client_id())
+        self.legs[leg.clientId] = leg
+        self.stats["legs"]      += 1
+        return leg
+
+    def forget(self, leg: Leg):
+        """Stop tracking a leg (after the trade, resolved or not)."""
+        self.legs.pop           (leg.clientId, None)
+        self.stats[leg.status if leg.done.is_set() else "timeout"] += 1
+
+    def _leg(self, clientId):
+        try:
+            return self.legs.get(int(clientId))
+        except (TypeError, ValueError):
+            return None
+
+    def onFill(self, clientId, fillId, qty: float, price: float):
+        """One execution of an order (Lighter trades); duplicates are ignored."""
+        leg                     = self._leg(clientId)
+        if leg is None or leg.done.is_set() or fillId in leg.fillIds:
+            return
+        leg.fillIds.add         (fillId)
+        leg.fills[0]            += qty
+        leg.fills[1]            += qty * price
+        leg._merge              ()
+        leg._check              ()
+
+    def onOrder(self, clientId, status: str, filledQty: float, avgPrice: float = 0.0):
+        """Order update with the cumulative filled qty (Extended orders, Lighter account_all_orders)."""
+        leg                     = self._leg(clientId)
+        if leg is None or leg.done.is_set():
+            return
+        status                  = str(status).upper().rsplit(".", 1)[-1]
+        if filledQty > leg.ordered[0]:
+            leg.ordered         = [filledQty, filledQty * (avgPrice or 0.0)]
+            leg._merge          ()
+        if status == "FILLED":
+            leg._resolve        ("filled")
+        elif status in TERMINAL or status.startswith("CANCELED-"):
+            # Lighter: canceled-too-much-slippage, canceled-not-enough-liquidity, ...
+            leg._resolve        ("filled" if leg._full() else "partial" if leg.filled else "rejected")
+        else:
+            leg._check          ()
+
+
+def wire_delta_ms(legs):
+    """Spread between the legs' requests going out (None until all of them did)."""
+    stamps                      = [leg.wireAt for leg in legs]
+    if None in stamps:
+        return None
+    return (max(stamps) - min(stamps)) * 1000
+
+
+async def wait_legs(legs, timeout: float) -> bool:
+    """Wait until every leg resolved or timeout passed; True if all resolved."""
+    pending                     = [leg.done.wait() for leg in legs if not leg.done.is_set()]
+    if pending:
+        try:
+            await asyncio.wait_for(asyncio.gather(*pending), timeout)
+        except asyncio.TimeoutError:
+            pass
+    return all(leg.done.is_set() for leg in legs)
@@ -0,0 +1,119 @@
+from bisect import bisect_left, insort
+
+class OrderBook:
+    """
+    Local L2 order book with prices stored as scaled integers (ticks).
+
+    Each side keeps a price->size dict plus a sorted key list arranged so the
+    best level is always at the end of the list:
+      - bids : ticks ascending          -> best bid = _bidKeys[-1]
+      - asks : negated ticks ascending  -> best ask = -_askKeys[-1]
+    Level lookup is O(log n) (bisect), top-of-book and level-at-N are O(1),
+    and churn near the top of the book only touches the tail of the list.
+    """
+    def __init__(self, priceDecimals: int):
+        self.decimals           = int(priceDecimals)
+        self.scale              = 10 ** self.decimals
+        self.bids               = {}
+        self.asks               = {}
+        self._bidKeys           = []
+        self._askKeys           = []
+
+    # ---------- price <-> ticks ----------
+    def toTicks(self, price) -> int:
+        if isinstance(price, str):
+            whole, _, frac      = price.strip().partition(".")
+            if len(frac) <= self.decimals:
+                return int((whole or "0") + frac.ljust(self.decimals, "0"))
+            price               = float(price)
+        return int(round(float(price) * self.scale))
+
+    def toPrice(self, ticks: int) -> float:
+        return ticks / self.scale
+
+    # ---------- mutation ----------
+    def reset(self):
+        self.bids.clear         ()
+        self.asks.clear         ()
+        self._bidKeys.clear     ()
+        self._askKeys.clear     ()
+
+    def setLevel(self, isBid: bool, price, size: float):
+        """Absolute update: size <= 0 removes the level."""
+        ticks                   = self.toTicks(price)
+        levels, keys, key       = (self.bids, self._bidKeys, ticks) if isBid else (self.asks, self._askKeys, -ticks)
+        size                    = float(size)
+
+        if size <= 0:
+            if levels.pop(ticks, None) is not None:
+                i               = bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    del keys[i]
+            return
+
+        if ticks not in levels:
+            insort              (keys, key)
+        levels[ticks]           = size
+
+    def addToLevel(self, isBid: bool, price, delta: float):
+        """Relative update (Extended DELTA messages carry the quantity change)."""
+        levels                  = self.bids if isBid else self.asks
+        size                    = levels.get(self.toTicks(price), 0.0) + float(delta)
+        self.setLevel           (isBid, price, size if size > 1e-12 else 0.0)
+
+    def applySnapshot(self, bids, asks):
+        self.reset              ()
+        self.applyDelta         (bids, asks)
+
+    def applyDelta(self, bids, asks):
+        """Apply Lighter-style level updates: [{"price": "...", "size": "..."}, ...]"""
+        for lvl in bids or ():
+            self.setLevel       (True,  lvl["price"], lvl["size"])
+        for lvl in asks or ():
+            self.setLevel       (False, lvl["price"], lvl["size"])
+
+    # ---------- queries ----------
+    def bestBid(self):
+        if not self._bidKeys:
+            return None
+        ticks                   = self._bidKeys[-1]
+        return self.toPrice(ticks), self.bids[ticks]
+
+    def bestAsk(self):
+        if not self._askKeys:
+            return None
+        ticks                   = -self._askKeys[-1]
+        return self.toPrice(ticks), self.asks[ticks]
+
+    def levelAt(self, isBid: bool, n: int):
+        """n-th level from the top (0 = best), or None when the book is shallower."""
+        keys                    = self._bidKeys if isBid else self._askKeys
+        if n >= len(keys):
+            return None
+        key                     = keys[-1 - n]
+        ticks                   = key if isBid else -key
+        return self.toPrice(ticks), (self.bids if isBid else self.asks)[ticks]
+
+    def levels(self, isBid: bool, n: int):
+        """Top n levels as [(price, size), ...], best first."""
+        keys                    = self._bidKeys if isBid else self._askKeys
+        book                    = self.bids if isBid else self.asks
+        out                     = []
+        for key in reversed(keys[max(len(keys) - n, 0):]):
+            ticks               = key if isBid else -key
+            out.append          ((self.toPrice(ticks), book[ticks]))
+        return out
+
+    def top(self) -> dict:
+        """Top of book in the same shape as LighterAPI.ob / ExtendedAPI.ob."""
+        bid                     = self.bestBid()
+        ask                     = self.bestAsk()
+        return {
+            "bidPrice"          : bid[0] if bid else 0.0,
+            "askPrice"          : ask[0] if ask else 0.0,
+            "bidSize"           : bid[1] if bid else 0.0,
+            "askSize"           : ask[1] if ask else 0.0,
+        }
+
+    def isReady(self) -> bool:
+        return bool(self._bidKeys) and bool(self._askKeys)
@@ -0,0 +1,106 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Stage runner for the data sync loops (db_lig / db_ext main). Symbols are
+# independent, so the per-symbol FIFO → cycle chain is fanned out over a
+# process pool shared by both venues; merges and other whole-venue stages run
+# in a thread. Every stage is timed:
+#
+#   runner  = StageRunner("lig")
+#   runner.begin()
+#   await runner.timed("trades", L.getTrades())
+#   jobs    = await runner.call("fundings", p_fifo.prepare_fifo)
+#   results = await runner.fanOut("fifo+cycle", p_cycle.process_symbol, jobs)
+#   logger.info(runner.fmtTimings())
+#
+# Workers are spawned (not forked from the running event loop) and reused
+# across sync cycles; PIPELINE_WORKERS caps their number.
+
+logger                          = logging.getLogger("pipeline")
+logger.setLevel                 (logging.INFO)
+
+_pool                           = None
+
+
+def workers() -> int:
+    return max(1, int(os.getenv("PIPELINE_WORKERS") or os.cpu_count() or 1))
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool                   = ProcessPoolExecutor(max_workers=workers(), mp_context=multiprocessing.get_context("spawn"))
+        logger.info             (f"⚙️ Pipeline pool started ({workers()} workers)")
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown          (wait=False, cancel_futures=True)
+        _pool                   = None
+
+
+class StageRunner:
+    def __init__(self, name: str):
+        self.name               = name
+        self.timings            = {}
+        self.counts             = {}
+
+    def begin(self):
+        """Start a new sync cycle (clears the previous timings)."""
+        self.timings.clear      ()
+        self.counts.clear       ()
+
+    def _record(self, stage, t0, n=None):
+        self.timings[stage]     = time.perf_counter() - t0
+        if n is not None:
+            self.counts[stage]  = n
+
+    async def timed(self, stage: str, aw):
+        """Await a coroutine as a timed stage."""
+        t0                      = time.perf_counter()
+        try:
+            return await aw
+        finally:
+            self._record        (stage, t0)
+
+    async def call(self, stage: str, fn, *args):
+        """Run a blocking whole-venue stage in a thread."""
+        t0                      = time.perf_counter()
+        try:
+            return await asyncio.to_thread(fn, *args)
+        finally:
+            self._record        (stage, t0)
+
+    async def fanOut(self, stage: str, fn, jobs: list) -> list:
+        """
+        Run fn(job) for every job on the process pool (fn and jobs must be
+        picklable, i.e. module-level functions and plain tuples). Results come
+        back in job order. A dead pool is dropped so the next cycle starts a
+        fresh one.
+        """
+        t0                      = time.perf_counter()
+        loop                    = asyncio.get_running_loop()
+        try:
+            pool                = get_pool()
+            return await asyncio.gather(*(loop.run_in_executor(pool, fn, job) for job in jobs))
+        except BrokenProcessPool:
+            logger.error        (f"❌ [{self.name}] pipeline pool died during {stage}; restarting next cycle")
+            shutdown_pool       ()
+            raise
+        finally:
+            self._record        (stage, t0, len(jobs))
+
+    def fmtTimings(self) -> str:
+        parts                   = []
+        for stage, sec in self.timings.items():
+            n                   = self.counts.get(stage)
+            parts.append        (f"{stage} {sec:.2f}s" + (f" ({n})" if n is not None else ""))
+        total                   = sum(self.timings.values())
+        return f"⏱️ [{self.name}] " + " · ".join(parts) + f" | total {total:.2f}s"
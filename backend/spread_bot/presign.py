@@ -0,0 +1,144 @@
+import time
+import asyncio
+import logging
+
+from sign_pool import STALE, Stale
+
+# Speculative signed orders for the two arbitrage directions of a pair.
+#
+#   presigner   = Presigner(L, E)
+#   # spread close to its trigger, nothing fired this tick (not awaited):
+#   presigner.schedule(presigner.prepare, "LE", "BUY", "SELL", qty, reduceOnly, worstL, worstE)
+#   # trigger fired:
+#   presigner.cancel()                                                      # signing still running is dropped
+#   pL          = presigner.take(L, "LE", "BUY", qty, reduceOnly, worstL)   # None: sign now
+#   await L.placeMarketOrder("BUY", qty, reduceOnly, worstPrice=worstL, leg=leg, presigned=pL)
+#
+# Each venue API signs an order for the leg it would send right now
+# (presignMarketOrder) and describes it by a key (marketOrderKey: side,
+# quantized size and price, reduce-only). take() hands the order out only if
+# the trade about to go out has the very same key and the API still accepts
+# it (presignedValid: the Lighter nonce it was signed with is still the next
+# one), so a book move, a different size or any other tx sent in between
+# simply means signing on the trigger path as before. Slots are re-signed at
+# most every minInterval seconds and dropped after maxAge or on invalidate()
+# (inventory changed). Signing runs as one background task per pair, so the
+# decision loop goes straight back to the book; a run whose result arrives
+# after cancel() / invalidate() is discarded, and its signatures still
+# queued on a venue's signing thread are skipped there (sign_pool.STALE), so
+# the trade's own signature waits at most for one already running. Stdlib only: the venue work
+# lives in the helpers.
+
+logger                          = logging.getLogger("presign")
+logger.setLevel                 (logging.INFO)
+
+
+class Presigned:
+    def __init__(self, venue: str, key: tuple, clientId: int, payload, **meta):
+        self.venue              = venue
+        self.key                = key
+        self.clientId           = clientId
+        self.payload            = payload               # Lighter tx_info / Extended order object
+        self.meta               = meta                  # Lighter: nonce, apiKey
+        self.signedAt           = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.signedAt
+
+
+class Presigner:
+    def __init__(self, L, E, maxAge: float = 20.0, minInterval: float = 0.25):
+        self.apis               = {"L": L, "E": E}
+        self.maxAge             = maxAge
+        self.minInterval        = minInterval
+        self.slots              = {}                    # (leg, direction) -> Presigned
+        self.lastSign           = {}                    # (leg, direction) -> monotonic ts
+        self.task               = None                  # background run of schedule()
+        self.generation         = 0                     # bumped by cancel / invalidate: older results are stale
+        self.stats              = {"signed": 0, "hits": 0, "misses": 0, "errors": 0, "skipped": 0, "discarded": 0}
+
+    def schedule(self, fn, *args):
+        """Run fn(*args) (a coroutine function) in the background, unless the previous run is still signing."""
+        if self.task is not None and not self.task.done():
+            self.stats["skipped"] += 1
+            return False
+        self.task               = asyncio.ensure_future(fn(*args))
+        self.task.add_done_callback(self._taskDone)
+        return True
+
+    def _taskDone(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+            logger.warning      (f"⚠️ Presign run failed: {task.exception()}")
+
+    def cancel(self):
+        """A trade is about to go out: stop the background run, whatever it still signs is stale."""
+        self.generation         += 1
+        if self.task is not None and not self.task.done():
+            self.task.cancel    ()
+
+    async def prepare(self, direction: str, sideL: str, sideE: str, qty: float, reduceOnly: bool, worstL=None, worstE=None):
+        """Keep both legs of `direction` signed for the current book; cheap when nothing changed."""
+        generation              = self.generation
+        token                   = STALE.set(lambda: generation != self.generation)
+        try:
+            await self._prepare (generation, direction, sideL, sideE, qty, reduceOnly, worstL, worstE)
+        finally:
+            STALE.reset         (token)
+
+    async def _prepare(self, generation, direction, sideL, sideE, qty, reduceOnly, worstL, worstE):
+        for name, side, worst in (("L", sideL, worstL), ("E", sideE, worstE)):
+            api                 = self.apis[name]
+            slot                = (name, direction)
+            key                 = api.marketOrderKey(side, qty, reduceOnly, worst)
+            current             = self.slots.get(slot)
+            if key is None or (current and current.key == key and current.age() < self.maxAge and api.presignedValid(current)):
+                continue
+            now                 = time.monotonic()
+            if now - self.lastSign.get(slot, 0.0) < self.minInterval:
+                continue
+            if generation != self.generation:
+                self.stats["discarded"] += 1
+                return
+            self.lastSign[slot] = now
+            try:
+                signed          = await api.presignMarketOrder(side, qty, reduceOnly, worst)
+            except Stale:
+                self.stats["discarded"] += 1
+                return
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning  (f"⚠️ Presign {name} {direction} failed: {e}")
+                signed          = None
+            if generation != self.generation:
+                self.stats["discarded"] += 1
+                return
+            if signed is None:
+                self.slots.pop  (slot, None)
+            else:
+                self.slots[slot]= signed
+                self.stats["signed"] += 1
+
+    def drop(self, direction: str):
+        """Spread moved away from this direction's trigger."""
+        for name in self.apis:
+            self.slots.pop      ((name, direction), None)
+
+    def invalidate(self):
+        self.generation         += 1
+        self.slots.clear        ()
+
+    def take(self, api, direction: str, side: str, qty: float, reduceOnly: bool, worst=None):
+        """The signed order for this leg if it is exactly what would be sent now, else None."""
+        name                    = next(n for n, a in self.apis.items() if a is api)
+        signed                  = self.slots.pop((name, direction), None)
+        if (signed is not None and signed.age() < self.maxAge
+                and signed.key == api.marketOrderKey(side, qty, reduceOnly, worst) and api.presignedValid(signed)):
+            self.stats["hits"]  += 1
+            return signed
+        self.stats["misses"]    += 1
+        return None
+
+    def fmtSummary(self) -> str:
+        s                       = self.stats
+        return f"presigned {s['signed']} | hits {s['hits']} misses {s['misses']} errors {s['errors']} | skipped {s['skipped']} discarded {s['discarded']}"
@@ -0,0 +1,156 @@
+import os
+import csv
+import json
+import sqlite3
+import logging
+
+# Append-only store for the raw exchange history (trades, fundings) of one
+# venue. Rows live in SQLite keyed by the exchange id, with an index on the
+# timestamp and a high-water mark per table, so a sync only touches new rows:
+#
+#   store   = RawStore("/root/arbSpread/backend/db_lig/raw/_store.db")
+#   newest  = store.hwm("trades")                                   # O(1)
+#   fresh   = store.insert("trades", rows, key=..., ts=..., symbol=...)
+#   store.mirrorCsv("trades", fresh, rawDir)                        # appends only
+#
+# The per-symbol CSVs and _fundings.csv read by p_fifo / p_daily are kept as
+# append-only mirrors of the store; nothing is re-read or rewritten per sync.
+
+logger                          = logging.getLogger("raw_store")
+logger.setLevel                 (logging.INFO)
+
+TABLES                          = ("trades", "fundings")
+
+
+def safe_symbol(symbol: str) -> str:
+    return str(symbol).replace("/", "-").replace(":", "-").replace(" ", "")
+
+
+def append_csv(path: str, rows: list[dict], fieldnames: list[str]):
+    """Append rows to path, writing the header first if the file is new."""
+    if not rows:
+        return
+    os.makedirs                 (os.path.dirname(path), exist_ok=True)
+    isNew                       = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        w                       = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        if isNew:
+            w.writeheader       ()
+        w.writerows             (rows)
+
+
+class RawStore:
+    def __init__(self, path: str):
+        self.path               = path
+        os.makedirs             (os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute          ("PRAGMA journal_mode=WAL")
+            db.execute          ("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            for t in TABLES:
+                db.execute      (f"CREATE TABLE IF NOT EXISTS {t} (uid TEXT PRIMARY KEY, ts INTEGER NOT NULL, symbol TEXT, row TEXT NOT NULL)")
+                db.execute      (f"CREATE INDEX IF NOT EXISTS {t}_ts ON {t} (ts)")
+                db.execute      (f"CREATE INDEX IF NOT EXISTS {t}_symbol_ts ON {t} (symbol, ts)")
+
+    def _connect(self):
+        return sqlite3.connect  (self.path, timeout=30)
+
+    def _meta(self, db, key, default=None):
+        row                     = db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _setMeta(self, db, key, value):
+        db.execute              ("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def hwm(self, table: str) -> int:
+        """Newest timestamp stored in table (exchange units), 0 when empty."""
+        with self._connect() as db:
+            return int(self._meta(db, f"{table}_hwm", 0))
+
+    def fieldnames(self, table: str) -> list[str] | None:
+        """Column order of the CSV mirrors, fixed by the first rows ever stored."""
+        with self._connect() as db:
+            v                   = self._meta(db, f"{table}_fields")
+        return json.loads(v) if v else None
+
+    def count(self, table: str) -> int:
+        with self._connect() as db:
+            return db.execute   (f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def insert(self, table: str, rows: list[dict], key, ts, symbol=None, fieldnames=None) -> list[dict]:
+        """
+        Insert rows, skipping the ones already stored (same key(row)).
+        Returns the rows that were actually new, oldest first. key/ts/symbol
+        are callables taking a row; the high-water mark follows max ts(row).
+        """
+        fresh                   = []
+        with self._connect() as db:
+            for r in sorted(rows, key=ts):
+                cur             = db.execute(
+                    f"INSERT OR IGNORE INTO {table} (uid, ts, symbol, row) VALUES (?, ?, ?, ?)",
+                    (str(key(r)), int(ts(r)), symbol(r) if symbol else None, json.dumps(r, default=str)),
+                )
+                if cur.rowcount:
+                    fresh.append(r)
+
+            if fresh:
+                newest          = max(int(self._meta(db, f"{table}_hwm", 0)), int(ts(fresh[-1])))
+                self._setMeta   (db, f"{table}_hwm", newest)
+                if self._meta(db, f"{table}_fields") is None:
+                    fields      = fieldnames or sorted(set().union(*(r.keys() for r in fresh)))
+                    self._setMeta(db, f"{table}_fields", json.dumps(list(fields)))
+        return fresh
+
+    def rows(self, table: str, symbol: str | None = None):
+        """All rows of table (optionally one symbol), oldest first."""
+        with self._connect() as db:
+            if symbol is None:
+                cur             = db.execute(f"SELECT row FROM {table} ORDER BY ts")
+            else:
+                cur             = db.execute(f"SELECT row FROM {table} WHERE symbol=? ORDER BY ts", (symbol,))
+            for (row,) in cur:
+                yield json.loads(row)
+
+    def symbols(self, table: str) -> list[str]:
+        with self._connect() as db:
+            return [s for (s,) in db.execute(f"SELECT DISTINCT symbol FROM {table} WHERE symbol IS NOT NULL")]
+
+    # --- CSV mirrors
+
+    def mirrorCsv(self, table: str, fresh: list[dict], rawDir: str, symbol):
+        """
+        Append fresh rows to rawDir/{SYMBOL}.csv. A missing symbol file is
+        rebuilt from the store instead, so deleting a mirror is always safe.
+        """
+        fields                  = self.fieldnames(table)
+        bySymbol                = {}
+        for r in fresh:
+            bySymbol.setdefault (symbol(r), []).append(r)
+        for sym, rows in bySymbol.items():
+            path                = os.path.join(rawDir, f"{safe_symbol(sym)}.csv")
+            if os.path.exists(path):
+                append_csv      (path, rows, fields)
+            else:
+                append_csv      (path, list(self.rows(table, sym)), fields)
+
+    def exportCsv(self, table: str, path: str, symbol: str | None = None):
+        """Rewrite path from the store (oldest first). For repairs, not per sync."""
+        tmp                     = f"{path}.tmp"
+        if os.path.exists(tmp):
+            os.remove           (tmp)
+        append_csv              (tmp, list(self.rows(table, symbol)), self.fieldnames(table) or [])
+        if os.path.exists(tmp):
+            os.replace          (tmp, path)
+
+    # --- one-time migration of the old full-rewrite CSVs
+
+    def migrateCsv(self, table: str, csvPath: str, key, ts, symbol=None):
+        """Load a legacy CSV into an empty table, keeping its column order."""
+        if self.hwm(table) or not os.path.exists(csvPath):
+            return 0
+        with open(csvPath, newline="", encoding="utf-8") as f:
+            reader              = csv.DictReader(f)
+            rows                = list(reader)
+            fields              = reader.fieldnames
+        fresh                   = self.insert(table, rows, key=key, ts=ts, symbol=symbol, fieldnames=fields)
+        logger.info             (f"📥 Migrated {len(fresh)}/{len(rows)} rows {csvPath} → {self.path}:{table}")
+        return len(fresh)
@@ -0,0 +1,79 @@
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+logger                          = logging.getLogger("sign_pool")
+logger.setLevel                 (logging.INFO)
+
+# set by speculative callers (presign) in their own task: () -> True once the
+# result is no longer wanted; checked on the signing thread right before the call
+STALE                           = contextvars.ContextVar("SIGN_STALE", default=None)
+
+class Stale(Exception):
+    """The job was dropped before it started: its caller no longer wanted it."""
+
+class SignPool:
+    """
+    Order signing off the event loop, one signing thread per venue.
+
+        tx_info, err = await SIGNERS.run("lig", client.sign_create_order, ...)
+
+    Lighter signs in its Go library (ctypes drops the GIL for the call),
+    Extended builds and Stark-signs the order object in the SDK. Each venue
+    gets its own single thread: the two legs of a trade sign in parallel,
+    the orders of one venue stay in sequence (one signer state per library),
+    and the loop keeps serving the websockets meanwhile. A job queued under
+    STALE is skipped when it has gone stale by the time the thread gets to
+    it, so a discarded presign never sits in front of a trade's signature.
+    """
+    def __init__(self):
+        self.executors          = {}
+        self.stats              = {}
+
+    def _executor(self, venue: str) -> ThreadPoolExecutor:
+        executor                = self.executors.get(venue)
+        if executor is None:
+            executor            = self.executors[venue] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sign-{venue}")
+        return executor
+
+    async def run(self, venue: str, fn, *args, **kwargs):
+        loop                    = asyncio.get_running_loop()
+        start                   = time.perf_counter()
+        stats                   = self.stats.setdefault(venue, {"count": 0, "skipped": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stale                   = STALE.get()
+        job                     = functools.partial(fn, *args, **kwargs)
+        if stale is not None:
+            job                 = functools.partial(self._unlessStale, stale, job, stats)
+        try:
+            return await loop.run_in_executor(self._executor(venue), job)
+        finally:
+            ms                  = (time.perf_counter() - start) * 1000
+            stats["count"]      += 1
+            stats["total_ms"]   += ms
+            stats["max_ms"]     = max(stats["max_ms"], ms)
+
+    @staticmethod
+    def _unlessStale(stale, job, stats):
+        # on the signing thread: the awaiting task may be cancelled already
+        if stale():
+            stats["skipped"]    += 1
+            raise Stale
+        return job()
+
+    def fmtSummary(self) -> str:
+        parts                   = []
+        for venue, s in self.stats.items():
+            avg                 = s["total_ms"] / s["count"] if s["count"] else 0.0
+            parts.append        (f"{venue}: {s['count']} signed avg={avg:.2f}ms max={s['max_ms']:.2f}ms skipped={s['skipped']}")
+        return " | ".join(parts) or "nothing signed yet"
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown   (wait=False)
+        self.executors          = {}
+
+# one signing thread per venue per process, shared by every pair in it
+SIGNERS                         = SignPool()
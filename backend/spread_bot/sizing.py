@@ -0,0 +1,72 @@
+def calc_vwap_qty(buyLevels, sellLevels, minSpread, maxQty, percOfOb=1.0):
+    """
+    Depth-aware sizing for one arbitrage direction.
+
+    buyLevels  : asks of the venue we BUY on,  best first [(price, size), ...]
+    sellLevels : bids of the venue we SELL on, best first [(price, size), ...]
+    minSpread  : marginal spread (%) every consumed slice must still beat
+    maxQty     : hard cap in base units (MAX_TRADE_VALUE / price)
+    percOfOb   : fraction of each visible level we allow ourselves to take
+
+    Both ladders are walked together (one merge pass, O(N) for N levels per
+    side). Deliberately a plain loop rather than vectorized: N is OB_DEPTH
+    (a handful of levels), where building arrays costs more than the walk,
+    and numpy is not a runtime dependency of the bot. A slice is taken while its marginal spread (bid - ask) / ask * 100
+    beats minSpread, so the result is the largest qty whose last unit is
+    still profitable at the threshold.
+
+    Returns a dict:
+      qty         : executable qty (0.0 if even the top slice fails)
+      vwapSpread  : spread (%) between sell VWAP and buy VWAP for that qty
+      worstBuy    : deepest ask price consumed (limit price for the buy leg)
+      worstSell   : deepest bid price consumed (limit price for the sell leg)
+      levels      : (buyLevelsUsed, sellLevelsUsed)
+    """
+    result                      = {"qty": 0.0, "vwapSpread": None, "worstBuy": None, "worstSell": None, "levels": (0, 0)}
+    if not buyLevels or not sellLevels or maxQty <= 0:
+        return result
+
+    nBuy, nSell                 = len(buyLevels), len(sellLevels)
+    i, j                        = 0, 0
+    remBuy                      = buyLevels[0][1] * percOfOb
+    remSell                     = sellLevels[0][1] * percOfOb
+    qty                         = 0.0
+    buyNotional                 = 0.0
+    sellNotional                = 0.0
+    worstBuy, worstSell         = None, None
+    lastI, lastJ                = -1, -1
+
+    while i < nBuy and j < nSell and qty < maxQty:
+        askPx                   = buyLevels[i][0]
+        bidPx                   = sellLevels[j][0]
+        if askPx <= 0 or (bidPx - askPx) / askPx * 100 <= minSpread:
+            break
+
+        take                    = min(remBuy, remSell, maxQty - qty)
+        if take > 0:
+            qty                 += take
+            buyNotional         += take * askPx
+            sellNotional        += take * bidPx
+            worstBuy, worstSell = askPx, bidPx
+            lastI, lastJ        = i, j
+        remBuy                  -= take
+        remSell                 -= take
+
+        if remBuy <= 1e-12:
+            i                   += 1
+            remBuy              = buyLevels[i][1] * percOfOb if i < nBuy else 0.0
+        if remSell <= 1e-12:
+            j                   += 1
+            remSell             = sellLevels[j][1] * percOfOb if j < nSell else 0.0
+
+    if qty <= 0:
+        return result
+
+    vwapBuy                     = buyNotional / qty
+    vwapSell                    = sellNotional / qty
+    result["qty"]               = qty
+    result["vwapSpread"]        = (vwapSell - vwapBuy) / vwapBuy * 100
+    result["worstBuy"]          = worstBuy
+    result["worstSell"]         = worstSell
+    result["levels"]            = (lastI + 1, lastJ + 1)
+    return result
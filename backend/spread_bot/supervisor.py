@@ -0,0 +1,269 @@
+import sys
+import os
+import json
+import time
+import asyncio
+import logging
+import logging.handlers
+import contextvars
+from aiohttp import web
+from dotenv import load_dotenv
+
+import main as bot
+from main import make_log_handler, PairRestart, load_config, LOG_FORMAT
+from telegram_api import send_tele_crit, TELEGRAM
+from http_session import SESSIONS
+
+# Hosts many (symbolL, symbolE) pairs in one event loop instead of one
+# screen + python process per pair. All pairs share one Lighter SignerClient,
+# one Lighter socket (helper_lighter.STREAM), and one set of Extended clients.
+#
+#   cd backend && python3 -u spread_bot/supervisor.py           # restore last running pairs
+#   cd backend && python3 -u spread_bot/supervisor.py --all     # start every pair in config.json
+#   cd backend && python3 -u spread_bot/supervisor.py MEGA MEGA-USD MON MON-USD
+
+load_dotenv()
+logger                          = logging.getLogger("supervisor")
+logger.setLevel                 (logging.INFO)
+
+CURRENT_PAIR                    = contextvars.ContextVar("CURRENT_PAIR", default=None)
+STATE_PATH                      = "spread_bot/logs/supervisor_pairs.json"
+CONTROL_HOST                    = os.getenv("SUPERVISOR_HOST", "127.0.0.1")
+CONTROL_PORT                    = int(os.getenv("SUPERVISOR_PORT", "8765"))
+# crash restarts: 1s, 2s, 4s, ... up to CRASH_MAX_DELAY; a pair crashing CRASH_LIMIT
+# times in a row is stopped; CRASH_RESET_AFTER seconds of clean running clear the count
+CRASH_LIMIT                     = int(os.getenv("SUPERVISOR_CRASH_LIMIT", "5"))
+CRASH_MAX_DELAY                 = 300.0
+CRASH_RESET_AFTER               = 600.0
+
+
+class PairLogFilter(logging.Filter):
+    """Keep only records emitted from inside one pair's tasks."""
+    def __init__(self, tag):
+        super().__init__()
+        self.tag                = tag
+
+    def filter(self, record):
+        return CURRENT_PAIR.get() == self.tag
+
+
+class Supervisor:
+    def __init__(self):
+        self.pairs              = {}
+
+    @staticmethod
+    def tagOf(symbolL, symbolE):
+        # same name as the screen session, so the panel's running list is unchanged
+        return f"arb_{symbolL}_{symbolE}"
+
+    @staticmethod
+    def findCfg(symbolL):
+        configs                 = load_config()
+        return next((item for item in configs["symbols"] if item["SYMBOL_LIGHTER"] == symbolL), None)
+
+    def running(self):
+        return [tag for tag, p in self.pairs.items() if not p["task"].done()]
+
+    def status(self):
+        return {
+            tag                 : {
+                "symbolL"       : p["symbolL"],
+                "symbolE"       : p["symbolE"],
+                "restarts"      : p["restarts"],
+                "started"       : p["started"],
+                "running"       : not p["task"].done(),
+            }
+            for tag, p in self.pairs.items()
+        }
+
+    def start(self, symbolL, symbolE):
+        tag                     = self.tagOf(symbolL, symbolE)
+        if tag in self.running():
+            return False
+        if self.findCfg(symbolL) is None:
+            raise ValueError(f"Symbol {symbolL} not found in config.json")
+        self._detach            (tag)       # stale entry of a pair that exited by itself
+
+        handler                 = make_log_handler(symbolL, symbolE)
+        handler.addFilter       (PairLogFilter(tag))
+        logging.root.addHandler (handler)
+
+        # every task the pair spawns inherits this context, so its logs land in its own file
+        ctx                     = contextvars.copy_context()
+        ctx.run                 (CURRENT_PAIR.set, tag)
+        task                    = asyncio.get_running_loop().create_task(self._runPair(symbolL, symbolE), context=ctx)
+
+        self.pairs[tag]         = {
+            "symbolL"           : symbolL,
+            "symbolE"           : symbolE,
+            "task"              : task,
+            "handler"           : handler,
+            "restarts"          : 0,
+            "started"           : time.time(),
+        }
+        self._save              ()
+        logger.info             (f"▶️ {tag} started")
+        return True
+
+    async def stop(self, symbolL, symbolE):
+        tag                     = self.tagOf(symbolL, symbolE)
+        p                       = self.pairs.get(tag)
+        if not p:
+            return False
+        p["task"].cancel        ()
+        try:
+            await p["task"]
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._detach            (tag)
+        logger.info             (f"⏹ {tag} stopped")
+        return True
+
+    def _detach(self, tag, task=None):
+        p                       = self.pairs.get(tag)
+        if p and (task is None or p["task"] is task):
+            del self.pairs[tag]
+            logging.root.removeHandler(p["handler"])
+            p["handler"].close  ()
+            bot._balance_state.pop(p["symbolL"], None)
+        self._save              ()
+
+    async def _runPair(self, symbolL, symbolE):
+        tag                     = self.tagOf(symbolL, symbolE)
+        crashes                 = 0
+        while True:
+            # reload on every (re)start so config edits apply like a fresh process
+            cfg                 = self.findCfg(symbolL)
+            if cfg is None:
+                logging.error   (f"❌ Symbol {symbolL} not found in config.json")
+                break
+            startedAt           = time.monotonic()
+            delay               = 1.0
+            try:
+                await bot.main  (symbolL, symbolE, cfg, shared=True)
+                break
+            except PairRestart as e:
+                logging.info    (f"🔁 {tag} restarting in-process: {e}")
+            except SystemExit:
+                # the bot stopped itself (min size / balancing guard), same as the process exiting
+                logging.info    (f"⛔ {tag} exited")
+                break
+            except Exception as e:
+                if time.monotonic() - startedAt >= CRASH_RESET_AFTER:
+                    crashes     = 0
+                crashes         += 1
+                logging.exception(f"❌ {tag} crashed ({crashes}/{CRASH_LIMIT}): {e}")
+                if crashes >= CRASH_LIMIT:
+                    # crashes on every start: stop instead of hammering the REST endpoints
+                    await send_tele_crit(f"⛔ {tag} crashed {crashes} times in a row, STOPPED: {e}\nFix and start it again.")
+                    break
+                delay           = min(CRASH_MAX_DELAY, 2.0 ** (crashes - 1))
+                if crashes == 1:
+                    await send_tele_crit(f"❌ {tag} crashed: {e}\nRestarting in-process...")
+
+            bot._balance_state.pop(symbolL, None)
+            if tag in self.pairs:
+                self.pairs[tag]["restarts"] += 1
+            await asyncio.sleep (delay)
+
+        # stopped by itself (not via stop()): drop it from the running set
+        asyncio.get_running_loop().call_soon(self._detach, tag, asyncio.current_task())
+
+    def _save(self):
+        os.makedirs             (os.path.dirname(STATE_PATH), exist_ok=True)
+        pairs                   = [[p["symbolL"], p["symbolE"]] for p in self.pairs.values()]
+        with open(STATE_PATH, "w") as f:
+            json.dump           (pairs, f)
+
+    @staticmethod
+    def loadSaved():
+        if not os.path.exists(STATE_PATH):
+            return []
+        try:
+            with open(STATE_PATH) as f:
+                return [tuple(p) for p in json.load(f)]
+        except Exception as e:
+            logger.warning      (f"⚠️ Could not read {STATE_PATH}: {e}")
+            return []
+
+
+# --- Control API (used by unified_backend) ---
+def build_app(sup: Supervisor):
+    async def pairs(request):
+        return web.json_response({"running": sup.running(), "pairs": sup.status()})
+
+    async def start(request):
+        symbolL, symbolE        = request.query.get("symbolL"), request.query.get("symbolE")
+        if not symbolL or not symbolE:
+            return web.json_response({"ok": False, "error": "symbolL and symbolE are required"}, status=400)
+        try:
+            if not sup.start(symbolL, symbolE):
+                return web.json_response({"ok": False, "error": f"{sup.tagOf(symbolL, symbolE)} is already running"}, status=409)
+            return web.json_response({"ok": True})
+        except ValueError as e:
+            return web.json_response({"ok": False, "error": str(e)}, status=404)
+        except Exception as e:
+            logger.exception    (f"❌ Could not start {symbolL} {symbolE}: {e}")
+            return web.json_response({"ok": False, "error": f"start failed: {e}"}, status=500)
+
+    async def stop(request):
+        symbolL, symbolE        = request.query.get("symbolL"), request.query.get("symbolE")
+        return web.json_response({"ok": await sup.stop(symbolL, symbolE)})
+
+    app                         = web.Application()
+    app.router.add_get          ("/pairs", pairs)
+    app.router.add_post         ("/start", start)
+    app.router.add_post         ("/stop",  stop)
+    return app
+
+
+def setup_logging():
+    os.makedirs                 ("spread_bot/logs", exist_ok=True)
+    for h in logging.root.handlers[:]:
+        logging.root.removeHandler(h)
+    logging.basicConfig(
+        level                   = logging.INFO,
+        format                  = LOG_FORMAT,
+        handlers                = [
+            logging.handlers.RotatingFileHandler("spread_bot/logs/supervisor.log", maxBytes=10 * 1024 * 1024, backupCount=3),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+
+async def run(args):
+    bot.SUPERVISED              = True
+    sup                         = Supervisor()
+
+    runner                      = web.AppRunner(build_app(sup))
+    await runner.setup          ()
+    await web.TCPSite(runner, CONTROL_HOST, CONTROL_PORT).start()
+    logger.info                 (f"✅ Supervisor control API on {CONTROL_HOST}:{CONTROL_PORT}")
+
+    if args == ["--all"]:
+        initial                 = [(s["SYMBOL_LIGHTER"], s["SYMBOL_EXTENDED"]) for s in load_config()["symbols"]]
+    elif args:
+        initial                 = list(zip(args[0::2], args[1::2]))
+    else:
+        initial                 = Supervisor.loadSaved()
+
+    for symbolL, symbolE in initial:
+        try:
+            sup.start           (symbolL, symbolE)
+        except ValueError as e:
+            logger.error        (f"❌ {e}")
+
+    try:
+        while True:
+            await asyncio.sleep (60)
+            logger.info         (f"🌐 HTTP {SESSIONS.fmtSummary()} | 📨 Telegram {TELEGRAM.stats}")
+    finally:
+        # pairs are not stop()ped here so the saved set is restored on the next start
+        await runner.cleanup    ()
+        await TELEGRAM.flush    (timeout=5)
+        await SESSIONS.closeAll ()
+
+
+if __name__ == "__main__":
+    setup_logging               ()
+    asyncio.run                 (run(sys.argv[1:]))
@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+
+# When the data pipeline (db_lig / db_ext main) syncs trades and fundings.
+#
+#   bot      : FILLS.notify("lig", "ETH")             # position changed on the account stream
+#   pipeline : hub = FillHub(); await hub.start()
+#              sched = SyncScheduler("lig"); hub.register(sched)
+#              while True:
+#                  due = await sched.wait()           # {"trades"} or {"trades", "funding"}
+#                  ...
+#                  sched.done(newTrades, newFundings)
+#
+# Trades: a fill signal triggers a sync fillDelay seconds later (fills of a
+# burst coalesce, and the venue REST has time to list them). Without fills the
+# delay doubles after every sync that found nothing new, from baseDelay up to
+# maxDelay, and snaps back to baseDelay when trades show up.
+# Fundings: both venues settle hourly, so they are pulled fundingLag seconds
+# after each boundary (retrying a few times while nothing new is posted)
+# instead of on every sync.
+#
+# Each scheduler writes its timings to the status file (unified_backend serves
+# it on /api/sync_status). Stdlib only: bots import this module too.
+
+logger                          = logging.getLogger("sync_scheduler")
+logger.setLevel                 (logging.INFO)
+
+def socket_path():
+    return os.getenv("FILL_SOCKET", "/tmp/arbspread_fills.sock")
+
+def status_path():
+    return os.getenv("SYNC_STATUS", "/tmp/arbspread_sync.json")
+
+
+class FillSignal:
+    """
+    Bot side: fire-and-forget datagram per fill, at most one per venue every
+    minGap seconds (the pipeline only needs to know that something happened).
+    """
+    def __init__(self, minGap: float = 1.0):
+        self.sock               = None
+        self.minGap             = minGap
+        self.lastSent           = {}
+        self.stats              = {"sent": 0, "throttled": 0, "dropped": 0}
+
+    def notify(self, venue: str, symbol: str = ""):
+        now                     = time.monotonic()
+        if now - self.lastSent.get(venue, -self.minGap) < self.minGap:
+            self.stats["throttled"] += 1
+            return
+        self.lastSent[venue]    = now
+
+        if self.sock is None:
+            self.sock           = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.setblocking(False)
+        msg                     = json.dumps({"venue": venue, "symbol": symbol, "ts": round(time.time(), 3)})
+        try:
+            self.sock.sendto    (msg.encode(), socket_path())
+            self.stats["sent"]  += 1
+        except OSError:
+            # data pipeline not running: it syncs on its own schedule
+            self.stats["dropped"] += 1
+
+
+class SyncScheduler:
+    def __init__(self, venue: str,
+                 baseDelay: float = 60.0, maxDelay: float = 900.0, fillDelay: float = 3.0,
+                 fundingInterval: int = 3600, fundingLag: float = 90.0, fundingRetries: int = 2):
+        self.venue              = venue
+        self.baseDelay          = baseDelay
+        self.maxDelay           = maxDelay
+        self.fillDelay          = fillDelay
+        self.fundingInterval    = fundingInterval
+        self.fundingLag         = fundingLag
+        self.fundingRetries     = fundingRetries
+
+        self.delay              = baseDelay
+        self.nextRun            = time.time()            # first sync right away,
+        self.nextFunding        = time.time()            # fundings included
+        self.retriesLeft        = 0                      # startup pull: no retries
+        self.started            = 0.0
+        self.lastFill           = 0.0
+        self.due                = set()
+        self.wake               = asyncio.Event()
+        self.status             = {"venue": venue, "runs": 0, "fills": 0, "last": None}
+
+    # ------------------------------------------------------------------
+    # Signals
+    # ------------------------------------------------------------------
+    def onFill(self, symbol: str = ""):
+        """Pull the next sync in to fillDelay from now (never later than planned)."""
+        self.lastFill           = time.time()
+        self.status["fills"]    += 1
+        self.status["lastFill"] = {"ts": round(self.lastFill, 3), "symbol": symbol}
+        at                      = self.lastFill + self.fillDelay
+        if at < self.nextRun:
+            self.nextRun        = at
+            self.wake.set       ()
+            self._save          ()
+
+    def _boundaryAfter(self, ts: float) -> float:
+        return (ts // self.fundingInterval + 1) * self.fundingInterval + self.fundingLag
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+    async def wait(self) -> set:
+        """Sleep until the next sync is due; returns what to pull."""
+        while True:
+            at                  = min(self.nextRun, self.nextFunding)
+            remaining           = at - time.time()
+            if remaining <= 0:
+                break
+            self.wake.clear     ()
+            try:
+                await asyncio.wait_for(self.wake.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        now                     = time.time()
+        self.due                = {"trades"}
+        if now >= self.nextFunding:
+            self.due.add        ("funding")
+        self.started            = now
+        return set(self.due)
+
+    def done(self, newTrades: int = 0, newFundings: int = 0, failed: bool = False):
+        """Record a finished sync and plan the next one."""
+        now                     = time.time()
+        if failed or newTrades:
+            self.delay          = self.baseDelay
+        else:
+            self.delay          = min(self.delay * 2, self.maxDelay)
+        self.nextRun            = now + self.delay
+        if self.lastFill > self.started:
+            # filled while this sync was running: its trades may not be in yet
+            self.nextRun        = min(self.nextRun, now + self.fillDelay)
+
+        if "funding" in self.due:
+            if failed:
+                self.nextFunding= now + self.fundingLag
+            elif not newFundings and self.retriesLeft > 0:
+                # boundary pull found nothing yet: payments may still be settling
+                self.retriesLeft-= 1
+                self.nextFunding= now + self.fundingLag
+            else:
+                self.retriesLeft= self.fundingRetries
+                self.nextFunding= self._boundaryAfter(now)
+
+        self.status["runs"]     += 1
+        self.status["last"]     = {
+            "start"             : round(self.started, 3),
+            "seconds"           : round(now - self.started, 3),
+            "pulled"            : sorted(self.due),
+            "newTrades"         : newTrades,
+            "newFundings"       : newFundings,
+            "failed"            : failed,
+        }
+        self._save              ()
+
+    def fmtNext(self) -> str:
+        now                     = time.time()
+        return f"next trades in {self.nextRun - now:.0f}s, fundings in {self.nextFunding - now:.0f}s"
+
+    # ------------------------------------------------------------------
+    # Status file (one key per venue)
+    # ------------------------------------------------------------------
+    def snapshot(self) -> dict:
+        return {
+            **self.status,
+            "delay"             : self.delay,
+            "nextRun"           : round(self.nextRun, 3),
+            "nextFunding"       : round(self.nextFunding, 3),
+        }
+
+    def _save(self):
+        path                    = status_path()
+        try:
+            with open(path, encoding="utf-8") as f:
+                state           = json.load(f)
+        except (FileNotFoundError, ValueError):
+            state               = {}
+        state[self.venue]       = self.snapshot()
+        tmp                     = f"{path}.{self.venue}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump       (state, f)
+            os.replace          (tmp, path)
+        except OSError as e:
+            logger.warning      (f"⚠️ Sync status not saved: {e}")
+
+
+class FillHub:
+    """Pipeline side: receives fill datagrams and wakes the venue's scheduler."""
+    def __init__(self):
+        self.schedulers         = {}
+        self.transport          = None
+
+    def register(self, scheduler: SyncScheduler):
+        self.schedulers[scheduler.venue] = scheduler
+
+    async def start(self):
+        path                    = socket_path()
+        if os.path.exists(path):
+            os.unlink           (path)
+        hub                     = self
+
+        class _Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                hub._receive    (data)
+
+        loop                    = asyncio.get_running_loop()
+        self.transport, _       = await loop.create_datagram_endpoint(
+            _Protocol, local_addr=path, family=socket.AF_UNIX
+        )
+        logger.info             (f"✅ Fill hub listening on {path}")
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+
+    def _receive(self, data: bytes):
+        try:
+            msg                 = json.loads(data)
+            scheduler           = self.schedulers.get(msg["venue"])
+        except Exception as e:
+            logger.warning      (f"⚠️ Bad fill datagram: {e}")
+            return
+        if scheduler:
+            scheduler.onFill    (msg.get("symbol") or "")
+
+
+def read_status() -> dict:
+    """Scheduler timings of every venue, as last written by the pipeline."""
+    try:
+        with open(status_path(), encoding="utf-8") as f:
+            return json.load    (f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+# one signal per bot process, one hub per pipeline process
+FILLS                           = FillSignal()
+FILL_HUB                        = FillHub()
@@ -1,50 +1,175 @@
 import os
-import aiohttp
+import time
 import asyncio
+import logging
+import contextvars
+from collections import deque
 from dotenv import load_dotenv
+from http_session import SESSIONS
 
 load_dotenv()
 
+logger                  = logging.getLogger("telegram_api")
+logger.setLevel         (logging.INFO)
+
 TELEGRAM_BOT_TOKEN      = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID        = os.getenv("TELEGRAM_CHAT_ID")
 CRIT_TELEGRAM_CHAT_ID   = os.getenv("CRIT_TELEGRAM_CHAT_ID")
 
-async def send_tele_crit(message: str):
-    if not TELEGRAM_BOT_TOKEN or not CRIT_TELEGRAM_CHAT_ID:
-        raise RuntimeError("CRIT_TELEGRAM_BOT_TOKEN and CRIT_TELEGRAM_CHAT_ID must be set in .env")
+PRIO_LOW                = 0
+PRIO_NORMAL             = 1
+PRIO_HIGH               = 2
+
+MAX_MESSAGE_LEN         = 4000      # Telegram hard limit is 4096
+
+
+class _Rejected(Exception):
+    """4xx from Telegram: retrying the same payload will not help."""
+
+
+class TelegramQueue:
+    """
+    Outbound Telegram queue: callers enqueue and return immediately, one
+    background worker per chat does the sending.
+
+    - rate limit : at most one request per chat every minInterval seconds,
+                   and 429 retry_after is honoured
+    - batching   : consecutive queued messages with the same parse mode are
+                   merged into one request (up to MAX_MESSAGE_LEN)
+    - overload   : above maxPending the oldest lowest-priority message is
+                   dropped; PRIO_HIGH messages are never dropped
+    - retries    : network errors / 5xx back off exponentially, 4xx are dropped
+    """
+    def __init__(self, maxPending=50, minInterval=1.0, maxRetries=5):
+        self.maxPending         = maxPending
+        self.minInterval        = minInterval
+        self.maxRetries         = maxRetries
+        self.chats              = {}
+        self.stats              = {"queued": 0, "sent": 0, "merged": 0, "dropped": 0, "failed": 0}
+
+    def _chat(self, chatId):
+        chat                    = self.chats.get(chatId)
+        if chat is None:
+            chat                = self.chats[chatId] = {
+                "pending"       : deque(),
+                "event"         : asyncio.Event(),
+                "busy"          : False,
+                "lastSend"      : 0.0,
+                "task"          : None,
+            }
+        if chat["task"] is None or chat["task"].done():
+            # fresh context: the worker must not inherit the first caller's log context
+            chat["task"]        = asyncio.get_running_loop().create_task(self._worker(chatId), context=contextvars.Context())
+        return chat
+
+    def put(self, chatId, text, parseMode=None, priority=PRIO_NORMAL):
+        chat                    = self._chat(chatId)
+        pending                 = chat["pending"]
+
+        if len(pending) >= self.maxPending:
+            lowest              = min(item["priority"] for item in pending)
+            if lowest < PRIO_HIGH and lowest <= priority:
+                victim          = next(item for item in pending if item["priority"] == lowest)
+                pending.remove  (victim)
+                self.stats["dropped"] += 1
+            elif priority < PRIO_HIGH:
+                self.stats["dropped"] += 1
+                logger.warning  ("⚠️ Telegram queue full, message dropped")
+                return
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": CRIT_TELEGRAM_CHAT_ID,
-        "text": message,
-    }
+        pending.append          ({"text": text, "parseMode": parseMode, "priority": priority})
+        self.stats["queued"]    += 1
+        chat["event"].set       ()
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload) as resp:
-            if resp.status != 200:
-                error_text = await resp.text()
-                raise RuntimeError(f"Telegram send failed: {resp.status} {error_text}")
+    def _takeBatch(self, pending):
+        first                   = pending.popleft()
+        text                    = first["text"]
+        while pending and pending[0]["parseMode"] == first["parseMode"] \
+                and len(text) + 2 + len(pending[0]["text"]) <= MAX_MESSAGE_LEN:
+            text                += "\n\n" + pending.popleft()["text"]
+            self.stats["merged"] += 1
+        return text, first["parseMode"]
+
+    async def _worker(self, chatId):
+        chat                    = self.chats[chatId]
+        while True:
+            if not chat["pending"]:
+                chat["event"].clear()
+                await chat["event"].wait()
+                continue
+
+            wait                = chat["lastSend"] + self.minInterval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            chat["busy"]        = True
+            try:
+                text, parseMode = self._takeBatch(chat["pending"])
+                await self._send(chatId, text, parseMode)
+            finally:
+                chat["busy"]        = False
+                chat["lastSend"]    = time.monotonic()
+
+    async def _send(self, chatId, text, parseMode):
+        url                     = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+        payload                 = {"chat_id": chatId, "text": text}
+        if parseMode:
+            payload["parse_mode"] = parseMode
+
+        for attempt in range(1, self.maxRetries + 1):
+            try:
+                async with SESSIONS.session("telegram") as session:
+                    async with session.post(url, json=payload) as resp:
+                        if resp.status == 200:
+                            self.stats["sent"] += 1
+                            return
+                        if resp.status == 429:
+                            body        = await resp.json(content_type=None)
+                            await asyncio.sleep((body.get("parameters") or {}).get("retry_after", 1))
+                            continue
+                        error_text      = await resp.text()
+                        if resp.status < 500:
+                            raise _Rejected(f"{resp.status} {error_text}")
+                        raise RuntimeError(f"Telegram send failed: {resp.status} {error_text}")
+            except _Rejected as e:
+                logger.error    (f"❌ Telegram rejected message: {e}")
+                break
+            except Exception as e:
+                logger.warning  (f"⚠️ Telegram send attempt {attempt}/{self.maxRetries} failed: {e}")
+                await asyncio.sleep(min(2 ** (attempt - 1), 30))
+        self.stats["failed"]    += 1
+
+    def idle(self) -> bool:
+        return all(not c["pending"] and not c["busy"] for c in self.chats.values())
+
+    async def flush(self, timeout=5.0):
+        """Wait (bounded) until everything queued so far is sent; call before exiting."""
+        deadline                = time.monotonic() + timeout
+        while not self.idle() and time.monotonic() < deadline:
+            await asyncio.sleep (0.05)
+        return self.idle()
+
+
+# one queue per process
+TELEGRAM                = TelegramQueue()
+
+
+async def send_tele_crit(message: str, priority=PRIO_HIGH):
+    """Queue a message for the critical-alerts chat. Never blocks on the network."""
+    if not TELEGRAM_BOT_TOKEN or not CRIT_TELEGRAM_CHAT_ID:
+        logger.error("CRIT_TELEGRAM_BOT_TOKEN and CRIT_TELEGRAM_CHAT_ID must be set in .env")
+        return
+    TELEGRAM.put(CRIT_TELEGRAM_CHAT_ID, message, priority=priority)
 
 
-async def send_telegram_message(message: str):
+async def send_telegram_message(message: str, priority=PRIO_NORMAL):
     """
-    Send a plain text message to a Telegram chat.
+    Queue a plain text message for the main chat. Never blocks on the network.
     """
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-        raise RuntimeError("TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID must be set in .env")
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": message,
-        "parse_mode": "html"
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload) as resp:
-            if resp.status != 200:
-                error_text = await resp.text()
-                raise RuntimeError(f"Telegram send failed: {resp.status} {error_text}")
+        logger.error("TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID must be set in .env")
+        return
+    TELEGRAM.put(TELEGRAM_CHAT_ID, message, parseMode="html", priority=priority)
 
 
 def format_position_info(pos: dict, name: str) -> str:
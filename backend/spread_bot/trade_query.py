@@ -0,0 +1,176 @@
+import os
+import json
+import base64
+import hashlib
+import threading
+from bisect import bisect_left, bisect_right
+
+from spread_bot.incremental import Amended, read_appended
+
+# In-memory query index over a merged trade CSV (fifo/cycle _allSymbols.csv),
+# served by the /get_trades_* endpoints.
+#
+#   index   = TradeIndex("db_lig/cycle/_allSymbols.csv", frozenEnd=...)
+#   rows, nextCursor = index.query(symbols=["ETH-USD"], since="2025-01-01", limit=200)
+#
+# The file is stat()ed on every query and re-read only when its (inode, mtime,
+# size) changed. The merged views are append-only, so a change normally means
+# reading the appended rows; frozenEnd() (optional) gives the byte offset where
+# rows stop being final (open cycles are rewritten at the end of the cycle
+# view), so only that trailer is re-read. A rewritten file is reloaded whole.
+#
+# Rows are ordered by (open, time, seq): time is readable_time (fifo) or
+# exit_time / entry_time (cycles), open cycles sort after every closed row
+# and seq is the position in the file. Pagination is keyset: the cursor is the
+# key of the last row returned, so pages stay stable while rows are appended.
+
+TIME_MAX                        = "\uffff"
+
+
+def row_key(row: dict, seq: int) -> tuple:
+    if "readable_time" in row:
+        return (0, row.get("readable_time") or "", seq)
+    if row.get("exit_time"):
+        return (0, row["exit_time"], seq)
+    return (1, row.get("entry_time") or "", seq)
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Raises ValueError on anything that is not a cursor we issued."""
+    try:
+        raw                     = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        isOpen, time, seq       = json.loads(raw)
+        return (int(isOpen), str(time), int(seq))
+    except Exception as e:
+        raise ValueError        (f"bad cursor: {cursor!r}") from e
+
+
+class _View:
+    """Sorted keys + rows of one symbol (or all symbols)."""
+
+    def __init__(self, entries: list):
+        entries.sort            (key=lambda e: e[0])
+        self.keys               = [e[0] for e in entries]
+        self.rows               = [e[1] for e in entries]
+
+    def span(self, isOpen: int, since: str | None, until: str | None) -> tuple[int, int]:
+        lo                      = bisect_left(self.keys, (isOpen, since or ""))
+        hi                      = bisect_right(self.keys, (isOpen, (until or "") + TIME_MAX))
+        return lo, hi
+
+
+class TradeIndex:
+    def __init__(self, path: str, frozenEnd=None):
+        self.path               = path
+        self.frozenEnd          = frozenEnd             # () -> byte offset of the final rows, or None
+        self.lock               = threading.Lock()
+        self.sig                = None
+        self.cursor             = None
+        self.frozen             = []                    # [(key, row)] up to cursor, never re-read
+        self.tail               = []                    # [(key, row)] after cursor, re-read on change
+        self.views              = {}
+        self.version            = 0
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def signature(self):
+        try:
+            st                  = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def etag(self, *params) -> str:
+        """Changes whenever the file or the query does (cheap: one stat)."""
+        h                       = hashlib.blake2b(repr((self.signature(), params)).encode(), digest_size=12)
+        return f'"{h.hexdigest()}"'
+
+    def _entries(self, rows: list, start: int) -> list:
+        return [(row_key(r, start + i), r) for i, r in enumerate(rows)]
+
+    def _load(self, sig):
+        if sig is None:
+            self.cursor, self.frozen, self.tail = None, [], []
+            return
+        end                     = self.frozenEnd() if self.frozenEnd else None
+        try:
+            rows, cursor        = read_appended(self.path, self.cursor, end)
+            frozen              = self.frozen + self._entries(rows, len(self.frozen))
+        except Amended:
+            rows, cursor        = read_appended(self.path, None, end)
+            frozen              = self._entries(rows, 0)
+        tail                    = []
+        if end is not None:
+            rows, _             = read_appended(self.path, cursor)
+            tail                = self._entries(rows, len(frozen))
+        self.cursor, self.frozen, self.tail = cursor, frozen, tail
+
+    def refresh(self) -> bool:
+        """Re-read the file if it changed since the last call. Returns True if it did."""
+        with self.lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        sig                     = self.signature()
+        if sig == self.sig:
+            return False
+        self._load              (sig)
+        self.sig                = sig
+        self.views              = {}
+        self.version            += 1
+        return True
+
+    def invalidate(self):
+        """Force a reload on the next query."""
+        self.sig                = None
+
+    def _view(self, symbol: str | None) -> _View:
+        view                    = self.views.get(symbol)
+        if view is None:
+            entries             = self.frozen + self.tail
+            if symbol is not None:
+                entries         = [e for e in entries if (e[1].get("market") or "").upper() == symbol]
+            view                = self.views[symbol] = _View(entries)
+        return view
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+    def query(self, symbols=None, since=None, until=None, order="desc", limit=200, cursor=None):
+        """
+        Rows of the given markets (None = all) with since <= time <= until
+        (strings compared in the file's "YYYY-MM-DD HH:MM:SS" format, a date
+        alone works as a prefix), newest first by default. Returns
+        (rows, nextCursor); nextCursor is None on the last page.
+        """
+        after                   = decode_cursor(cursor) if cursor else None
+        desc                    = order != "asc"
+        wanted                  = sorted({s.strip().upper() for s in symbols or [] if s.strip()}) or [None]
+        picked                  = []
+        with self.lock:
+            self._refresh       ()
+            for sym in wanted:
+                view            = self._view(sym)
+                for isOpen in (0, 1):
+                    lo, hi      = view.span(isOpen, since, until)
+                    if after is not None:
+                        if desc:
+                            hi  = min(hi, bisect_left(view.keys, after, lo, hi))
+                        else:
+                            lo  = max(lo, bisect_right(view.keys, after, lo, hi))
+                    # limit + 1 rows of each range: enough for the page and to know if more follow
+                    if desc:
+                        lo      = max(lo, hi - limit - 1)
+                    else:
+                        hi      = min(hi, lo + limit + 1)
+                    picked.extend(zip(view.keys[lo:hi], view.rows[lo:hi]))
+
+        picked.sort             (key=lambda e: e[0], reverse=desc)
+        page                    = picked[:limit]
+        nextCursor              = encode_cursor(page[-1][0]) if len(picked) > limit else None
+        return [r for _, r in page], nextCursor
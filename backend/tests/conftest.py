@@ -0,0 +1,5 @@
+import os
+import sys
+
+# backend/ is the import root (db_lig, db_ext, spread_bot ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,209 @@
+"""
+Incremental FIFO (p_fifo.process_symbol_fifo) must give the same file as a
+from-scratch rebuild: raw/funding appends resume from the checkpoint, and
+anything that cannot extend it (same-second trade, late funding, rewritten
+raw file) falls back to a rebuild. Output is oldest first (append-only).
+"""
+import csv
+import random
+
+import pytest
+
+from db_ext import p_fifo as ext
+from db_lig import p_fifo as lig
+
+ACCOUNT = "7"
+OTHER   = "9"
+
+
+# --- venue adapters: raw/funding rows, processing and the engine reference
+class Lighter:
+    mod        = lig
+    stem       = "MEGA"
+    raw_fields = ["trade_id", "timestamp", "price", "size", "ask_account_id", "bid_account_id",
+                  "is_maker_ask", "maker_fee", "taker_fee", "usd_amount"]
+    ff_fields  = ["timestamp", "symbol", "change"]
+
+    @staticmethod
+    def trade(i, ts, qty, price):
+        buy = qty > 0
+        return {
+            "trade_id": str(i), "timestamp": str(ts), "price": str(price), "size": str(abs(qty)),
+            "ask_account_id": OTHER if buy else ACCOUNT, "bid_account_id": ACCOUNT if buy else OTHER,
+            "is_maker_ask": "true" if i % 2 else "false", "maker_fee": "0", "taker_fee": "200",
+            "usd_amount": str(abs(qty) * price),
+        }
+
+    @classmethod
+    def funding(cls, ts, amount):
+        return {"timestamp": str(ts), "symbol": cls.stem, "change": str(amount)}
+
+    @staticmethod
+    def run(src, dst, ff):
+        return lig.process_symbol_fifo(src, dst, ACCOUNT, ff)
+
+    @classmethod
+    def reference(cls, trades, fundings):
+        out = lig.fifo_process_apex(trades, cls.raw_fields, ACCOUNT, f"{cls.stem}-USD", {})
+        lig.attach_funding(out, lig.funding_items(fundings, cls.stem))
+        return out
+
+
+class Extended:
+    mod        = ext
+    stem       = "MEGA-USD"
+    raw_fields = ["id", "market", "created_time", "price", "qty", "side", "fee", "is_taker"]
+    ff_fields  = ["market", "paidTime", "fundingFee"]
+
+    @classmethod
+    def trade(cls, i, ts, qty, price):
+        return {
+            "id": str(i), "market": cls.stem, "created_time": str(ts * 1000), "price": str(price),
+            "qty": str(abs(qty)), "side": "BUY" if qty > 0 else "SELL",
+            "fee": str(round(abs(qty) * price * 0.00025, 6)), "is_taker": "true" if i % 2 else "false",
+        }
+
+    @classmethod
+    def funding(cls, ts, amount):
+        return {"market": cls.stem, "paidTime": str(ts * 1000), "fundingFee": str(amount)}
+
+    @staticmethod
+    def run(src, dst, ff):
+        return ext.process_symbol_fifo(src, dst, ff)
+
+    @classmethod
+    def reference(cls, trades, fundings):
+        out = ext.fifo_process_extended(trades, {})
+        ext.attach_funding(out, ext.funding_items(fundings, cls.stem))
+        return out
+
+
+@pytest.fixture(params=[Lighter, Extended], ids=["lighter", "extended"])
+def venue(request, tmp_path, monkeypatch):
+    v = request.param
+    monkeypatch.setattr(v.mod, "STATE_DIR", str(tmp_path / "state"))
+    (tmp_path / "state").mkdir()
+    return v
+
+
+# --- helpers
+def history(venue, n, start=1_700_000_000, seed=1):
+    """n trades flipping around flat, plus a funding every few trades."""
+    rnd = random.Random(seed)
+    trades, fundings, ts = [], [], start
+    for i in range(n):
+        ts += rnd.randint(5, 90)
+        qty = rnd.choice([-3, -2, -1, 1, 2, 3]) * 0.5
+        price = round(100 + rnd.uniform(-5, 5), 2)
+        trades.append(venue.trade(i, ts, qty, price))
+        if i % 4 == 3:
+            fundings.append(venue.funding(ts + 1, round(rnd.uniform(-0.5, 0.5), 4)))
+    return trades, fundings
+
+def ts_of(venue, row):
+    return venue.mod.parse_epochish(row.get("timestamp") or row.get("created_time") or row.get("paidTime"))
+
+def write_csv(path, fields, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        w.writerows(rows)
+
+def append_csv(path, fields, rows):
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        csv.DictWriter(f, fieldnames=fields).writerows(rows)
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def normalized(venue, rows):
+    return [{k: str(r.get(k, "")) for k in venue.mod.OUTPUT_FIELDS} for r in rows]
+
+def paths(tmp_path, venue):
+    return (str(tmp_path / f"{venue.stem}.csv"), str(tmp_path / f"fifo_{venue.stem}.csv"),
+            str(tmp_path / "funding.csv"))
+
+def assert_matches_rebuild(venue, tmp_path, monkeypatch, src, dst, ff, trades, fundings):
+    got = read_csv(dst)
+    assert got == normalized(venue, venue.reference(trades, fundings))
+
+    # a fresh checkpoint directory forces the from-scratch path
+    monkeypatch.setattr(venue.mod, "STATE_DIR", str(tmp_path / "state_fresh"))
+    (tmp_path / "state_fresh").mkdir(exist_ok=True)
+    fresh = str(tmp_path / "fifo_fresh.csv")
+    _, rebuilt = venue.run(src, fresh, ff)
+    assert rebuilt
+    assert read_csv(fresh) == got
+
+    times = [r["readable_time"] for r in got]
+    assert times == sorted(times), "FIFO output is oldest first"
+
+def run_in_chunks(venue, src, dst, ff, trades, fundings, chunks):
+    """Grow raw + funding chunk by chunk (fundings with the trades they follow)."""
+    step = -(-len(trades) // chunks)
+    write_csv(src, venue.raw_fields, [])
+    write_csv(ff, venue.ff_fields, [])
+    results, done_ff = [], 0
+    for k in range(0, len(trades), step):
+        part = trades[k:k + step]
+        last = ts_of(venue, part[-1]) if k + step < len(trades) else float("inf")
+        due = [f for f in fundings[done_ff:] if ts_of(venue, f) < last]
+        append_csv(src, venue.raw_fields, part)
+        append_csv(ff, venue.ff_fields, due)
+        done_ff += len(due)
+        results.append(venue.run(src, dst, ff))
+    return results
+
+
+# --- cases
+def test_appends_resume_from_checkpoint(venue, tmp_path, monkeypatch):
+    src, dst, ff = paths(tmp_path, venue)
+    trades, fundings = history(venue, 60)
+
+    results = run_in_chunks(venue, src, dst, ff, trades, fundings, chunks=6)
+
+    assert results[0][1] is True
+    assert [rebuilt for _, rebuilt in results[1:]] == [False] * (len(results) - 1)
+    assert sum(n for n, _ in results) == len(read_csv(dst))
+    # nothing new → nothing appended, still no rebuild
+    assert venue.run(src, dst, ff) == (0, False)
+    assert_matches_rebuild(venue, tmp_path, monkeypatch, src, dst, ff, trades, fundings)
+
+def test_same_second_trade_rebuilds(venue, tmp_path, monkeypatch):
+    src, dst, ff = paths(tmp_path, venue)
+    trades, fundings = history(venue, 30)
+    run_in_chunks(venue, src, dst, ff, trades, fundings, chunks=3)
+
+    tie = venue.trade(999, ts_of(venue, trades[-1]), -1.0, 101.5)
+    append_csv(src, venue.raw_fields, [tie])
+    _, rebuilt = venue.run(src, dst, ff)
+
+    assert rebuilt
+    assert_matches_rebuild(venue, tmp_path, monkeypatch, src, dst, ff, trades + [tie], fundings)
+
+def test_late_funding_rebuilds(venue, tmp_path, monkeypatch):
+    src, dst, ff = paths(tmp_path, venue)
+    trades, fundings = history(venue, 30)
+    run_in_chunks(venue, src, dst, ff, trades, fundings, chunks=3)
+
+    # paid before trades already written as closes
+    late = venue.funding(ts_of(venue, trades[5]), 0.25)
+    append_csv(ff, venue.ff_fields, [late])
+    _, rebuilt = venue.run(src, dst, ff)
+
+    assert rebuilt
+    assert_matches_rebuild(venue, tmp_path, monkeypatch, src, dst, ff, trades, fundings + [late])
+
+def test_rewritten_raw_file_rebuilds(venue, tmp_path, monkeypatch):
+    src, dst, ff = paths(tmp_path, venue)
+    trades, fundings = history(venue, 30)
+    run_in_chunks(venue, src, dst, ff, trades, fundings, chunks=3)
+
+    trades = [dict(t) for t in trades]
+    trades[3]["price"] = "123.45"
+    write_csv(src, venue.raw_fields, trades)
+    _, rebuilt = venue.run(src, dst, ff)
+
+    assert rebuilt
+    assert_matches_rebuild(venue, tmp_path, monkeypatch, src, dst, ff, trades, fundings)
@@ -1,8 +1,9 @@
 # unified_backend.py
-import os, json, asyncio, logging, subprocess, csv, re
+import os, json, time, asyncio, logging, subprocess, csv, re
+import aiohttp
 from typing import Dict, Any
 from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.staticfiles import StaticFiles
@@ -11,6 +12,14 @@ from dotenv import load_dotenv
 
 from db_lig.main import processDbLig
 from db_ext.main import processDbExt
+from db_lig import p_daily as daily_lig
+from db_ext import p_daily as daily_ext
+from spread_bot.log_tail import tail_lines
+from spread_bot.live_channel import LiveHub
+from spread_bot.trade_query import TradeIndex
+from spread_bot.incremental import load_state
+from spread_bot.dataset_events import DatasetWatcher
+from spread_bot import sync_scheduler
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +39,7 @@ def require_auth(credentials: HTTPBasicCredentials = Depends(security)):
 # --- Paths ---
 CONFIG_PATH     = "spread_bot/config.json"
 ENV_PATH        = ".env"
+SUPERVISOR_URL  = os.getenv("SUPERVISOR_URL", f"http://127.0.0.1:{os.getenv('SUPERVISOR_PORT', '8765')}")
 
 # --- App Init ---
 app = FastAPI(title="arbSpread Unified Backend")
@@ -40,6 +50,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 from fastapi import Request
@@ -137,6 +148,31 @@ def stop_screen(symbolL: str, symbolE: str):
         return False
 
 
+# --- Supervisor helpers ---
+# spread_bot/supervisor.py hosts many pairs in one process; when it is not
+# running we fall back to one screen session per pair.
+async def supervisor_call(method: str, path: str, **params):
+    """Returns the supervisor's JSON reply, or None when it is not reachable."""
+    try:
+        timeout = aiohttp.ClientTimeout(total=2)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.request(method, f"{SUPERVISOR_URL}{path}", params=params) as resp:
+                try:
+                    return await resp.json(content_type=None)
+                except ValueError:
+                    # it answered, just not with JSON (e.g. an unhandled error)
+                    return {"ok": False, "error": f"supervisor HTTP {resp.status}"}
+    except Exception:
+        return None
+
+async def list_running_bots():
+    running = list_running_screens()
+    sup = await supervisor_call("GET", "/pairs")
+    if sup:
+        running += [name for name in sup.get("running", []) if name not in running]
+    return running
+
+
 # --- Models ---
 class ConfigPayload(BaseModel):
     data: Dict[str, Any]
@@ -151,16 +187,23 @@ class EnvPayload(BaseModel):
 async def get_symbols():
     cfg = read_json(CONFIG_PATH)
     syms = [{"symbolL": s["SYMBOL_LIGHTER"], "symbolE": s["SYMBOL_EXTENDED"]} for s in cfg.get("symbols", [])]
-    return {"symbols": syms, "running": list_running_screens()}
+    return {"symbols": syms, "running": await list_running_bots()}
 
 @app.post("/api/start", dependencies=[Depends(require_auth)])
 async def start_bot(symbolL: str, symbolE: str):
-    start_screen(symbolL, symbolE)
-    return {"ok": True}
+    if any(f"arb_{symbolL}_{symbolE}" in s for s in list_running_screens()):
+        return {"ok": True}
+    sup = await supervisor_call("POST", "/start", symbolL=symbolL, symbolE=symbolE)
+    if sup is None:
+        start_screen(symbolL, symbolE)
+        return {"ok": True}
+    return {"ok": bool(sup.get("ok")), "error": sup.get("error")}
 
 @app.post("/api/stop", dependencies=[Depends(require_auth)])
 async def stop_bot(symbolL: str, symbolE: str):
-    return {"ok": stop_screen(symbolL, symbolE)}
+    stopped = stop_screen(symbolL, symbolE)
+    sup = await supervisor_call("POST", "/stop", symbolL=symbolL, symbolE=symbolE)
+    return {"ok": stopped or bool(sup and sup.get("ok"))}
 
 @app.get("/api/config", dependencies=[Depends(require_auth)])
 async def get_config():
@@ -207,101 +250,174 @@ def _read_csv_json(path: str, limit: Optional[int] = None):
                 break
     return rows
 
-# --- NEW: read multiple files & optional sort by readable_time desc ---
-def _read_csv_multi(paths: List[str], limit: Optional[int] = None, sort_desc_by_time: bool = True):
-    agg: List[dict] = []
-    for p in paths:
-        if os.path.exists(p):
-            agg.extend(_read_csv_json(p, limit=None))
-    if sort_desc_by_time:
-        # robust parse of "YYYY-MM-DD HH:MM:SS" if present; empty times float to top
-        def _key(r):
-            ts = r.get("readable_time") or r.get("exit_time") or r.get("entry_time") or ""
-            try:
-                dt = datetime.strptime(ts.strip(), "%Y-%m-%d %H:%M:%S") if ts else None
-            except Exception:
-                dt = None
-            # None should come first; then later times first (desc)
-            return (dt is not None, dt or datetime.min)
-        agg.sort(key=_key, reverse=True)
-    if limit:
-        agg = agg[:limit]
-    return agg
-
-def _paths_for(side: str, kind: str, symbols: Optional[List[str]]) -> List[str]:
+# --- Trade queries ---
+# One in-memory index per merged view, refreshed when the file changes on disk
+# (data_backend.py rewrites them every sync). The cycle views end with the open
+# cycles, rewritten each sync: frozenEnd points past the final rows so only
+# those are re-read.
+def _cycle_frozen_end(side: str):
+    state_path = f"db_{side}/cycle/_state/_allSymbols.json"
+    return lambda: ((load_state(state_path) or {}).get("out") or {}).get("offset")
+
+TRADE_INDEX = {
+    ("ext", "fifo"):  TradeIndex("db_ext/fifo/_allSymbols.csv"),
+    ("ext", "cycle"): TradeIndex("db_ext/cycle/_allSymbols.csv", frozenEnd=_cycle_frozen_end("ext")),
+    ("lig", "fifo"):  TradeIndex("db_lig/fifo/_allSymbols.csv"),
+    ("lig", "cycle"): TradeIndex("db_lig/cycle/_allSymbols.csv", frozenEnd=_cycle_frozen_end("lig")),
+}
+
+async def _query_trades(request: Request, side: str, kind: str, symbol: Optional[List[str]],
+                        since: Optional[str], until: Optional[str], order: str, limit: int, cursor: Optional[str]):
     """
-    side: 'ext' | 'lig'
-    kind: 'fifo' | 'cycle'
-    symbols: list of symbol strings (e.g., ["BTC-USD", "ETH-USD"]) or None
+    Filtered page of a merged trade view. symbol may repeat or be comma
+    separated; since/until compare against the row time ("YYYY-MM-DD" or
+    "YYYY-MM-DD HH:MM:SS"). The next page's cursor is in X-Next-Cursor.
+    Responses carry an ETag of (file state, query): an unchanged view answers
+    If-None-Match with 304 after a single stat().
     """
-    base = f"db_{'ext' if side=='ext' else 'lig'}/{kind}"
-    if not symbols:
-        return [f"{base}/_allSymbols.csv"]
-    paths = []
-    for s in symbols:
-        sym = str(s).strip().upper()
-        if not sym:
-            continue
-        # very light sanitization; adjust if your symbols can include other chars
-        sym = sym.replace("/", "-")
-        paths.append(f"{base}/_{sym}.csv")
-    return paths
-
-
+    index = TRADE_INDEX[(side, kind)]
+    symbols = [p for s in symbol or [] for p in s.split(",") if p.strip()]
+    etag = index.etag(sorted(s.strip().upper() for s in symbols), since, until, order, limit, cursor)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    try:
+        rows, next_cursor = await asyncio.to_thread(index.query, symbols, since, until, order, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    # the ETag was taken before the query: if the file changed meanwhile the
+    # client just revalidates once more on its next refresh
+    return JSONResponse(rows, headers=headers)
 
 @app.get("/get_trades_fifo_ext")
-async def get_trades_fifo_ext():
-    return _read_csv_json("db_ext/fifo/_allSymbols.csv", limit=200)
+async def get_trades_fifo_ext(request: Request, symbol: Optional[List[str]] = Query(None), since: Optional[str] = None,
+                              until: Optional[str] = None, order: str = Query("desc", pattern="^(asc|desc)$"),
+                              limit: int = Query(200, ge=1, le=5000), cursor: Optional[str] = None):
+    return await _query_trades(request, "ext", "fifo", symbol, since, until, order, limit, cursor)
 
 @app.get("/get_trades_cycle_ext")
-async def get_trades_cycle_ext():
-    return _read_csv_json("db_ext/cycle/_allSymbols.csv", limit=200)
+async def get_trades_cycle_ext(request: Request, symbol: Optional[List[str]] = Query(None), since: Optional[str] = None,
+                               until: Optional[str] = None, order: str = Query("desc", pattern="^(asc|desc)$"),
+                               limit: int = Query(200, ge=1, le=5000), cursor: Optional[str] = None):
+    return await _query_trades(request, "ext", "cycle", symbol, since, until, order, limit, cursor)
 
 @app.get("/get_trades_fifo_lig")
-async def get_trades_fifo_lig():
-    return _read_csv_json("db_lig/fifo/_allSymbols.csv", limit=200)
+async def get_trades_fifo_lig(request: Request, symbol: Optional[List[str]] = Query(None), since: Optional[str] = None,
+                              until: Optional[str] = None, order: str = Query("desc", pattern="^(asc|desc)$"),
+                              limit: int = Query(200, ge=1, le=5000), cursor: Optional[str] = None):
+    return await _query_trades(request, "lig", "fifo", symbol, since, until, order, limit, cursor)
 
 @app.get("/get_trades_cycle_lig")
-async def get_trades_cycle_lig():
-    return _read_csv_json("db_lig/cycle/_allSymbols.csv", limit=200)
-
+async def get_trades_cycle_lig(request: Request, symbol: Optional[List[str]] = Query(None), since: Optional[str] = None,
+                               until: Optional[str] = None, order: str = Query("desc", pattern="^(asc|desc)$"),
+                               limit: int = Query(200, ge=1, le=5000), cursor: Optional[str] = None):
+    return await _query_trades(request, "lig", "cycle", symbol, since, until, order, limit, cursor)
+
+
+# Data pipeline schedule per venue (written by data_backend.py): last run,
+# next trade / funding pull, current idle backoff. Epoch seconds.
+@app.get("/api/sync_status", dependencies=[Depends(require_auth)])
+async def sync_status():
+    status = sync_scheduler.read_status()
+    now = time.time()
+    for s in status.values():
+        s["nextRunIn"] = round(s.get("nextRun", now) - now, 1)
+        s["nextFundingIn"] = round(s.get("nextFunding", now) - now, 1)
+    return status
+
+# --- Daily tables ---
+# Loaded once per dataset generation (see DATASET_WATCHER below) and swapped
+# whole, so requests never touch disk; the ETag is the generation.
+DAILY = {"ext": [], "lig": []}
+
+def reload_dataset(venue: str):
+    """Runs in a thread when data_backend published a new generation of venue."""
+    for kind in ("fifo", "cycle"):
+        TRADE_INDEX[(venue, kind)].refresh()
+    DAILY[venue] = _read_csv_json(f"db_{venue}/fifo/_daily.csv")
+
+def _daily_response(request: Request, venue: str):
+    etag = f'"{venue}-{DATASET_WATCHER.generations.get(venue, 0)}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(DAILY[venue], headers=headers)
 
 @app.get("/get_daily_ext")
-async def get_daily_ext():
-    return _read_csv_json("db_ext/fifo/_daily.csv")
+async def get_daily_ext(request: Request):
+    return _daily_response(request, "ext")
 @app.get("/get_daily_lig")
-async def get_daily_lig():
-    return _read_csv_json("db_lig/fifo/_daily.csv")
+async def get_daily_lig(request: Request):
+    return _daily_response(request, "lig")
+
+# Per-symbol days straight from the hourly buckets (?utc=true for UTC days, default JKT)
+@app.get("/get_daily_symbols_ext")
+async def get_daily_symbols_ext(utc: bool = False, symbol: str | None = None):
+    return await asyncio.to_thread(daily_ext.daily_by_symbol, utc, symbol)
+@app.get("/get_daily_symbols_lig")
+async def get_daily_symbols_lig(utc: bool = False, symbol: str | None = None):
+    return await asyncio.to_thread(daily_lig.daily_by_symbol, utc, symbol)
 
 
 from fastapi import Request
 from fastapi.responses import StreamingResponse
 import asyncio
 
+# Bots publish their live state over a Unix datagram socket (spread_bot/live_channel.py);
+# the hub keeps the latest state per pair and pushes it to SSE clients on change.
+LIVE_HUB = LiveHub()
+
+@app.on_event("startup")
+async def start_live_hub():
+    await LIVE_HUB.start()
+
+@app.on_event("shutdown")
+async def stop_live_hub():
+    LIVE_HUB.close()
+
 @app.get("/api/live_stream/{symbolL}/{symbolE}", dependencies=[Depends(require_auth)])
-async def stream_live(request: Request, symbolL: str, symbolE: str):
-    live_path = f"spread_bot/logs/{symbolL}_{symbolE}_live.txt"
+async def stream_live(request: Request, symbolL: str, symbolE: str, interval: float = 0.25):
+    key = f"{symbolL}_{symbolE}"
+    interval = max(interval, 0.1)   # per-client throttle
+
+    async def event_stream():
+        async for data in LIVE_HUB.subscribe(key, minInterval=interval):
+            if await request.is_disconnected():
+                break
+            if data is None:
+                yield ": keep-alive\n\n"
+            else:
+                # JSON: {"key", "ts", "state"} (single line, safe for SSE)
+                yield f"data: {data}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+# data_backend.py publishes a generation per venue after each sync that changed
+# its outputs (spread_bot/dataset_events.py); the watcher reloads the cached
+# tables and dashboards get the event over SSE instead of polling.
+DATASET_WATCHER = DatasetWatcher(reload_dataset)
+
+@app.on_event("startup")
+async def start_dataset_watcher():
+    await DATASET_WATCHER.start(["ext", "lig"])
+
+@app.on_event("shutdown")
+async def stop_dataset_watcher():
+    DATASET_WATCHER.close()
 
+@app.get("/api/data_stream", dependencies=[Depends(require_auth)])
+async def stream_data(request: Request):
     async def event_stream():
-        last_line = None
-        while True:
+        async for data in DATASET_WATCHER.subscribe():
             if await request.is_disconnected():
                 break
-            try:
-                if os.path.exists(live_path):
-                    with open(live_path, "r", encoding="utf-8") as f:
-                        data = f.read().strip()
-
-                    if data and data != last_line:
-                        last_line = data
-                        # ✅ Encode newlines so the browser doesn't split the event
-                        safe_data = data.replace("\n", "\\n")
-                        yield f"data: {safe_data}\n\n"
-
-                await asyncio.sleep(0.5)  # check twice per second
-            except Exception as e:
-                yield f"data: [error] {e}\n\n"
-                await asyncio.sleep(2)
+            if data is None:
+                yield ": keep-alive\n\n"
+            else:
+                # JSON: {"venue", "generation", "ts", "changed"}
+                yield f"data: {data}\n\n"
 
     return StreamingResponse(event_stream(), media_type="text/event-stream")
 
@@ -311,9 +427,9 @@ async def get_logs(symbolL: str, symbolE: str, lines: int = 100):
     if not os.path.exists(log_path):
         return PlainTextResponse(f"No log file found for {symbolL}_{symbolE}", status_code=404)
     try:
-        with open(log_path, "r", encoding="utf-8") as f:
-            data = f.readlines()[:lines]
-        return PlainTextResponse("".join(data))
+        # newest first, reading only the tail blocks of the append-only log
+        data = await asyncio.to_thread(tail_lines, log_path, lines)
+        return PlainTextResponse("\n".join(data))
     except Exception as e:
         return PlainTextResponse(f"Error reading log: {e}", status_code=500)
 
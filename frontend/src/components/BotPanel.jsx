@@ -95,6 +95,7 @@ export default function BotPanel() {
             "PERC_OF_OB",
             "INV_LEVEL_TO_MULT",
             "MAX_INVENTORY_VALUE",
+            "OB_DEPTH",
         ];
 
         const cleanedSymbols = newSymbols.map((sym) => {
@@ -127,7 +128,9 @@ export default function BotPanel() {
 
 
     async function startBot(row) {
-        await fetchAuth(`${API_BASE}/api/start?symbolL=${row.SYMBOL_LIGHTER}&symbolE=${row.SYMBOL_EXTENDED}`, { method: "POST" });
+        const res = await fetchAuth(`${API_BASE}/api/start?symbolL=${row.SYMBOL_LIGHTER}&symbolE=${row.SYMBOL_EXTENDED}`, { method: "POST" });
+        const data = res.ok ? await res.json() : null;
+        if (res.status !== 401 && !data?.ok) alert(`❌ Could not start ${row.SYMBOL_LIGHTER}: ${data?.error || "request failed"}`);
         loadSymbols();
     }
 
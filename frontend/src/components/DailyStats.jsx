@@ -10,9 +10,9 @@ export default function DailyStats() {
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState("");
 
-    const fetchData = async () => {
+    const fetchData = async (showLoading = true) => {
         try {
-            setLoading(true);
+            if (showLoading) setLoading(true);
             const [ligRes, extRes] = await Promise.all([fetch(`${API_BASE}/get_daily_lig`), fetch(`${API_BASE}/get_daily_ext`),
             ]);
 
@@ -36,8 +36,16 @@ export default function DailyStats() {
 
     useEffect(() => {
         fetchData();
-        const interval = setInterval(fetchData, 100000);
-        return () => clearInterval(interval);
+
+        // refetch when the data backend publishes a new dataset generation
+        const u = localStorage.getItem("u");
+        const p = localStorage.getItem("p");
+        const auth = btoa(`${u}:${p}`);
+        const eventSource = new EventSource(`${API_BASE}/api/data_stream?auth=${encodeURIComponent(auth)}`);
+        eventSource.onmessage = () => fetchData(false);
+        eventSource.onerror = (err) => console.error("Data stream error:", err);
+
+        return () => eventSource.close();
     }, [mode]);
 
     const formatValue = (value, decimals = 2) => {
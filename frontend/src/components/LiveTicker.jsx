@@ -2,6 +2,85 @@ import React, { useEffect, useState } from "react";
 
 const API_BASE = `${window.location.protocol}//${window.location.hostname}:8000`;
 
+const pct = (v, d = 2) => (v === null || v === undefined ? "N/A" : `${Number(v).toFixed(d)}%`);
+const net = (a, b) => (a === null || a === undefined || b === null || b === undefined ? "N/A" : `${(b - a).toFixed(6)}%`);
+const ob = (o) => (o ? `bid ${o.bidPrice} (${o.bidSize}) / ask ${o.askPrice} (${o.askSize})` : "-");
+
+// Same layout as the old live.txt, built from the bot's structured state
+function formatLive(state) {
+  if (!state || state.status === "starting") return "Starting...";
+
+  const { pair, spreads, book, funding, inventory, levels, config, dex, latency } = state;
+  const inv = (side) => {
+    const { qty, entry } = inventory[side];
+    return `${qty} @ ${entry} / $${(qty * entry).toFixed(2)}`;
+  };
+
+  const lines = [
+    "---",
+    `L:${pair.L} E:${pair.E}`,
+    "---",
+    "Orderbook Data",
+    `SpreadLE : [TT:${pct(spreads.LE.TT)}] [TM:${pct(spreads.LE.TM)}] [MT:${pct(spreads.LE.MT)}]`,
+    `SpreadEL : [TT:${pct(spreads.EL.TT)}] [TM:${pct(spreads.EL.TM)}] [MT:${pct(spreads.EL.MT)}]`,
+    `L        : ${ob(book.L)}`,
+    `E        : ${ob(book.E)}`,
+    "---",
+    "Funding Rate",
+    `Lighter  : ${pct(funding.L, 6)}`,
+    `Extended : ${pct(funding.E, 6)}`,
+    `Net LE   : ${net(funding.L, funding.E)}`,
+    `Net EL   : ${net(funding.E, funding.L)}`,
+    "---",
+    "Inventory",
+    `Δ        : ${pct(inventory.spread)}`,
+    `Dir      : ${inventory.dir}`,
+    `qtyL     : ${inv("L")}`,
+    `qtyE     : ${inv("E")}`,
+    "---",
+  ];
+
+  if (levels) {
+    lines.push("Spread Averaging", "Value($) MinSpread(%)");
+    for (const [value, spread] of levels) {
+      lines.push(`${value.toFixed(0).padStart(7)} ${spread.toFixed(2)}`);
+    }
+  } else {
+    lines.push("Bot isn't Looking for Entry");
+  }
+
+  lines.push(
+    "---",
+    "Configs",
+    `TRADES_INTERVAL       : ${config.TRADES_INTERVAL}s`,
+    `MIN_SPREAD            : ${config.MIN_SPREAD}%`,
+    `SPREAD_MULTIPLIER     : ${config.SPREAD_MULTIPLIER}`,
+    `SPREAD_TP             : ${config.SPREAD_TP}%`,
+    `MIN_TRADE_VALUE       : $${config.MIN_TRADE_VALUE}`,
+    `MAX_TRADE_VALUE_ENTRY : $${config.MAX_TRADE_VALUE_ENTRY}`,
+    `MAX_TRADE_VALUE_EXIT  : $${config.MAX_TRADE_VALUE_EXIT}`,
+    `MAX_INVENTORY_VALUE   : $${config.MAX_INVENTORY_VALUE}`,
+    `INV_LEVEL_TO_MULT     : ${config.INV_LEVEL_TO_MULT}`,
+    `PERC_OF_OB            : ${config.PERC_OF_OB}%`,
+    "---",
+    "DEX Configs",
+    `Lighter               : min_size [${dex.L.min_size}], min_value [${dex.L.min_value}]`,
+    `Extended              : min_size [${dex.E.min_size}]`
+  );
+
+  if (latency) {
+    lines.push(
+      "---",
+      "WS→Decision Latency",
+      `n=${latency.decisions} last=${latency.last_ms.toFixed(3)}ms avg=${latency.avg_ms.toFixed(3)}ms ` +
+        `p50=${latency.p50_ms.toFixed(3)}ms p99=${latency.p99_ms.toFixed(3)}ms max=${latency.max_ms.toFixed(3)}ms ` +
+        `coalesced=${latency.coalesced}`
+    );
+  }
+
+  return lines.join("\n");
+}
+
 export default function LiveTicker({ symbolL, symbolE }) {
   const [line, setLine] = useState("Waiting...");
 
@@ -14,8 +93,11 @@ export default function LiveTicker({ symbolL, symbolE }) {
     const eventSource = new EventSource(url);
 
     eventSource.onmessage = (e) => {
-    // Decode the encoded \n back to real newlines
-    setLine((e.data || "No data").replace(/\\n/g, "\n"));
+      try {
+        setLine(formatLive(JSON.parse(e.data).state));
+      } catch (err) {
+        setLine(e.data || "No data");
+      }
     };
 
 
@@ -37,7 +119,7 @@ export default function LiveTicker({ symbolL, symbolE }) {
         borderRadius: "8px",
         height: "400px",
         overflowY: "auto",
-        whiteSpace: "pre", 
+        whiteSpace: "pre",
         lineHeight: "1.4em",
       }}
     >
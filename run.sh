@@ -5,6 +5,7 @@
 REPO_DIR="/root/arbSpread"
 BACKEND_SCREEN="web-backend"
 BACKEND_DATA_SCREEN="web-backend-data"
+SUPERVISOR_SCREEN="arb-supervisor"
 FRONTEND_SCREEN="web-frontend"
 BACKEND_DIR="$REPO_DIR/backend"
 FRONTEND_DIR="$REPO_DIR/frontend"
@@ -63,6 +64,15 @@ source $VENV_PATH;
 python3 data_backend.py;
 "
 
+# -----------------------------
+# STEP 5b — Start bot supervisor (all pairs in one process)
+# -----------------------------
+echo "▶️ Starting bot supervisor in screen: $SUPERVISOR_SCREEN"
+screen -dmS "$SUPERVISOR_SCREEN" bash -c "
+source $VENV_PATH;
+python3 -u spread_bot/supervisor.py;
+"
+
 # STEP 6 — Start frontend
 # -----------------------------
 cd "$FRONTEND_DIR"
@@ -84,5 +94,6 @@ echo "   - Backends & frontend restarted"
 echo "   - 🧩 Running screens:"
 echo "       * $BACKEND_SCREEN → unified_backend.py"
 echo "       * $BACKEND_DATA_SCREEN → data_backend.py"
+echo "       * $SUPERVISOR_SCREEN → spread_bot/supervisor.py"
 echo "       * $FRONTEND_SCREEN → frontend (port 3000)"
 echo ""